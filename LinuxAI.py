@@ -1,113 +1,147 @@
+import time
+startup_marks = [('start', time.perf_counter())]
 import sys
 import os
 import json
 import re
+import functools
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                            QHBoxLayout, QTextEdit, QLineEdit, QPushButton,
                            QLabel, QFrame, QScrollArea, QSplitter, 
-                           QDialog, QFormLayout, QMessageBox)
-from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal
-from PyQt5.QtGui import QColor, QPalette, QFont, QTextCursor, QIcon
-import google.generativeai as genai
-import platform
+                           QDialog, QFormLayout, QMessageBox, QSpinBox,
+                           QCheckBox, QComboBox, QListWidget, QListWidgetItem,
+                           QPlainTextEdit, QScrollBar, QTabWidget, QTabBar)
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import (QColor, QFont, QTextCursor, QIcon, QTextCharFormat,
+                         QTextDocument, QTextFormat)
+startup_marks.append(('import PyQt5', time.perf_counter()))
+from ai_client import ModelClient, DEFAULT_MODEL, API_KEY_FILE, load_api_key
+from backends import Backends, backends_from_config
+from command_scheduler import (CommandScheduler, QUEUED, RUNNING,
+                               DONE, FAILED, CANCELLED, SKIPPED)
+from transcript import TranscriptLog
+from theme import COLORS, apply_theme, set_style_state
+from chat_session import ChatSession, OutputDigest
+from response_cache import ResponseCache
+from history_store import HistoryStore
+from engine import engine_from_config
+from config import load_config
+from telemetry import telemetry_from_config
+from output_spool import OutputSpool, MappedOutput, format_size
+from ansi import render_line, strip_ansi
+from inventory import LOCAL, Inventory, InventoryError, inventory_path, load_inventory
+from ssh_pool import transport_from_config
+from fanout import FanoutRunner
+from shell_session import ShellSession, SessionRunner
+from system_context import SystemContext
+from docs_index import DocsIndex
+from qt_tasks import AIRequest, CommandExecution, CommandCheck
+from command_check import CommandAnalyzer, describe
 import datetime
-import getpass
-import subprocess
-COLORS = {
-    'bg_dark': '#0a0a0f',           # Deep dark purple-black
-    'bg_medium': '#1a0d2e',         # Dark purple
-    'bg_light': '#16213e',          # Dark blue-purple
-    'text': '#00ffff',              # Cyan text
-    'text_secondary': '#ff00ff',    # Magenta secondary text
-    'primary': '#ff0080',           # Hot pink/magenta
-    'primary_hover': '#ff3399',     # Lighter hot pink
-    'accent': '#00ff41',            # Neon green
-    'accent_hover': '#39ff70',      # Lighter neon green
-    'error': '#ff073a',             # Neon red
-    'success': '#00ff88',           # Neon green success
-    'border': '#7b68ee',            # Medium slate blue
-    'border_glow': '#9370db',       # Medium purple
-    'warning': '#ffff00',           # Neon yellow
-    'shadow': '#ff00ff80'           # Semi-transparent magenta
-}
+import sqlite3
+startup_marks.append(('import app modules', time.perf_counter()))
 
 class TerminalTextEdit(QTextEdit):
-    def __init__(self):
+    # Keeps at most max_blocks blocks in the document so appends and layout
+    # stay cheap however long the session runs. Once over the limit it trims
+    # a further page_blocks in the same removal, so eviction happens once
+    # per page rather than on every append. Everything written is also
+    # mirrored to a TranscriptLog; evicted blocks are paged back in from it
+    # when the user scrolls to the top.
+    def __init__(self, max_blocks=2000, page_blocks=500):
         super().__init__()
-        self.setStyleSheet(f"""
-            QTextEdit {{
-                background-color: {COLORS['bg_dark']};
-                color: {COLORS['text']};
-                border: 2px solid {COLORS['border']};
-                font-family: 'Consolas', 'Ubuntu Mono', 'Courier New';
-                font-size: 14px;
-                padding: 15px;
-                border-radius: 8px;
-                selection-background-color: {COLORS['primary']};
-                selection-color: {COLORS['bg_dark']};
-                box-shadow: 0 0 20px {COLORS['shadow']};
-            }}
-            QTextEdit:focus {{
-                border: 2px solid {COLORS['border_glow']};
-                box-shadow: 0 0 25px {COLORS['border_glow']};
-            }}
-        """)
+        self.max_blocks = max_blocks
+        self.page_blocks = page_blocks
+        self.transcript = TranscriptLog()
+        self.first_offset = 0
+        self.history_blocks = 0
+        self.setObjectName("chatArea")
         self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.setLineWrapMode(QTextEdit.WidgetWidth)
+        self.setReadOnly(True)
+        self.verticalScrollBar().valueChanged.connect(self.on_scroll)
+    
+    def setPlainText(self, text):
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        super().setPlainText(text)
+        self.transcript.reset()
+        self.transcript.write(text)
+        self.first_offset = 0
+        self.history_blocks = 0
+    
+    def append(self, text):
+        self.write_text(text, new_block=True)
+    
+    def insert_text(self, text):
+        self.write_text(text)
+    
+    def write_text(self, text, new_block=False):
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        
+        # Qt also splits blocks on these; normalise so blocks and log lines match
+        text = text.replace('\r\n', '\n').replace('\r', '\n').replace('\u2029', '\n')
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.End)
+        if new_block and not self.document().isEmpty():
+            cursor.insertBlock()
+            self.transcript.write('\n')
+        cursor.insertText(text)
+        self.transcript.write(text)
+        
+        if at_bottom:
+            self.history_blocks = 0
+        excess = self.document().blockCount() - self.max_blocks - self.history_blocks
+        if excess > 0:
+            self.evict_blocks(min(excess + self.page_blocks, self.document().blockCount() - 1))
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+    
+    def evict_blocks(self, count):
+        document = self.document()
+        block = document.firstBlock()
+        removed = 0
+        for _ in range(count):
+            removed += len(block.text().encode('utf-8')) + 1
+            block = block.next()
+        cursor = QTextCursor(document)
+        cursor.movePosition(QTextCursor.Start)
+        cursor.setPosition(block.position(), QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        self.first_offset += removed
+    
+    def on_scroll(self, value):
+        scrollbar = self.verticalScrollBar()
+        if value == scrollbar.minimum() and self.first_offset > 0:
+            self.load_earlier()
+    
+    def load_earlier(self):
+        start, text = self.transcript.read_before(self.first_offset, self.page_blocks)
+        scrollbar = self.verticalScrollBar()
+        old_maximum = scrollbar.maximum()
+        scrollbar.blockSignals(True)
+        cursor = QTextCursor(self.document())
+        cursor.movePosition(QTextCursor.Start)
+        cursor.insertText(text + '\n')
+        self.history_blocks += text.count('\n') + 1
+        self.first_offset = start
+        # Keep the previously visible content where it was
+        scrollbar.setValue(scrollbar.maximum() - old_maximum)
+        scrollbar.blockSignals(False)
 
 class APIKeyDialog(QDialog):
     def __init__(self, parent=None, current_api_key=''):
         super().__init__(parent)
         self.setWindowTitle("Manage Gemini API Key")
         self.setMinimumWidth(400)
-        self.setStyleSheet(f"""
-            QDialog {{
-                background-color: {COLORS['bg_dark']};
-                color: {COLORS['text']};
-                border-radius: 10px;
-            }}
-            QLabel {{
-                color: {COLORS['text']};
-                font-size: 13px;
-            }}
-            QLineEdit {{
-                background-color: {COLORS['bg_medium']};
-                color: {COLORS['text']};
-                border: 2px solid {COLORS['border']};
-                border-radius: 5px;
-                padding: 8px;
-                font-family: 'Ubuntu Mono', 'Courier New';
-                font-size: 14px;
-            }}
-            QLineEdit:focus {{
-                border: 2px solid {COLORS['primary']};
-            }}
-            QPushButton {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['text']};
-                border: none;
-                padding: 8px 15px;
-                border-radius: 5px;
-                font-weight: bold;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['primary_hover']};
-            }}
-            QPushButton#cancelButton {{
-                background-color: {COLORS['bg_medium']};
-            }}
-            QPushButton#cancelButton:hover {{
-                background-color: {COLORS['error']};
-                color: {COLORS['text']};
-            }}
-        """)
+        self.setObjectName("apiKeyDialog")
         
         layout = QVBoxLayout(self)
         layout.setSpacing(15)
         
         info_label = QLabel("Enter your Gemini API key below.")
-        info_label.setStyleSheet(f"color: {COLORS['accent']};")
+        info_label.setObjectName("dialogInfo")
         layout.addWidget(info_label)
         
         input_layout = QFormLayout()
@@ -119,7 +153,8 @@ class APIKeyDialog(QDialog):
         layout.addLayout(input_layout)
         
         self.validation_label = QLabel()
-        self.validation_label.setStyleSheet(f"color: {COLORS['error']};")
+        self.validation_label.setObjectName("validationLabel")
+        self.validation_label.setProperty("state", "error")
         layout.addWidget(self.validation_label)
         
         buttons_layout = QHBoxLayout()
@@ -140,88 +175,491 @@ class APIKeyDialog(QDialog):
         
         if not api_key:
             self.validation_label.setText("❌ API Key cannot be empty")
-            self.validation_label.setStyleSheet(f"color: {COLORS['error']};")
+            set_style_state(self.validation_label, 'error')
             self.save_button.setEnabled(False)
             return False
         
         if not re.match(r'^[A-Za-z0-9_-]{39}$', api_key):
             self.validation_label.setText("❌ Invalid API Key format")
-            self.validation_label.setStyleSheet(f"color: {COLORS['error']};")
+            set_style_state(self.validation_label, 'error')
             self.save_button.setEnabled(False)
             return False
         
         self.validation_label.setText("✓ Valid API Key format")
-        self.validation_label.setStyleSheet(f"color: {COLORS['success']};")
+        set_style_state(self.validation_label, 'ok')
         self.save_button.setEnabled(True)
         return True
 
-class AIResponseThread(QThread):
-    response_ready = pyqtSignal(str)
-    error_occurred = pyqtSignal(str)
-    
-    def __init__(self, message):
-        super().__init__()
-        self.message = message
-    
-    def run(self):
+class HistoryDialog(QDialog):
+    # Search over the command history. Results are fetched one page at a
+    # time, the next page only when the list is scrolled to its end.
+    def __init__(self, store, main_window, page_size=50):
+        super().__init__(main_window)
+        self.store = store
+        self.main_window = main_window
+        self.page_size = page_size
+        self.query = ''
+        self.last_id = None
+        self.exhausted = False
+        self.setWindowTitle("Command History")
+        self.setObjectName("historyDialog")
+        self.resize(760, 400)
+        
+        layout = QVBoxLayout(self)
+        layout.setSpacing(10)
+        
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search commands and output...")
+        self.search_input.textChanged.connect(self.schedule_search)
+        layout.addWidget(self.search_input)
+        
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.run_search)
+        
+        self.results = QListWidget()
+        self.results.setObjectName("historyList")
+        self.results.verticalScrollBar().valueChanged.connect(self.on_scroll)
+        self.results.currentItemChanged.connect(self.show_output)
+        self.results.itemDoubleClicked.connect(self.rerun_selected)
+        layout.addWidget(self.results, 3)
+        
+        self.output_view = QTextEdit()
+        self.output_view.setObjectName("historyOutput")
+        self.output_view.setReadOnly(True)
+        layout.addWidget(self.output_view, 1)
+        
+        buttons_layout = QHBoxLayout()
+        rerun_button = QPushButton("▶ Run again")
+        rerun_button.setProperty("variant", "accent")
+        rerun_button.clicked.connect(self.rerun_selected)
+        buttons_layout.addWidget(rerun_button)
+        copy_button = QPushButton("Copy")
+        copy_button.clicked.connect(self.copy_selected)
+        buttons_layout.addWidget(copy_button)
+        buttons_layout.addStretch()
+        close_button = QPushButton("Close")
+        close_button.setObjectName("cancelButton")
+        close_button.clicked.connect(self.close)
+        buttons_layout.addWidget(close_button)
+        layout.addLayout(buttons_layout)
+
+    def schedule_search(self):
+        self.search_timer.start()
+
+    def run_search(self):
+        self.search_timer.stop()
+        self.query = self.search_input.text()
+        self.last_id = None
+        self.exhausted = False
+        self.results.clear()
+        self.output_view.clear()
+        self.load_page()
+
+    def load_page(self):
+        if self.exhausted:
+            return
         try:
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = model.generate_content(self.message)
-            self.response_ready.emit(response.text)
-        except Exception as e:
-            self.error_occurred.emit(str(e))
+            entries = self.store.search(self.query, before=self.last_id, limit=self.page_size)
+        except sqlite3.Error as e:
+            self.output_view.setPlainText(f"History search failed: {e}")
+            entries = []
+        self.exhausted = len(entries) < self.page_size
+        for entry in entries:
+            item = QListWidgetItem(self.format_entry(entry))
+            item.setData(Qt.UserRole, entry)
+            item.setToolTip(entry.command)
+            self.results.addItem(item)
+        if entries:
+            self.last_id = entries[-1].id
 
-class CommandExecutionThread(QThread):
-    output_ready = pyqtSignal(str)
-    error_occurred = pyqtSignal(str)
-    finished = pyqtSignal()
-    
-    def __init__(self, command):
+    def format_entry(self, entry):
+        started = datetime.datetime.fromtimestamp(entry.started).strftime('%Y-%m-%d %H:%M')
+        command = entry.command.split('\n', 1)[0]
+        if '\n' in entry.command:
+            command += ' …'
+        status = entry.state if entry.exit_code is None else f"exit {entry.exit_code}"
+        duration = '' if entry.duration is None else f" · {entry.duration:.1f}s"
+        return f"{started}  {command}   [{status}{duration} · {entry.cwd}]"
+
+    def on_scroll(self, value):
+        if value >= self.results.verticalScrollBar().maximum() - 2:
+            self.load_page()
+
+    def selected_entry(self):
+        item = self.results.currentItem()
+        return item.data(Qt.UserRole) if item else None
+
+    def show_output(self, item, previous=None):
+        if item is None:
+            self.output_view.clear()
+            return
+        output = self.store.output(item.data(Qt.UserRole).id)
+        self.output_view.setPlainText(output or "(no output recorded)")
+
+    def rerun_selected(self, *args):
+        entry = self.selected_entry()
+        if entry is not None:
+            self.main_window.rerun_command(entry.command)
+
+    def copy_selected(self):
+        entry = self.selected_entry()
+        if entry is not None:
+            QApplication.clipboard().setText(entry.command)
+
+def format_metric(name, value):
+    if value is None:
+        return '-'
+    if name.endswith('_seconds'):
+        return f"{value * 1000:.0f} ms" if value < 10 else f"{value:.1f} s"
+    if name.endswith('_bytes'):
+        return f"{value / (1 << 20):.1f} MiB"
+    return f"{value:.0f}"
+
+class StatsDialog(QDialog):
+    # Live view of the telemetry histograms, refreshed while it is open
+    def __init__(self, telemetry, metrics_url=None, parent=None):
+        super().__init__(parent)
+        self.telemetry = telemetry
+        self.metrics_url = metrics_url
+        self.setWindowTitle("Performance Stats")
+        self.setObjectName("statsDialog")
+        self.resize(760, 380)
+        
+        layout = QVBoxLayout(self)
+        self.stats_view = QTextEdit()
+        self.stats_view.setObjectName("statsView")
+        self.stats_view.setReadOnly(True)
+        self.stats_view.setLineWrapMode(QTextEdit.NoWrap)
+        layout.addWidget(self.stats_view)
+        
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
+        close_button = QPushButton("Close")
+        close_button.setObjectName("cancelButton")
+        close_button.clicked.connect(self.close)
+        buttons_layout.addWidget(close_button)
+        layout.addLayout(buttons_layout)
+        
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        rows, counters = self.telemetry.snapshot()
+        lines = [f"{'metric':<24}{'count':>7}{'mean':>11}{'p50':>11}{'p90':>11}{'p99':>11}{'max':>11}"]
+        for name, count, *values in rows:
+            lines.append(f"{name:<24}{count:>7}" +
+                         ''.join(f"{format_metric(name, value):>11}" for value in values))
+        lines.append('')
+        lines.extend(f"{name:<24}{value:>7}" for name, value in counters.items())
+        lines.append('')
+        lines.append(f"trace: {self.telemetry.trace_path or 'off'}")
+        lines.append(f"prometheus: {self.metrics_url or 'off'}")
+        scrollbar = self.stats_view.verticalScrollBar()
+        position = scrollbar.value()
+        self.stats_view.setPlainText('\n'.join(lines))
+        scrollbar.setValue(position)
+
+class OutputView(QPlainTextEdit):
+    # Text area of an OutputPane. It only ever holds the lines on screen, so
+    # vertical scrolling is handed to the pane, which moves through the file.
+    def __init__(self, pane):
+        super().__init__()
+        self.pane = pane
+        self.setObjectName("outputView")
+        self.setReadOnly(True)
+        self.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+
+    def wheelEvent(self, event):
+        delta = event.angleDelta().y()
+        if delta:
+            # One notch (120) scrolls three lines
+            self.pane.scroll_lines(-round(delta / 40))
+        else:
+            super().wheelEvent(event)
+
+    def keyPressEvent(self, event):
+        key = event.key()
+        page = self.pane.page_lines()
+        steps = {Qt.Key_Up: -1, Qt.Key_Down: 1, Qt.Key_PageUp: -page, Qt.Key_PageDown: page}
+        if key in steps:
+            self.pane.scroll_lines(steps[key])
+        elif key == Qt.Key_Home:
+            self.pane.scroll_to(0)
+        elif key == Qt.Key_End:
+            self.pane.scroll_to_end()
+        elif key == Qt.Key_F and event.modifiers() & Qt.ControlModifier:
+            self.pane.search_input.setFocus()
+            self.pane.search_input.selectAll()
+        else:
+            super().keyPressEvent(event)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.pane.render()
+
+class OutputPane(QFrame):
+    # Viewer for the spooled output of one command run. The position is a
+    # byte offset into the memory-mapped file and only the lines on screen
+    # are decoded and rendered, so a multi-gigabyte log opens and scrolls as
+    # fast as a short one. While the command runs the pane follows the end
+    # of the output unless the user has scrolled away from it.
+    def __init__(self, spool, command, max_line=4096):
         super().__init__()
+        self.spool = spool
         self.command = command
-    
-    def run(self):
+        self.max_line = max_line
+        self.output = MappedOutput(spool.path)
+        self.top = 0
+        self.shift = 0
+        self.follow = True
+        self.running = True
+        self.closed = False
+        self.match = None
+        self.search_text = ''
+        self.search_steps = None
+        self.formats = {}
+        self.setObjectName("outputPane")
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 5, 0, 0)
+        layout.setSpacing(5)
+
+        view_layout = QHBoxLayout()
+        view_layout.setSpacing(0)
+        self.view = OutputView(self)
+        view_layout.addWidget(self.view)
+        self.scrollbar = QScrollBar(Qt.Vertical)
+        self.scrollbar.valueChanged.connect(self.on_scrollbar)
+        view_layout.addWidget(self.scrollbar)
+        layout.addLayout(view_layout)
+
+        search_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search output...")
+        self.search_input.returnPressed.connect(self.find_next)
+        search_layout.addWidget(self.search_input)
+        previous_btn = QPushButton("▲")
+        previous_btn.setProperty("variant", "subtle")
+        previous_btn.clicked.connect(self.find_previous)
+        search_layout.addWidget(previous_btn)
+        next_btn = QPushButton("▼")
+        next_btn.setProperty("variant", "subtle")
+        next_btn.clicked.connect(self.find_next)
+        search_layout.addWidget(next_btn)
+        self.status_label = QLabel()
+        self.status_label.setObjectName("outputStatus")
+        search_layout.addWidget(self.status_label)
+        layout.addLayout(search_layout)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(250)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start()
+        self.search_timer = QTimer(self)
+        self.search_timer.setInterval(0)
+        self.search_timer.timeout.connect(self.continue_search)
+
+    def page_lines(self):
+        return max(1, self.view.viewport().height() // self.view.fontMetrics().lineSpacing())
+
+    def last_top(self):
+        return self.output.last_page(self.page_lines())
+
+    def refresh(self):
+        if self.output.refresh():
+            if self.follow:
+                self.top = self.last_top()
+            self.render()
+
+    def finish(self):
+        if self.closed:
+            return
+        self.running = False
+        self.refresh_timer.stop()
+        self.refresh()
+        self.render()
+
+    def scroll_lines(self, count):
+        if count > 0:
+            self.scroll_to(self.output.forward(self.top, count))
+        elif count < 0:
+            self.scroll_to(self.output.backward(self.top, -count))
+
+    def scroll_to(self, offset):
+        last_top = self.last_top()
+        self.top = self.output.line_start(min(offset, last_top))
+        self.follow = self.top >= last_top
+        self.render()
+
+    def scroll_to_end(self):
+        self.scroll_to(self.output.size)
+
+    def on_scrollbar(self, value):
+        self.scroll_to(value << self.shift)
+
+    def char_format(self, style):
+        text_format = self.formats.get(style)
+        if text_format is None:
+            text_format = QTextCharFormat()
+            foreground, background = style.fg, style.bg
+            if style.inverse:
+                foreground, background = background or COLORS['bg_dark'], foreground or COLORS['text']
+            if style.dim:
+                color = QColor(foreground or COLORS['text'])
+                color.setAlpha(150)
+                text_format.setForeground(color)
+            elif foreground:
+                text_format.setForeground(QColor(foreground))
+            if background:
+                text_format.setBackground(QColor(background))
+            if style.bold:
+                text_format.setFontWeight(QFont.Bold)
+            text_format.setFontItalic(style.italic)
+            text_format.setFontUnderline(style.underline)
+            text_format.setFontStrikeOut(style.strike)
+            self.formats[style] = text_format
+        return text_format
+
+    def render(self):
+        if self.closed:
+            return
+        lines = self.output.read_lines(self.top, self.page_lines() + 1, self.max_line)
+        self.view.setUpdatesEnabled(False)
+        self.view.clear()
+        cursor = QTextCursor(self.view.document())
+        match_block = None
+        for index, (start, data) in enumerate(lines):
+            if index:
+                cursor.insertBlock()
+            # Each page starts with default colors, like `less -R`
+            for text, style in render_line(data.decode('utf-8', errors='replace'))[0]:
+                cursor.insertText(text, self.char_format(style))
+            if self.match is not None and start <= self.match[0] <= start + len(data):
+                match_block = index
+        self.view.setExtraSelections(self.match_selections(match_block))
+        self.view.verticalScrollBar().setValue(0)
+        self.view.setUpdatesEnabled(True)
+        self.update_scrollbar()
+        self.update_status()
+
+    def match_selections(self, match_block):
+        if self.match is None:
+            return []
+        selections = []
+        document = self.view.document()
+        if match_block is not None:
+            selection = QTextEdit.ExtraSelection()
+            selection.cursor = QTextCursor(document.findBlockByNumber(match_block))
+            selection.format.setBackground(QColor(COLORS['bg_light']))
+            selection.format.setProperty(QTextFormat.FullWidthSelection, True)
+            selections.append(selection)
+        flags = QTextDocument.FindFlags()
+        if self.search_text != self.search_text.lower():
+            flags |= QTextDocument.FindCaseSensitively
+        cursor = document.find(self.search_text, 0, flags)
+        while not cursor.isNull():
+            selection = QTextEdit.ExtraSelection()
+            selection.cursor = cursor
+            selection.format.setBackground(QColor(COLORS['primary']))
+            selection.format.setForeground(QColor(COLORS['bg_dark']))
+            selections.append(selection)
+            cursor = document.find(self.search_text, cursor, flags)
+        return selections
+
+    def update_scrollbar(self):
+        # QScrollBar is int based; files over 1 GiB are mapped onto it in
+        # coarser steps
+        last_top = self.last_top()
+        self.shift = max(0, last_top.bit_length() - 30)
+        self.scrollbar.blockSignals(True)
+        self.scrollbar.setRange(0, last_top >> self.shift)
+        self.scrollbar.setPageStep(max(1, (self.output.size >> self.shift) // 20))
+        self.scrollbar.setValue(self.top >> self.shift)
+        self.scrollbar.blockSignals(False)
+
+    def update_status(self):
+        size = self.output.size
+        percent = 100 if self.follow or not size else self.top * 100 // size
+        status = f"{format_size(size)} · {self.spool.lines:,} lines · {percent}%"
+        if self.running:
+            status += " · running"
+        if self.search_steps is not None:
+            status += " · searching..."
+        self.status_label.setText(status)
+
+    def find_next(self):
+        self.start_search(backwards=False)
+
+    def find_previous(self):
+        self.start_search(backwards=True)
+
+    def start_search(self, backwards):
+        text = self.search_input.text()
+        if not text:
+            return
+        if self.match is not None and text == self.search_text:
+            start = self.match[0] if backwards else self.match[0] + 1
+        else:
+            start = self.top
+        self.search_text = text
+        self.search_steps = self.output.search(text, start, backwards)
+        self.search_timer.start()
+        self.update_status()
+
+    def continue_search(self):
+        # One chunk per event loop pass keeps the window responsive while a
+        # large file is scanned
         try:
-            process = subprocess.Popen(
-                self.command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            output, error = process.communicate()
-            
-            if output:
-                self.output_ready.emit(output.rstrip())
-            if error:
-                self.error_occurred.emit(error)
-            
-        except Exception as e:
-            self.error_occurred.emit(str(e))
-        finally:
-            self.finished.emit()
+            match = next(self.search_steps)
+        except StopIteration:
+            match = False
+        if match is None:
+            return
+        self.search_timer.stop()
+        self.search_steps = None
+        if match is False:
+            self.match = None
+            self.render()
+            self.status_label.setText(f"No matches for '{self.search_text}'")
+            return
+        self.match = match
+        self.follow = False
+        self.top = self.output.backward(match[0], self.page_lines() // 3)
+        self.render()
+
+    def close_output(self):
+        self.closed = True
+        self.refresh_timer.stop()
+        self.search_timer.stop()
+        self.search_steps = None
+        self.output.close()
+        self.spool.remove()
 
 class CommandWidget(QFrame):
     def __init__(self, command, main_window):
         super().__init__()
         self.main_window = main_window
-        self.command_thread = None
+        self.command = command
+        self.execution = None
+        self.output_stream = None
+        self.output_digest = None
+        self.output_pane = None
+        self.inventory = None
+        self.analysis = None
         self.setFrameStyle(QFrame.NoFrame)
-        self.setStyleSheet(f"""
-            QFrame {{
-                background-color: {COLORS['bg_medium']};
-                color: {COLORS['text']};
-                border: 2px solid {COLORS['border']};
-                border-radius: 10px;
-                margin: 8px;
-                padding: 15px;
-                box-shadow: 0 0 15px {COLORS['shadow']};
-            }}
-            QFrame:hover {{
-                border: 2px solid {COLORS['border_glow']};
-                box-shadow: 0 0 20px {COLORS['border_glow']};
-            }}
-        """)
+        self.setObjectName("commandCard")
         
         layout = QVBoxLayout(self)
         layout.setContentsMargins(10, 10, 10, 10)
@@ -229,93 +667,215 @@ class CommandWidget(QFrame):
         
         header_layout = QHBoxLayout()
         command_label = QLabel("Command:")
-        command_label.setStyleSheet(f"color: {COLORS['accent']}; font-weight: bold; font-size: 13px;")
+        command_label.setObjectName("fieldLabel")
         header_layout.addWidget(command_label)
+        header_layout.addStretch()
+        self.state_label = QLabel()
+        self.state_label.setObjectName("jobState")
+        header_layout.addWidget(self.state_label)
         layout.addLayout(header_layout)
         
         command_layout = QHBoxLayout()
         self.command_input = QLineEdit(command)
-        self.command_input.setStyleSheet(f"""
-            QLineEdit {{
-                background-color: {COLORS['bg_dark']};
-                color: {COLORS['text']};
-                border: 2px solid {COLORS['border']};
-                border-radius: 5px;
-                padding: 8px;
-                font-family: 'Ubuntu Mono', 'Courier New';
-                font-size: 14px;
-            }}
-            QLineEdit:focus {{
-                border: 2px solid {COLORS['primary']};
-            }}
-        """)
+        self.command_input.editingFinished.connect(self.check_command)
         command_layout.addWidget(self.command_input)
         
         copy_btn = QPushButton("Copy")
-        copy_btn.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['text']};
-                border: none;
-                padding: 8px 15px;
-                border-radius: 5px;
-                font-weight: bold;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['primary_hover']};
-            }}
-        """)
         copy_btn.clicked.connect(self.copy_command)
         command_layout.addWidget(copy_btn)
+        
+        self.output_btn = QPushButton("Output")
+        self.output_btn.setEnabled(False)
+        self.output_btn.clicked.connect(self.show_output)
+        command_layout.addWidget(self.output_btn)
         layout.addLayout(command_layout)
         
+        self.check_label = QLabel()
+        self.check_label.setObjectName("commandCheck")
+        self.check_label.setWordWrap(True)
+        self.check_label.hide()
+        layout.addWidget(self.check_label)
+        
         button_layout = QHBoxLayout()
         self.execute_btn = QPushButton("Execute")
-        self.execute_btn.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {COLORS['accent']};
-                color: {COLORS['bg_dark']};
-                border: none;
-                padding: 8px 20px;
-                border-radius: 5px;
-                font-weight: bold;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['text']};
-            }}
-        """)
+        self.execute_btn.setProperty("variant", "accent")
         self.execute_btn.clicked.connect(self.execute_command)
         button_layout.addWidget(self.execute_btn)
+        
+        self.stop_btn = QPushButton("■ Stop")
+        self.stop_btn.setProperty("variant", "danger")
+        self.stop_btn.setEnabled(False)
+        self.stop_btn.clicked.connect(self.stop_command)
+        button_layout.addWidget(self.stop_btn)
         button_layout.addStretch()
         
+        self.target_label = QLabel("Target:")
+        self.target_label.setObjectName("fieldLabel")
+        button_layout.addWidget(self.target_label)
+        self.target_combo = QComboBox()
+        self.target_combo.currentIndexChanged.connect(lambda: self.show_analysis(self.analysis))
+        button_layout.addWidget(self.target_combo)
+        self.update_targets()
+        
+        timeout_label = QLabel("Timeout:")
+        timeout_label.setObjectName("fieldLabel")
+        button_layout.addWidget(timeout_label)
+        self.timeout_input = QSpinBox()
+        self.timeout_input.setRange(0, 24 * 60 * 60)
+        self.timeout_input.setSuffix(" s")
+        self.timeout_input.setSpecialValueText("none")
+        self.timeout_input.setValue(self.main_window.default_command_timeout)
+        button_layout.addWidget(self.timeout_input)
+        
         layout.addLayout(button_layout)
+        self.check_command()
+
+    def reset(self, command):
+        # Prepares a pooled card for reuse with a new suggestion
+        self.command = command
+        self.command_input.setText(command)
+        self.output_stream = None
+        self.output_digest = None
+        self.output_pane = None
+        self.output_btn.setEnabled(False)
+        self.execute_btn.setEnabled(True)
+        self.execute_btn.setText("Execute")
+        self.stop_btn.setEnabled(False)
+        self.state_label.setText("")
+        self.timeout_input.setValue(self.main_window.default_command_timeout)
+        if self.inventory is not self.main_window.inventory:
+            self.update_targets()
+        self.check_command()
+
+    def update_targets(self):
+        # The selector only shows up once there is an inventory; the chosen
+        # target is kept across suggestions while it still exists
+        self.inventory = self.main_window.inventory
+        targets = self.inventory.targets()
+        current = self.target_combo.currentData()
+        self.target_combo.clear()
+        for target, label in targets:
+            self.target_combo.addItem(label, target)
+        self.target_combo.setCurrentIndex(max(0, self.target_combo.findData(current)))
+        self.target_label.setVisible(len(targets) > 1)
+        self.target_combo.setVisible(len(targets) > 1)
+
+    def check_command(self):
+        # From the cache right away, else once the pool has checked it; an
+        # older annotation of the same text stays up meanwhile
+        command = self.command_input.text()
+        analysis = self.main_window.command_check.request(command)
+        if analysis is not None or self.analysis is None or self.analysis.command != command:
+            self.show_analysis(analysis)
+
+    def show_analysis(self, analysis):
+        self.analysis = analysis
+        if analysis is None:
+            self.check_label.hide()
+            return
+        state, text = describe(analysis, local=(self.target_combo.currentData() or LOCAL) == LOCAL)
+        self.check_label.setText(text)
+        self.check_label.setToolTip('\n'.join(f"{word}: {path}" for word, path in analysis.found.items()))
+        set_style_state(self.check_label, state)
+        self.check_label.show()
 
     def copy_command(self):
         QApplication.clipboard().setText(self.command_input.text())
         self.main_window.show_status_message("Command copied to clipboard!")
 
+    def show_output(self):
+        if self.output_pane is not None and not self.output_pane.closed:
+            self.main_window.output_tabs.setCurrentWidget(self.output_pane)
+
     def execute_command(self):
+        if self.execution is None:
+            self.main_window.command_scheduler.submit(self.create_job())
+    
+    def create_job(self):
+        # Binds a new job to this card; the caller decides how it is scheduled
         command = self.command_input.text()
         self.execute_btn.setEnabled(False)
-        self.execute_btn.setText("⏳ Running...")
+        self.stop_btn.setEnabled(True)
         
-        self.command_thread = CommandExecutionThread(command)
-        self.command_thread.output_ready.connect(
-            lambda output: self.main_window.chat_area.append(f"\nOutput:\n{output}")
+        self.output_stream = None
+        self.output_digest = OutputDigest(self.main_window.chat_session.max_output_chars)
+        target = self.target_combo.currentData() or LOCAL
+        runner_factory = cwd = None
+        if target != LOCAL:
+            runner_factory = self.main_window.fanout_factory(target)
+        elif self.main_window.persistent_shell_checkbox.isChecked():
+            # Recorded with the directory the shell was in when it was queued
+            session = self.main_window.obtain_shell_session()
+            runner_factory = functools.partial(SessionRunner, session=session)
+            cwd = session.cwd
+        self.execution = CommandExecution(command, timeout=self.timeout_input.value() or None,
+                                          target=target, runner_factory=runner_factory, cwd=cwd,
+                                          spool=OutputSpool())
+        self.execution.output_ready.connect(
+            lambda output: self.append_output("Output", output)
         )
-        self.command_thread.error_occurred.connect(
-            lambda error: self.main_window.chat_area.append(f"\nError:\n{error}")
+        self.execution.error_occurred.connect(
+            lambda error: self.append_output("Error", error)
         )
-        self.command_thread.finished.connect(self.on_command_finished)
-        
-        self.main_window.chat_area.append(f"\n> Executing: {command}")
-        self.command_thread.start()
+        self.execution.state_changed.connect(self.on_state_changed)
+        self.execution.finished.connect(self.on_command_finished)
+        return self.execution.job
+    
+    def on_state_changed(self, state):
+        if state == RUNNING:
+            self.execute_btn.setText("⏳ Running...")
+            where = '' if self.execution.target == LOCAL else f" on {self.target_combo.currentText()}"
+            self.main_window.chat_area.append(f"\n> Executing{where}: {self.execution.command}")
+            self.output_pane = self.main_window.open_output_pane(self.execution)
+            self.output_btn.setEnabled(True)
+        elif state == QUEUED:
+            self.execute_btn.setText("⏳ Queued...")
+        if state in (DONE, FAILED) and self.execution.exit_code is not None:
+            self.state_label.setText(f"{state} (exit {self.execution.exit_code})")
+        else:
+            self.state_label.setText(state)
+        set_style_state(self.state_label, state)
+    
+    def append_output(self, stream, text):
+        # The pane shows the raw output from the spool; these batches only
+        # feed the digest for the model, labelled when the stream switches
+        if '\x1b' in text or '\r' in text:
+            text = '\n'.join(strip_ansi(line) for line in text.split('\n'))
+        if stream != self.output_stream:
+            self.output_stream = stream
+            text = f"{stream}:\n{text}"
+        self.output_digest.add(text + '\n')
+    
+    def stop_command(self):
+        if self.execution:
+            self.stop_btn.setEnabled(False)
+            self.main_window.command_scheduler.cancel(self.execution.job)
     
     def on_command_finished(self):
+        # The next prompt carries this output so the model can follow up on it
+        if self.execution.job.state not in (SKIPPED, CANCELLED) or self.execution.exit_code is not None:
+            self.main_window.chat_session.add_command_output(
+                self.execution.command,
+                self.output_digest.text(),
+                self.execution.exit_code
+            )
+        self.main_window.record_history(self.execution.job, self.output_digest.text())
+        spool = self.execution.job.spool
+        spool.close()
+        if self.output_pane is not None and self.output_pane.spool is spool:
+            self.output_pane.finish()
+            job = self.execution.job
+            status = job.state if job.exit_code is None else f"exit {job.exit_code}"
+            self.main_window.chat_area.append(
+                f"[{status} · {format_size(spool.size)}, {spool.lines:,} lines of output]")
+        else:
+            spool.remove()
         self.execute_btn.setEnabled(True)
         self.execute_btn.setText("▶ Execute")
-        self.command_thread = None
+        self.stop_btn.setEnabled(False)
+        self.execution = None
+        # It may have installed or removed programs
+        self.main_window.command_check.refresh()
 
 class GeminiChatApp(QMainWindow):
     def __init__(self):
@@ -333,38 +893,69 @@ class GeminiChatApp(QMainWindow):
         # Set window flags for custom styling
         self.setWindowFlags(Qt.Window | Qt.CustomizeWindowHint | Qt.WindowTitleHint | Qt.WindowMinimizeButtonHint | Qt.WindowMaximizeButtonHint | Qt.WindowCloseButtonHint)
         
-        self.setStyleSheet(f"""
-            QMainWindow {{
-                background-color: {COLORS['bg_dark']};
-                border: 3px solid {COLORS['border_glow']};
-                border-radius: 10px;
-            }}
-            QMainWindow::title {{
-                background-color: {COLORS['bg_medium']};
-                color: {COLORS['text']};
-                padding: 10px;
-                border-top-left-radius: 10px;
-                border-top-right-radius: 10px;
-            }}
-            QScrollBar:vertical {{
-                background-color: {COLORS['bg_medium']};
-                width: 12px;
-                margin: 0px;
-                border-radius: 6px;
-            }}
-            QScrollBar::handle:vertical {{
-                background-color: {COLORS['primary']};
-                min-height: 20px;
-                border-radius: 6px;
-            }}
-            QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {{
-                height: 0px;
-            }}
-        """)
-        
-        self.api_key_file = os.path.join(os.path.dirname(__file__), 'api_key.json')
+        apply_theme(QApplication.instance())
+        
+        try:
+            self.response_cache = ResponseCache()
+        except (OSError, sqlite3.Error):
+            self.response_cache = None
+        self.config = load_config()
+        try:
+            self.backends = backends_from_config(self.config)
+        except ValueError as e:
+            print(f"backends: {e}; using gemini", file=sys.stderr)
+            self.backends = Backends()
+        self.ai_client = ModelClient(model_factory=self.backends.model_factory,
+                                     configure=self.backends.configure,
+                                     close=self.backends.close, cache=self.response_cache)
+        self.telemetry = telemetry_from_config(self.config)
+        self.engine = engine_from_config(self.ai_client, self.config,
+                                         telemetry=self.telemetry).start()
+        self.stats_dialog = None
+        try:
+            self.history_store = HistoryStore()
+        except (OSError, sqlite3.Error):
+            self.history_store = None
+        self.history_dialog = None
+        self.docs_index = None
+        if self.config['context']['docs']:
+            try:
+                self.docs_index = DocsIndex()
+            except (OSError, sqlite3.Error):
+                self.docs_index = None
+        self.default_command_timeout = 0
+        self.transcript_max_blocks = 2000
+        self.command_pool = []
+        self.command_pool_size = 32
+        self.command_scheduler = CommandScheduler(max_parallel=2, telemetry=self.telemetry)
+        self.command_analyzer = CommandAnalyzer(shell=self.config['shell']['program'])
+        self.command_check = CommandCheck(self.command_analyzer)
+        self.command_check.checked.connect(self.show_command_check)
+        self.command_check.paths_changed.connect(self.recheck_commands)
+        self.max_output_panes = 10
+        self.inventory_path = inventory_path(self.config)
+        self.inventory = Inventory()
+        self.inventory_mtime = None
+        self.ssh_transport = transport_from_config(self.config)
+        self.shell_session = None
+        self.system_context = SystemContext(enabled=self.config['context']['system']).start()
+        self.model_name = DEFAULT_MODEL
+        self.ai_request = None
+        self.chat_session = ChatSession()
+        self.pending_turn = None
+        
+        self.api_key_file = API_KEY_FILE
         self.load_api_key()
         
+        # Streamed chunks are buffered and flushed to the chat area once per frame
+        self.stream_responses = True
+        self.streaming = False
+        self.pending_chunks = []
+        self.chunk_flush_timer = QTimer(self)
+        self.chunk_flush_timer.setSingleShot(True)
+        self.chunk_flush_timer.setInterval(16)
+        self.chunk_flush_timer.timeout.connect(self.flush_ai_chunks)
+        
         main_widget = QWidget()
         self.setCentralWidget(main_widget)
         main_layout = QVBoxLayout(main_widget)
@@ -373,133 +964,141 @@ class GeminiChatApp(QMainWindow):
         
         header_layout = QHBoxLayout()
         self.api_status_label = QLabel("API Key: Not Set")
-        self.api_status_label.setStyleSheet(f"""
-            QLabel {{
-                color: {COLORS['error']};
-                padding: 5px 10px;
-                background-color: {COLORS['bg_dark']};
-                border-radius: 5px;
-            }}
-        """)
+        self.api_status_label.setObjectName("apiStatus")
+        self.api_status_label.setProperty("state", "error")
         header_layout.addWidget(self.api_status_label)
         
         self.api_key_button = QPushButton("Manage API Key")
-        self.api_key_button.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['text']};
-                border: none;
-                padding: 5px 15px;
-                border-radius: 5px;
-                font-weight: bold;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['primary_hover']};
-            }}
-        """)
+        self.api_key_button.setProperty("variant", "header")
         self.api_key_button.clicked.connect(self.manage_api_key)
         header_layout.addWidget(self.api_key_button)
+        
+        self.new_chat_button = QPushButton("New Chat")
+        self.new_chat_button.setProperty("variant", "subtle")
+        self.new_chat_button.clicked.connect(self.new_chat)
+        header_layout.addWidget(self.new_chat_button)
+        
+        self.history_button = QPushButton("History")
+        self.history_button.setProperty("variant", "subtle")
+        self.history_button.setEnabled(self.history_store is not None)
+        self.history_button.clicked.connect(self.show_history)
+        header_layout.addWidget(self.history_button)
+        
+        self.stats_button = QPushButton("Stats")
+        self.stats_button.setProperty("variant", "subtle")
+        self.stats_button.clicked.connect(self.show_stats)
+        header_layout.addWidget(self.stats_button)
         header_layout.addStretch()
         main_layout.addLayout(header_layout)
         
         splitter = QSplitter(Qt.Vertical)
         
-        self.chat_area = TerminalTextEdit()
-        splitter.addWidget(self.chat_area)
+        # The chat is the first tab; every command run adds a tab with its output
+        self.chat_area = TerminalTextEdit(max_blocks=self.transcript_max_blocks)
+        self.output_tabs = QTabWidget()
+        self.output_tabs.setObjectName("outputTabs")
+        self.output_tabs.setTabsClosable(True)
+        self.output_tabs.addTab(self.chat_area, "Chat")
+        self.output_tabs.tabBar().setTabButton(0, QTabBar.RightSide, None)
+        self.output_tabs.tabBar().setTabButton(0, QTabBar.LeftSide, None)
+        self.output_tabs.tabCloseRequested.connect(self.close_output_tab)
+        splitter.addWidget(self.output_tabs)
         
         commands_scroll = QScrollArea()
         commands_scroll.setWidgetResizable(True)
-        commands_scroll.setStyleSheet(f"""
-            QScrollArea {{
-                background-color: {COLORS['bg_dark']};
-                border: none;
-                border-radius: 5px;
-            }}
-        """)
+        commands_scroll.setObjectName("commandsScroll")
         
         self.commands_area = QWidget()
-        self.commands_area.setStyleSheet(f"background-color: {COLORS['bg_dark']};")
+        self.commands_area.setObjectName("commandsArea")
         self.commands_layout = QVBoxLayout(self.commands_area)
         self.commands_layout.setContentsMargins(10, 10, 10, 10)
         self.commands_layout.setSpacing(5)
         commands_scroll.setWidget(self.commands_area)
-        splitter.addWidget(commands_scroll)
+        
+        commands_panel = QWidget()
+        commands_panel_layout = QVBoxLayout(commands_panel)
+        commands_panel_layout.setContentsMargins(0, 0, 0, 0)
+        commands_panel_layout.setSpacing(5)
+        
+        run_all_layout = QHBoxLayout()
+        self.run_all_button = QPushButton("▶ Run all")
+        self.run_all_button.setProperty("variant", "header")
+        self.run_all_button.clicked.connect(self.run_all_commands)
+        run_all_layout.addWidget(self.run_all_button)
+        self.run_mode_combo = QComboBox()
+        self.run_mode_combo.addItems(["Sequential", "Parallel"])
+        run_all_layout.addWidget(self.run_mode_combo)
+        self.stop_on_failure_checkbox = QCheckBox("Stop on failure")
+        self.stop_on_failure_checkbox.setChecked(True)
+        run_all_layout.addWidget(self.stop_on_failure_checkbox)
+        self.persistent_shell_checkbox = QCheckBox("Persistent shell")
+        self.persistent_shell_checkbox.setToolTip(
+            "Run local commands in one shell per conversation, so cd and export carry over")
+        self.persistent_shell_checkbox.setChecked(bool(self.config['shell']['persistent']))
+        run_all_layout.addWidget(self.persistent_shell_checkbox)
+        run_all_layout.addStretch()
+        max_parallel_label = QLabel("Max parallel:")
+        max_parallel_label.setObjectName("fieldLabel")
+        run_all_layout.addWidget(max_parallel_label)
+        self.max_parallel_input = QSpinBox()
+        self.max_parallel_input.setRange(1, 16)
+        self.max_parallel_input.setValue(self.command_scheduler.max_parallel)
+        self.max_parallel_input.valueChanged.connect(self.command_scheduler.set_max_parallel)
+        run_all_layout.addWidget(self.max_parallel_input)
+        commands_panel_layout.addLayout(run_all_layout)
+        commands_panel_layout.addWidget(commands_scroll)
+        splitter.addWidget(commands_panel)
         
         main_layout.addWidget(splitter)
         
         input_frame = QFrame()
-        input_frame.setStyleSheet(f"""
-            QFrame {{
-                background-color: {COLORS['bg_medium']};
-                border: 2px solid {COLORS['border']};
-                border-radius: 8px;
-            }}
-        """)
+        input_frame.setObjectName("inputFrame")
         input_layout = QHBoxLayout(input_frame)
         input_layout.setContentsMargins(15, 10, 15, 10)
         
         self.input_field = QLineEdit()
-        self.input_field.setStyleSheet(f"""
-            QLineEdit {{
-                background-color: {COLORS['bg_dark']};
-                color: {COLORS['text']};
-                border: 2px solid {COLORS['border']};
-                border-radius: 5px;
-                padding: 8px;
-                font-family: 'Ubuntu Mono', 'Courier New';
-                font-size: 14px;
-            }}
-            QLineEdit:focus {{
-                border: 2px solid {COLORS['primary']};
-            }}
-        """)
         self.input_field.setPlaceholderText("Type your message here...")
         self.input_field.returnPressed.connect(self.send_message)
         input_layout.addWidget(self.input_field)
         
         self.send_button = QPushButton("Send")
-        self.send_button.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {COLORS['accent']};
-                color: {COLORS['bg_dark']};
-                border: none;
-                padding: 8px 20px;
-                border-radius: 5px;
-                font-weight: bold;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['text']};
-            }}
-        """)
+        self.send_button.setProperty("variant", "accent")
         self.send_button.clicked.connect(self.send_message)
         input_layout.addWidget(self.send_button)
         
         main_layout.addWidget(input_frame)
         
+        status_bar = self.statusBar()
+        self.cache_status_label = QLabel()
+        status_bar.addPermanentWidget(self.cache_status_label)
+        self.cache_checkbox = QCheckBox("Use response cache")
+        self.cache_checkbox.setChecked(self.response_cache is not None)
+        self.cache_checkbox.setEnabled(self.response_cache is not None)
+        self.cache_checkbox.toggled.connect(self.toggle_response_cache)
+        status_bar.addPermanentWidget(self.cache_checkbox)
+        self.update_cache_status()
+        self.metrics_url = self.start_metrics_endpoint()
+        self.refresh_inventory()
+        
         self.show_welcome_message()
         self.input_field.setFocus()
         self.update_api_status()
 
     def load_api_key(self):
-        try:
-            if os.path.exists(self.api_key_file):
-                with open(self.api_key_file, 'r') as f:
-                    data = json.load(f)
-                    api_key = data.get('api_key', '')
-                    if api_key:
-                        genai.configure(api_key=api_key)
-                        return True
-            return False
-        except Exception as e:
-            self.show_status_message(f"Error loading API key: {str(e)}")
-            return False
+        # Same lookup as the CLI and the lite frontend: GEMINI_API_KEY or
+        # GOOGLE_API_KEY first, then the saved file
+        self.api_key = load_api_key(self.api_key_file)
+        if self.api_key:
+            self.ai_client.configure(self.api_key)
+            return True
+        return False
 
     def save_api_key(self, api_key):
         try:
             with open(self.api_key_file, 'w') as f:
                 json.dump({'api_key': api_key}, f)
-            genai.configure(api_key=api_key)
+            self.api_key = api_key
+            self.ai_client.configure(api_key)
             self.update_api_status()
             self.show_status_message("✓ API Key updated successfully!")
             return True
@@ -508,44 +1107,90 @@ class GeminiChatApp(QMainWindow):
             return False
 
     def update_api_status(self):
-        has_api_key = os.path.exists(self.api_key_file)
-        if has_api_key:
+        if self.api_key:
             self.api_status_label.setText("API Key: ✓ Set")
-            self.api_status_label.setStyleSheet(f"""
-                QLabel {{
-                    color: {COLORS['success']};
-                    padding: 5px 10px;
-                    background-color: {COLORS['bg_dark']};
-                    border-radius: 5px;
-                }}
-            """)
+            set_style_state(self.api_status_label, 'ok')
+        elif not self.backends.needs_api_key:
+            self.api_status_label.setText("API Key: not needed")
+            set_style_state(self.api_status_label, 'ok')
         else:
             self.api_status_label.setText("API Key: ❌ Not Set")
-            self.api_status_label.setStyleSheet(f"""
-                QLabel {{
-                    color: {COLORS['error']};
-                    padding: 5px 10px;
-                    background-color: {COLORS['bg_dark']};
-                    border-radius: 5px;
-                }}
-            """)
+            set_style_state(self.api_status_label, 'error')
+        if self.backends.order != ['gemini']:
+            self.api_status_label.setText(self.api_status_label.text() +
+                                          f" · {' → '.join(self.backends.order)}")
 
     def manage_api_key(self):
-        current_api_key = ''
-        try:
-            if os.path.exists(self.api_key_file):
-                with open(self.api_key_file, 'r') as f:
-                    data = json.load(f)
-                    current_api_key = data.get('api_key', '')
-        except Exception:
-            pass
-
-        dialog = APIKeyDialog(self, current_api_key)
+        dialog = APIKeyDialog(self, self.api_key or '')
         if dialog.exec_() == QDialog.Accepted:
             new_api_key = dialog.api_key_input.text().strip()
             if new_api_key:
                 self.save_api_key(new_api_key)
 
+    def toggle_response_cache(self, enabled):
+        if self.response_cache is not None:
+            self.response_cache.enabled = enabled
+        self.update_cache_status()
+
+    def update_cache_status(self):
+        if self.response_cache is None:
+            self.cache_status_label.setText("Cache: unavailable")
+        elif not self.response_cache.enabled:
+            self.cache_status_label.setText("Cache: bypassed")
+        else:
+            self.cache_status_label.setText(
+                f"Cache: {self.response_cache.hits} hits / {self.response_cache.misses} misses"
+            )
+
+    def start_metrics_endpoint(self):
+        port = self.config['telemetry'].get('prometheus_port')
+        if not port:
+            return None
+        try:
+            host, port = self.telemetry.serve(port)
+            return f"http://{host}:{port}/metrics"
+        except OSError as e:
+            self.statusBar().showMessage(f"Metrics endpoint not started: {e}", 5000)
+            return None
+
+    def show_stats(self):
+        if self.stats_dialog is None:
+            self.stats_dialog = StatsDialog(self.telemetry, self.metrics_url, self)
+        self.stats_dialog.refresh()
+        self.stats_dialog.show()
+        self.stats_dialog.raise_()
+
+    def show_history(self):
+        if self.history_dialog is None:
+            self.history_dialog = HistoryDialog(self.history_store, self)
+        self.history_dialog.run_search()
+        self.history_dialog.show()
+        self.history_dialog.raise_()
+        self.history_dialog.search_input.setFocus()
+
+    def record_history(self, job, output):
+        # Jobs cancelled or skipped before they started never ran
+        if self.history_store is None or job.started is None:
+            return
+        try:
+            self.history_store.record(job.command, job.exit_code, job.state, job.duration,
+                                      job.cwd, job.started, output)
+        except sqlite3.Error as e:
+            self.statusBar().showMessage(f"Command not saved to history: {e}", 5000)
+
+    def rerun_command(self, command):
+        # History entries run through an ordinary command card, so they are
+        # scheduled, displayed and recorded exactly like a fresh suggestion
+        widget = self.obtain_command_widget(command)
+        self.commands_layout.insertWidget(0, widget)
+        widget.show()
+        widget.execute_command()
+
+    def new_chat(self):
+        self.chat_session.clear()
+        self.close_shell_session()
+        self.chat_area.append("\n--- New conversation: earlier messages are no longer sent as context ---")
+
     def show_welcome_message(self):
         welcome_message = """Welcome to LinuxAI > 🚀
         
@@ -561,22 +1206,6 @@ Dev @ZeroXJacks
         msg = QMessageBox(self)
         msg.setWindowTitle("Status")
         msg.setText(message)
-        msg.setStyleSheet(f"""
-            QMessageBox {{
-                background-color: {COLORS['bg_dark']};
-                color: {COLORS['text']};
-            }}
-            QPushButton {{
-                background-color: {COLORS['primary']};
-                color: {COLORS['text']};
-                border: none;
-                padding: 5px 15px;
-                border-radius: 3px;
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['primary_hover']};
-            }}
-        """)
         msg.exec_()
 
     def send_message(self):
@@ -584,7 +1213,7 @@ Dev @ZeroXJacks
         if not message:
             return
             
-        if not os.path.exists(self.api_key_file):
+        if self.backends.needs_api_key and not self.api_key:
             self.show_status_message("Please set up your API key first!")
             return
         
@@ -595,40 +1224,280 @@ Dev @ZeroXJacks
         self.chat_area.append(f"\nYou: {message}")
         self.input_field.clear()
         
-        self.response_thread = AIResponseThread(message)
-        self.response_thread.response_ready.connect(self.handle_ai_response)
-        self.response_thread.error_occurred.connect(self.handle_ai_error)
-        self.response_thread.finished.connect(self.on_response_finished)
-        self.response_thread.start()
+        self.streaming = False
+        self.pending_chunks = []
+        header = self.system_context.header()
+        contents, self.pending_turn = self.chat_session.prepare(
+            message, context=header, documentation=self.documentation_for(message))
+        self.ai_request = AIRequest(self.engine, contents,
+                                    model_name=self.model_name,
+                                    stream=self.stream_responses,
+                                    cache_prompt=self.chat_session.cache_prompt(message, header))
+        self.ai_request.chunk_ready.connect(self.handle_ai_chunk)
+        self.ai_request.commands_ready.connect(self.update_command_cards)
+        self.ai_request.retrying.connect(self.handle_ai_retry)
+        self.ai_request.response_ready.connect(self.handle_ai_response)
+        self.ai_request.error_occurred.connect(self.handle_ai_error)
+        self.ai_request.finished.connect(self.on_response_finished)
+        self.ai_request.start()
     
-    def handle_ai_response(self, response):
-        self.chat_area.append(f"\nAI: {response}")
-        self.detect_and_add_execute_buttons(response)
+    def documentation_for(self, message):
+        # A few milliseconds on the GUI thread; empty until the index is built
+        if self.docs_index is None:
+            return ''
+        settings = self.config['context']
+        try:
+            return self.docs_index.prompt_text(message, settings['docs_snippets'],
+                                               settings['docs_snippet_chars'])
+        except sqlite3.Error:
+            return ''
+
+    def handle_ai_chunk(self, chunk):
+        if not self.streaming:
+            self.streaming = True
+            self.chat_area.append("\nAI: ")
+        self.pending_chunks.append(chunk)
+        if not self.chunk_flush_timer.isActive():
+            self.chunk_flush_timer.start()
+    
+    def flush_ai_chunks(self):
+        self.chunk_flush_timer.stop()
+        if not self.pending_chunks:
+            return
+        text = ''.join(self.pending_chunks)
+        self.pending_chunks = []
+        
+        self.chat_area.insert_text(text)
+    
+    def handle_ai_response(self, result):
+        # While streaming, command cards already appeared as each code block
+        # closed (commands_ready); this settles the final list
+        if self.streaming:
+            self.flush_ai_chunks()
+            self.streaming = False
+        else:
+            self.chat_area.append(f"\nAI: {result.response}")
+        self.chat_session.commit(self.pending_turn, result.response)
+        self.update_command_cards(result.commands)
+    
+    def handle_ai_retry(self, attempt, delay, error):
+        self.send_button.setText(f"⏳ Retry {attempt} in {delay:.0f}s...")
+        self.statusBar().showMessage(f"Request failed ({error.splitlines()[0][:80]}), "
+                                     f"retrying in {delay:.1f}s", int(delay * 1000) + 2000)
     
     def handle_ai_error(self, error):
+        if self.streaming:
+            self.flush_ai_chunks()
+            self.streaming = False
         self.chat_area.append(f"\nError: {error}")
     
     def on_response_finished(self):
+        self.ai_request = None
+        self.update_cache_status()
         self.input_field.setEnabled(True)
         self.send_button.setEnabled(True)
         self.send_button.setText("Send")
         self.input_field.setFocus()
 
-    def detect_and_add_execute_buttons(self, response):
-        for i in reversed(range(self.commands_layout.count())): 
-            self.commands_layout.itemAt(i).widget().setParent(None)
+    def run_all_commands(self):
+        jobs = []
+        for i in range(self.commands_layout.count()):
+            widget = self.commands_layout.itemAt(i).widget()
+            if widget.execution is None:
+                jobs.append(widget.create_job())
+        if jobs:
+            self.command_scheduler.run_all(
+                jobs,
+                sequential=self.run_mode_combo.currentText() == "Sequential",
+                stop_on_failure=self.stop_on_failure_checkbox.isChecked()
+            )
+
+    def refresh_inventory(self):
+        # Re-reads the inventory when the file has changed; cheap enough to
+        # call whenever new command cards are shown
+        try:
+            mtime = os.stat(self.inventory_path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self.inventory_mtime:
+            return False
+        self.inventory_mtime = mtime
+        try:
+            self.inventory = load_inventory(self.inventory_path)
+        except (OSError, InventoryError) as e:
+            self.inventory = Inventory()
+            self.show_status_message(f"Inventory not loaded: {e}")
+        return True
+
+    def fanout_factory(self, target):
+        return functools.partial(FanoutRunner, hosts=self.inventory.resolve(target),
+                                 transport=self.ssh_transport,
+                                 max_parallel=self.config['ssh']['max_parallel'])
+
+    def obtain_shell_session(self):
+        # Started by the first command that runs in it, on a pool thread
+        if self.shell_session is None:
+            self.shell_session = ShellSession(program=self.config['shell']['program'])
+        return self.shell_session
+
+    def close_shell_session(self):
+        if self.shell_session is not None:
+            self.shell_session.retire()
+            self.shell_session = None
+
+    def open_output_pane(self, execution):
+        pane = OutputPane(execution.job.spool, execution.command)
+        title = execution.command.split('\n', 1)[0]
+        if len(title) > 24:
+            title = title[:23] + '…'
+        index = self.output_tabs.addTab(pane, title)
+        self.output_tabs.setTabToolTip(index, execution.command)
+        # Each tab keeps a temp file; drop the oldest finished ones
+        excess = len(self.output_panes()) - self.max_output_panes
+        for old in self.output_panes():
+            if excess <= 0:
+                break
+            if not old.running:
+                self.close_output_pane(old)
+                excess -= 1
+        # Don't pull the user away from the output of another running command
+        current = self.output_tabs.currentWidget()
+        if not (isinstance(current, OutputPane) and current.running):
+            self.output_tabs.setCurrentWidget(pane)
+        return pane
+
+    def output_panes(self):
+        return [self.output_tabs.widget(i) for i in range(1, self.output_tabs.count())]
+
+    def close_output_tab(self, index):
+        if index > 0:
+            self.close_output_pane(self.output_tabs.widget(index))
+
+    def close_output_pane(self, pane):
+        self.output_tabs.removeTab(self.output_tabs.indexOf(pane))
+        pane.close_output()
+        pane.deleteLater()
+
+    def closeEvent(self, event):
+        self.ai_client.shutdown()
+        self.engine.close()
+        if self.response_cache is not None:
+            self.response_cache.close()
+        self.chat_area.transcript.close()
+        self.command_scheduler.shutdown()
+        self.command_analyzer.close()
+        self.ssh_transport.close()
+        self.close_shell_session()
+        for pane in self.output_panes():
+            pane.close_output()
+        for i in range(self.commands_layout.count()):
+            execution = self.commands_layout.itemAt(i).widget().execution
+            if execution is not None:
+                execution.job.spool.remove()
+        if self.history_store is not None:
+            self.history_store.close()
+        if self.docs_index is not None:
+            self.docs_index.close()
+        self.telemetry.close()
+        super().closeEvent(event)
+
+    def update_command_cards(self, commands):
+        # Keep cards whose suggestion is unchanged and reset the other idle
+        # ones in place for the new suggestions; only what is left over goes
+        # back to the pool, which grows to the most cards shown at once. A
+        # card with a queued or running command is never reused; it stays
+        # after the new suggestions until its command finishes.
+        inventory_changed = self.refresh_inventory()
+        current = {}
+        shown = []
+        for i in range(self.commands_layout.count()):
+            widget = self.commands_layout.itemAt(i).widget()
+            current.setdefault(widget.command, []).append(widget)
+            shown.append(widget)
+            if inventory_changed:
+                widget.update_targets()
+        
+        cards = []
+        for command in commands:
+            matches = current.get(command)
+            cards.append(matches.pop(0) if matches else None)
         
-        command_blocks = re.findall(r'```(.*?)```', response, re.DOTALL)
-        for command in command_blocks:
-            command = command.strip()
-            if command.startswith('bash') or command.startswith('shell'):
-                command = command[4:].strip()
-            if command:
-                command_widget = CommandWidget(command, self)
-                self.commands_layout.addWidget(command_widget)
+        unused = {widget for widgets in current.values() for widget in widgets}
+        running = [widget for widget in shown if widget in unused and widget.execution]
+        spare = [widget for widget in shown if widget in unused and not widget.execution]
+        spare.reverse()
+        for index, command in enumerate(commands):
+            if cards[index] is None:
+                if spare:
+                    cards[index] = spare.pop()
+                    cards[index].reset(command)
+                else:
+                    cards[index] = self.obtain_command_widget(command)
+        self.command_pool_size = max(self.command_pool_size, len(cards) + len(running))
+        for widget in spare:
+            self.recycle_command_widget(widget)
+        cards.extend(running)
+        
+        for index, widget in enumerate(cards):
+            if self.commands_layout.indexOf(widget) != index:
+                self.commands_layout.removeWidget(widget)
+                self.commands_layout.insertWidget(index, widget)
+            widget.show()
+
+    def show_command_check(self, analysis):
+        for i in range(self.commands_layout.count()):
+            widget = self.commands_layout.itemAt(i).widget()
+            if widget.command_input.text() == analysis.command:
+                widget.show_analysis(analysis)
+
+    def recheck_commands(self):
+        # PATH changed: cached results are re-resolved, nothing is re-run
+        for i in range(self.commands_layout.count()):
+            self.commands_layout.itemAt(i).widget().check_command()
+
+    def obtain_command_widget(self, command):
+        if self.command_pool:
+            widget = self.command_pool.pop()
+            widget.reset(command)
+            return widget
+        return CommandWidget(command, self)
+
+    def recycle_command_widget(self, widget):
+        self.commands_layout.removeWidget(widget)
+        widget.hide()
+        if len(self.command_pool) < self.command_pool_size:
+            self.command_pool.append(widget)
+        else:
+            widget.deleteLater()
+
+def print_startup_profile(warm_up_seconds=None):
+    print("Startup profile:", file=sys.stderr)
+    started = previous = startup_marks[0][1]
+    for label, stamp in startup_marks[1:]:
+        print(f"  {label:<22} {(stamp - previous) * 1000:8.1f} ms   "
+              f"(total {(stamp - started) * 1000:8.1f} ms)", file=sys.stderr)
+        previous = stamp
+    if warm_up_seconds is not None:
+        print(f"  {'SDK warm-up (bg)':<22} {warm_up_seconds * 1000:8.1f} ms", file=sys.stderr)
+
+def start_warm_up(window, profile):
+    started = time.perf_counter()
+    future = window.ai_client.warm_up(window.model_name)
+    window.command_analyzer.start()
+    if window.docs_index is not None:
+        window.docs_index.start_update()
+    if profile:
+        future.add_done_callback(
+            lambda _: print_startup_profile(time.perf_counter() - started)
+        )
 
 if __name__ == "__main__":
+    profile_startup = '--profile-startup' in sys.argv
+    if profile_startup:
+        sys.argv.remove('--profile-startup')
+    
     app = QApplication(sys.argv)
+    startup_marks.append(('QApplication', time.perf_counter()))
     
     # Set application icon globally
     icon_path = os.path.join(os.path.dirname(__file__), 'cyber_linux_ai_icon.svg')
@@ -636,5 +1505,14 @@ if __name__ == "__main__":
         app.setWindowIcon(QIcon(icon_path))
     
     window = GeminiChatApp()
+    startup_marks.append(('GeminiChatApp()', time.perf_counter()))
     window.show()
+    startup_marks.append(('show()', time.perf_counter()))
+    
+    # Runs once the first paint has been processed; the SDK then loads on a
+    # worker thread while the window is already usable
+    def on_first_paint():
+        startup_marks.append(('first paint', time.perf_counter()))
+        start_warm_up(window, profile_startup)
+    QTimer.singleShot(0, on_first_paint)
     sys.exit(app.exec_())
@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MODEL = 'gemini-1.5-flash'
+API_KEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api_key.json')
+
+
+# The SDK pulls in grpc, protobuf and google-auth, so it is only imported on
+# a worker thread, when the first model is built or during warm_up().
+def gemini_configure(api_key):
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+
+
+def gemini_model_factory(model_name):
+    import google.generativeai as genai
+    return genai.GenerativeModel(model_name)
+
+
+def load_api_key(path=API_KEY_FILE):
+    key = os.environ.get('GEMINI_API_KEY') or os.environ.get('GOOGLE_API_KEY')
+    if key:
+        return key
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get('api_key')
+    except (OSError, ValueError):
+        return None
+
+
+def read_usage(response, usage):
+    metadata = getattr(response, 'usage_metadata', None)
+    if usage is None or metadata is None:
+        return
+    usage['prompt_tokens'] = getattr(metadata, 'prompt_token_count', None)
+    usage['response_tokens'] = getattr(metadata, 'candidates_token_count', None)
+
+
+class ModelClient:
+    # Long-lived model service: one model instance per model name (each keeps
+    # its transport channel open between requests) and a fixed worker pool
+    # that requests are queued onto instead of a new thread per prompt.
+    def __init__(self, model_factory=gemini_model_factory, configure=gemini_configure,
+                 max_workers=2, cache=None, close=None):
+        self.model_factory = model_factory
+        self.configure_backend = configure
+        self.close_backend = close
+        self.cache = cache
+        self.api_key = None
+        self.configured = False
+        self.models = {}
+        self.lock = threading.Lock()
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='linuxai-ai')
+
+    def get_model(self, model_name=DEFAULT_MODEL):
+        with self.lock:
+            model = self.models.get(model_name)
+            if model is None:
+                self.ensure_configured()
+                model = self.model_factory(model_name)
+                self.models[model_name] = model
+            return model
+
+    def configure(self, api_key):
+        # Models hold clients bound to the configured API key, so they must be
+        # rebuilt after the key changes.
+        with self.lock:
+            self.api_key = api_key
+            self.configured = False
+            self.models.clear()
+
+    def ensure_configured(self):
+        if not self.configured and self.api_key and self.configure_backend:
+            self.configure_backend(self.api_key)
+            self.configured = True
+
+    def warm_up(self, model_name=DEFAULT_MODEL):
+        return self.submit(self.prepare_model, model_name)
+
+    def prepare_model(self, model_name=DEFAULT_MODEL):
+        # Builds the model and lets a local backend load its weights
+        model = self.get_model(model_name)
+        warm = getattr(model, 'warm_up', None)
+        if warm is not None:
+            warm()
+        return model
+
+    def generate(self, prompt, model_name=DEFAULT_MODEL, stream=False, on_chunk=None):
+        response = self.lookup(prompt, model_name)
+        if response is not None:
+            if stream and on_chunk:
+                on_chunk(response)
+            return response
+        response = self.generate_uncached(prompt, model_name, stream, on_chunk)
+        self.store(prompt, model_name, response)
+        return response
+
+    def lookup(self, prompt, model_name=DEFAULT_MODEL):
+        if self.cache is None or not self.cache.enabled:
+            return None
+        return self.cache.get(self.cache.make_key(model_name, prompt))
+
+    def store(self, prompt, model_name, response):
+        if response and self.cache is not None and self.cache.enabled:
+            self.cache.put(self.cache.make_key(model_name, prompt), model_name, response)
+
+    def generate_uncached(self, prompt, model_name=DEFAULT_MODEL, stream=False, on_chunk=None,
+                          usage=None):
+        # usage, if given, receives the token counts the API reports
+        model = self.get_model(model_name)
+        if not stream:
+            response = model.generate_content(prompt)
+            read_usage(response, usage)
+            return response.text
+
+        parts = []
+        chunk = None
+        for chunk in model.generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks carrying only finish/safety metadata have no text
+                continue
+            if text:
+                parts.append(text)
+                if on_chunk:
+                    on_chunk(text)
+        read_usage(chunk, usage)
+        return ''.join(parts)
+
+    def submit(self, fn, *args, **kwargs):
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+        if self.close_backend:
+            self.close_backend()
@@ -0,0 +1,120 @@
+import re
+from collections import namedtuple
+
+# CSI sequences (SGR, cursor movement, erase), OSC strings such as window
+# titles and hyperlinks, charset selection and the other two-byte escapes
+ESCAPE = re.compile(r'\x1b(?:\[([0-9;:?<=>]*)[ -/]*([@-~])|\][^\x07\x1b]*(?:\x07|\x1b\\)?'
+                    r'|[()*+][0-9A-Za-z]|[@-Z\\^_=>])')
+PRIVATE_MARKERS = frozenset('?<=>')
+OVERSTRIKE = re.compile(r'[^\x08]\x08')
+CONTROL = re.compile(r'[\x00-\x08\x0b-\x1f\x7f]')
+
+Style = namedtuple('Style', 'fg bg bold dim italic underline inverse strike')
+DEFAULT_STYLE = Style(None, None, False, False, False, False, False, False)
+
+# xterm's default palette for colors 0-15
+BASE_COLORS = (
+    '#000000', '#cd0000', '#00cd00', '#cdcd00', '#0000ee', '#cd00cd', '#00cdcd', '#e5e5e5',
+    '#7f7f7f', '#ff0000', '#00ff00', '#ffff00', '#5c5cff', '#ff00ff', '#00ffff', '#ffffff',
+)
+CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
+ATTRIBUTES = {
+    1: ('bold', True), 2: ('dim', True), 3: ('italic', True), 4: ('underline', True),
+    7: ('inverse', True), 9: ('strike', True), 21: ('underline', True),
+    23: ('italic', False), 24: ('underline', False), 27: ('inverse', False), 29: ('strike', False),
+}
+
+
+def color_256(index):
+    if index < 16:
+        return BASE_COLORS[index]
+    if index < 232:
+        index -= 16
+        levels = (CUBE_LEVELS[index // 36], CUBE_LEVELS[index // 6 % 6], CUBE_LEVELS[index % 6])
+    else:
+        levels = (8 + (index - 232) * 10,) * 3
+    return '#%02x%02x%02x' % levels
+
+
+def extended_color(params, i):
+    # 38/48 ; 5 ; n  or  38/48 ; 2 ; r ; g ; b. Returns (color, next index).
+    if i + 1 < len(params) and params[i + 1] == 5 and i + 2 < len(params):
+        return color_256(min(params[i + 2], 255)), i + 3
+    if i + 1 < len(params) and params[i + 1] == 2 and i + 4 < len(params):
+        rgb = [min(value, 255) for value in params[i + 2:i + 5]]
+        return '#%02x%02x%02x' % tuple(rgb), i + 5
+    return None, len(params)
+
+
+def apply_sgr(style, argument):
+    # Anything that is not a number is skipped rather than guessed at
+    params = [int(value) if value else 0 for value in re.split('[;:]', argument)
+              if not value or value.isdigit()]
+    i = 0
+    while i < len(params):
+        code = params[i]
+        i += 1
+        if code == 0:
+            style = DEFAULT_STYLE
+        elif code in ATTRIBUTES:
+            field, value = ATTRIBUTES[code]
+            style = style._replace(**{field: value})
+        elif code == 22:
+            style = style._replace(bold=False, dim=False)
+        elif 30 <= code <= 37:
+            style = style._replace(fg=BASE_COLORS[code - 30])
+        elif 90 <= code <= 97:
+            style = style._replace(fg=BASE_COLORS[code - 82])
+        elif 40 <= code <= 47:
+            style = style._replace(bg=BASE_COLORS[code - 40])
+        elif 100 <= code <= 107:
+            style = style._replace(bg=BASE_COLORS[code - 92])
+        elif code == 39:
+            style = style._replace(fg=None)
+        elif code == 49:
+            style = style._replace(bg=None)
+        elif code in (38, 48):
+            color, i = extended_color(params, i - 1)
+            if color is not None:
+                style = style._replace(**{'fg' if code == 38 else 'bg': color})
+    return style
+
+
+def parse_segments(text, style=DEFAULT_STYLE):
+    # Splits one line into [(text, Style)] and returns the style in effect at
+    # its end. Only SGR sequences change the style; every other escape is
+    # dropped.
+    segments = []
+    position = 0
+    for match in ESCAPE.finditer(text):
+        if match.start() > position:
+            segments.append((text[position:match.start()], style))
+        # ESC[?...m and ESC[>...m (e.g. xterm modifyOtherKeys) are private
+        # sequences, not SGR
+        if match.group(2) == 'm' and not PRIVATE_MARKERS.intersection(match.group(1)):
+            style = apply_sgr(style, match.group(1))
+        position = match.end()
+    if position < len(text):
+        segments.append((text[position:], style))
+    return segments, style
+
+
+def render_line(text, style=DEFAULT_STYLE):
+    # Like parse_segments, but also resolves what a terminal would show:
+    # backspace overstrikes (man pages) and carriage returns, where only the
+    # text after the last \r remains visible (progress bars)
+    if '\x08' in text:
+        text = OVERSTRIKE.sub('', text)
+    text = text.rstrip('\r')
+    if '\r' in text:
+        *overwritten, text = text.split('\r')
+        for part in overwritten:
+            style = parse_segments(part, style)[1]
+    segments, style = parse_segments(text, style)
+    if any(CONTROL.search(part) for part, _ in segments):
+        segments = [(CONTROL.sub('', part), part_style) for part, part_style in segments]
+    return segments, style
+
+
+def strip_ansi(text):
+    return ''.join(part for part, _ in render_line(text)[0])
@@ -0,0 +1,309 @@
+import functools
+import json
+import os
+import shlex
+import socket
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+
+from ai_client import gemini_configure, gemini_model_factory
+from paths import config_dir
+
+BACKENDS = ('gemini', 'local', 'stub')
+
+# Same shape as the Gemini SDK's responses, which is all ModelClient reads
+Response = namedtuple('Response', 'text usage_metadata')
+Usage = namedtuple('Usage', 'prompt_token_count candidates_token_count')
+
+
+class BackendUnavailable(RuntimeError):
+    pass
+
+
+def prompt_messages(prompt):
+    # Gemini contents (or a plain string) as chat messages
+    if isinstance(prompt, str):
+        return [{'role': 'user', 'content': prompt}]
+    return [{'role': 'assistant' if turn['role'] == 'model' else 'user',
+             'content': '\n'.join(turn['parts'])} for turn in prompt]
+
+
+class StubModel:
+    # Offline, instant and deterministic: the answer only depends on the last
+    # line of the prompt. For tests, demos and checking the GUI without a key.
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def answer(self, prompt):
+        text = prompt_messages(prompt)[-1]['content'].strip()
+        question = text.splitlines()[-1].strip() if text else ''
+        return (f"Stub answer to: {question}\n\n"
+                f"```bash\necho {shlex.quote(question)}\n```\n")
+
+    def generate_content(self, prompt, stream=False):
+        text = self.answer(prompt)
+        usage = Usage(sum(len(m['content']) for m in prompt_messages(prompt)) // 4 + 1,
+                      len(text) // 4 + 1)
+        if not stream:
+            return Response(text, usage)
+        lines = text.splitlines(keepends=True)
+        return iter([Response(line, usage if i == len(lines) - 1 else None)
+                     for i, line in enumerate(lines)])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class LlamaServer:
+    # A llama.cpp server kept running for the life of the app, so the GGUF
+    # weights are loaded once instead of per prompt. Requests that arrive
+    # together are decoded in one batch (`parallel` slots, continuous
+    # batching), and cache_prompt lets a conversation reuse the KV cache of
+    # its unchanged prefix. With `url` an already running server is used.
+    def __init__(self, model_path=None, url=None, binary='llama-server', context_size=4096,
+                 parallel=4, threads=None, startup_timeout=120.0, log_path=None):
+        self.model_path = model_path and os.path.expanduser(model_path)
+        self.url = url.rstrip('/') if url else None
+        self.external = url is not None
+        self.binary = binary
+        self.context_size = context_size
+        self.parallel = max(1, parallel)
+        self.threads = threads
+        self.startup_timeout = startup_timeout
+        self.log_path = log_path or os.path.join(config_dir(), 'llama-server.log')
+        self.process = None
+        self.lock = threading.Lock()
+
+    def argv(self, port):
+        # The context is shared between the slots
+        argv = [self.binary, '-m', self.model_path, '--host', '127.0.0.1', '--port', str(port),
+                '-c', str(self.context_size * self.parallel), '-np', str(self.parallel),
+                '--cont-batching']
+        if self.threads:
+            argv += ['-t', str(self.threads)]
+        return argv
+
+    def ensure_running(self):
+        with self.lock:
+            if self.external or (self.process is not None and self.process.poll() is None):
+                return self.url
+            if not self.model_path:
+                raise BackendUnavailable("no local model configured (backends.local_model)")
+            port = free_port()
+            try:
+                with open(self.log_path, 'ab') as log:
+                    self.process = subprocess.Popen(self.argv(port), stdin=subprocess.DEVNULL,
+                                                    stdout=log, stderr=subprocess.STDOUT,
+                                                    start_new_session=True)
+            except OSError as e:
+                raise BackendUnavailable(f"cannot start {self.binary}: {e}")
+            self.url = f"http://127.0.0.1:{port}"
+            self.wait_ready()
+            return self.url
+
+    def wait_ready(self):
+        # /health answers 503 while the model is loading
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                self.process = None
+                raise BackendUnavailable(f"{self.binary} exited; see {self.log_path}")
+            try:
+                with urllib.request.urlopen(f"{self.url}/health", timeout=1.0) as response:
+                    if response.status == 200:
+                        return
+            except (OSError, urllib.error.URLError):
+                pass
+            time.sleep(0.25)
+        self.close()
+        raise BackendUnavailable(f"{self.binary} not ready after {self.startup_timeout:g}s")
+
+    def close(self):
+        with self.lock:
+            process, self.process = self.process, None
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+class LocalModel:
+    # Chat completions from a LlamaServer through its OpenAI-style endpoint,
+    # which applies the model's own chat template. The model name is ignored:
+    # the server answers with whatever GGUF it loaded.
+    def __init__(self, server, max_tokens=1024, temperature=0.2, timeout=300.0):
+        self.server = server
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.timeout = timeout
+
+    def warm_up(self):
+        self.server.ensure_running()
+
+    def post(self, prompt, stream):
+        body = {'messages': prompt_messages(prompt), 'stream': stream,
+                'max_tokens': self.max_tokens, 'temperature': self.temperature,
+                'cache_prompt': True}
+        request = urllib.request.Request(f"{self.server.ensure_running()}/v1/chat/completions",
+                                         data=json.dumps(body).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    @staticmethod
+    def usage(data):
+        usage = data.get('usage')
+        if not usage:
+            return None
+        return Usage(usage.get('prompt_tokens'), usage.get('completion_tokens'))
+
+    def generate_content(self, prompt, stream=False):
+        if stream:
+            return self.stream(prompt)
+        with self.post(prompt, False) as response:
+            data = json.load(response)
+        return Response(data['choices'][0]['message']['content'] or '', self.usage(data))
+
+    def stream(self, prompt):
+        # Server-sent events, one JSON delta per "data:" line
+        with self.post(prompt, True) as response:
+            for line in response:
+                line = line.strip()
+                if not line.startswith(b'data:'):
+                    continue
+                payload = line[5:].strip()
+                if payload == b'[DONE]':
+                    break
+                data = json.loads(payload)
+                choices = data.get('choices') or [{}]
+                text = (choices[0].get('delta') or {}).get('content') or ''
+                usage = self.usage(data)
+                if text or usage:
+                    yield Response(text, usage)
+
+
+class FailoverModel:
+    # Tries the backends in order, each built on first use from its factory.
+    # The next one takes over when a backend fails before it produced any
+    # text; a stream that broke halfway is not replayed elsewhere. `backend`
+    # names the one that answered last.
+    def __init__(self, factories):
+        self.factories = factories
+        self.models = {}
+        self.backend = None
+        self.failovers = 0
+        self.lock = threading.Lock()
+
+    def model(self, name, factory):
+        with self.lock:
+            if name not in self.models:
+                self.models[name] = factory()
+            return self.models[name]
+
+    def warm_up(self):
+        for name, factory in self.factories:
+            try:
+                warm = getattr(self.model(name, factory), 'warm_up', None)
+                if warm is not None:
+                    warm()
+            except Exception:
+                pass
+
+    def generate_content(self, prompt, stream=False):
+        if stream:
+            return self.stream(prompt)
+        error = None
+        for name, factory in self.factories:
+            try:
+                response = self.model(name, factory).generate_content(prompt)
+                self.backend = name
+                return response
+            except Exception as e:
+                error = e
+                self.failovers += 1
+        raise error
+
+    def stream(self, prompt):
+        error = None
+        for name, factory in self.factories:
+            produced = False
+            try:
+                for chunk in self.model(name, factory).generate_content(prompt, stream=True):
+                    produced = True
+                    yield chunk
+                self.backend = name
+                return
+            except Exception as e:
+                if produced:
+                    raise
+                error = e
+                self.failovers += 1
+        raise error
+
+
+class Backends:
+    # The model factory and configure hook for ModelClient, built from the
+    # "backends" config section. Gemini is left out of the chain while no API
+    # key is set, so a local or stub backend later in the order still works.
+    def __init__(self, order=('gemini',), local_server=None, local_options=None):
+        unknown = [name for name in order if name not in BACKENDS]
+        if unknown or not order:
+            raise ValueError(f"unknown backends {unknown}; choose from {', '.join(BACKENDS)}")
+        self.order = list(order)
+        self.local_server = local_server
+        self.local_options = local_options or {}
+        self.api_key = None
+
+    @property
+    def needs_api_key(self):
+        return all(name == 'gemini' for name in self.order)
+
+    def configure(self, api_key):
+        self.api_key = api_key
+        if 'gemini' in self.order:
+            gemini_configure(api_key)
+
+    def build(self, name, model_name):
+        if name == 'gemini':
+            return gemini_model_factory(model_name)
+        if name == 'local':
+            return LocalModel(self.local_server, **self.local_options)
+        return StubModel(model_name)
+
+    def model_factory(self, model_name):
+        names = [name for name in self.order if name != 'gemini' or self.api_key]
+        if not names:
+            raise BackendUnavailable("no API key set")
+        if len(names) == 1:
+            return self.build(names[0], model_name)
+        return FailoverModel([(name, functools.partial(self.build, name, model_name))
+                              for name in names])
+
+    def close(self):
+        if self.local_server is not None:
+            self.local_server.close()
+
+
+def backends_from_config(config):
+    settings = config['backends']
+    server = None
+    if 'local' in settings['order']:
+        server = LlamaServer(model_path=settings.get('local_model'),
+                             url=settings.get('local_url'),
+                             binary=settings.get('local_server', 'llama-server'),
+                             context_size=settings.get('local_context_size', 4096),
+                             parallel=settings.get('local_parallel', 4),
+                             threads=settings.get('local_threads'),
+                             startup_timeout=settings.get('local_startup_timeout', 120))
+    options = {'max_tokens': settings.get('local_max_tokens', 1024),
+               'temperature': settings.get('local_temperature', 0.2)}
+    return Backends(settings['order'], server, options)
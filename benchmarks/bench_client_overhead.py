@@ -0,0 +1,97 @@
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_client import ModelClient, DEFAULT_MODEL, gemini_configure, gemini_model_factory
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class LocalModel:
+    # A real GenerativeModel plus the transport client it would fetch on its
+    # first request, with generation answered locally so that only the
+    # setup cost the SDK pays for a fresh model is measured, not the network.
+    def __init__(self, model_name):
+        from google.generativeai import client
+        self.model = gemini_model_factory(model_name)
+        self.transport = client.get_default_generative_client()
+
+    def generate_content(self, prompt, stream=False):
+        return StubResponse(f"echo: {prompt}")
+
+
+def timed_ms(fn):
+    started = time.perf_counter()
+    fn()
+    return (time.perf_counter() - started) * 1000
+
+
+def bench_per_request_model(requests, model_name):
+    # Previous behaviour: a new thread and a new model for every prompt
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        result = {}
+
+        def run():
+            model = LocalModel(model_name)
+            result['text'] = model.generate_content(f"prompt {i}").text
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_model_client(requests, model_name):
+    client = ModelClient(model_factory=LocalModel)
+    client.configure('bench-key')
+    latencies = []
+    try:
+        for i in range(requests):
+            start = time.perf_counter()
+            client.submit(client.generate, f"prompt {i}", model_name=model_name).result()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        client.shutdown(wait=True)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    mean = sum(latencies) / len(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<22} mean {mean * 1000:8.3f} ms   p50 {p50 * 1000:8.3f} ms   p99 {p99 * 1000:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-request overhead of the AI client: the real SDK model and transport "
+                    "setup, with generation answered locally")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    args = parser.parse_args()
+
+    # Configuring drops the SDK's cached clients, so the first model after it
+    # also builds the transport
+    gemini_configure('bench-key')
+    print(f"first model and transport  {timed_ms(lambda: LocalModel(args.model)):8.3f} ms")
+    fresh = [timed_ms(lambda: LocalModel(args.model)) for _ in range(args.requests)]
+    print(f"each further model         {statistics.median(fresh):8.3f} ms")
+
+    report("per-request model", bench_per_request_model(args.requests, args.model))
+    report("pooled ModelClient", bench_model_client(args.requests, args.model))
+
+
+if __name__ == "__main__":
+    main()
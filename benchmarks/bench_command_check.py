@@ -0,0 +1,65 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from command_check import CommandAnalyzer, PathIndex, command_words
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_corpus.json')
+
+
+def corpus_commands():
+    with open(CORPUS, encoding='utf-8') as f:
+        return [command for case in json.load(f) for command in case['commands']]
+
+
+def timed_ms(fn):
+    started = time.perf_counter()
+    fn()
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pre-execution checks of suggested commands: PATH index build and refresh, "
+                    "checking a whole answer on the pool, and name lookups versus `which`")
+    parser.add_argument('--commands', type=int, default=48, help="commands in one answer")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    index = PathIndex()
+    print(f"PATH index build            {timed_ms(index.refresh):8.2f} ms   "
+          f"({len(index.names)} programs in {len(index.order)} directories)")
+    refresh = [timed_ms(index.refresh) for _ in range(100)]
+    print(f"refresh, nothing changed    {statistics.median(refresh):8.3f} ms")
+
+    commands = corpus_commands()
+    commands = (commands * (args.commands // len(commands) + 1))[:args.commands]
+    words = [word for command in commands for word in command_words(command)]
+    lookups = [timed_ms(lambda: [index.lookup(word) for word in words]) for _ in range(args.runs)]
+    which = [timed_ms(lambda: [shutil.which(word) for word in words]) for _ in range(args.runs)]
+    print(f"{len(words)} words: index lookups {statistics.median(lookups):8.3f} ms, "
+          f"shutil.which {statistics.median(which):8.2f} ms")
+
+    cold = []
+    cached = []
+    for run in range(args.runs):
+        analyzer = CommandAnalyzer(path_index=index, max_workers=args.workers)
+        # Distinct text per run, so nothing is answered from the cache
+        answer = [f"{command} # {run}" for command in commands]
+        cold.append(timed_ms(lambda: [future.result() for future in
+                                      [analyzer.submit(command) for command in answer]]))
+        cached.append(timed_ms(lambda: [analyzer.cached(command) for command in answer]))
+        analyzer.close()
+    print(f"check {len(commands)} commands ({args.workers} workers): "
+          f"{statistics.median(cold):8.2f} ms, from the cache {statistics.median(cached):8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
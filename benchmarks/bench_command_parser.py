@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from command_parser import FencedBlockParser, parse_blocks, extract_commands
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_corpus.json')
+
+
+def feed_in_chunks(text, size):
+    parser = FencedBlockParser()
+    blocks = []
+    for start in range(0, len(text), size):
+        blocks.extend(parser.feed(text[start:start + size]))
+    return blocks + parser.close()
+
+
+def check_corpus():
+    with open(CORPUS, encoding='utf-8') as f:
+        cases = json.load(f)
+    failures = 0
+    for case in cases:
+        expected = case['commands']
+        results = {'whole': extract_commands(parse_blocks(case['response']))}
+        for size in (1, 7, 64):
+            results[f'chunk={size}'] = extract_commands(feed_in_chunks(case['response'], size))
+        for mode, commands in results.items():
+            if commands != expected:
+                failures += 1
+                print(f"FAIL {case['name']} ({mode}): expected {expected!r}, got {commands!r}")
+    print(f"corpus: {len(cases)} cases, {failures} failures")
+    return failures == 0
+
+
+def synthetic_response(blocks):
+    parts = []
+    for i in range(blocks):
+        parts.append(f"Step {i}: run the following to inspect the system.\n")
+        parts.append(f"```bash\nsudo journalctl -u service{i} --since today | tail -n 50\nsystemctl status service{i}\n```\n")
+    return ''.join(parts)
+
+
+def legacy_rescan(text, size):
+    # What re-running the old regex over the accumulated response on every
+    # streamed chunk would cost
+    seen = ''
+    for start in range(0, len(text), size):
+        seen += text[start:start + size]
+        re.findall(r'```(.*?)```', seen, re.DOTALL)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Correctness corpus and throughput for the fenced-block parser")
+    parser.add_argument('--chunk', type=int, default=32, help="streamed chunk size in characters")
+    args = parser.parse_args()
+
+    ok = check_corpus()
+    for blocks in (10, 100, 1000):
+        text = synthetic_response(blocks)
+        incremental = timed(feed_in_chunks, text, args.chunk)
+        rescan = timed(legacy_rescan, text, args.chunk)
+        print(f"{blocks:5d} blocks ({len(text) / 1024:7.1f} KiB): incremental {incremental * 1000:8.2f} ms   "
+              f"regex rescan per chunk {rescan * 1000:9.2f} ms")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
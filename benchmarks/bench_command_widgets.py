@@ -0,0 +1,113 @@
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtWidgets import QApplication, QPushButton
+
+from LinuxAI import GeminiChatApp, CommandWidget
+from theme import COLORS
+
+
+def apply_legacy_styles(widget):
+    # What every card used to do: four freshly formatted per-widget sheets
+    widget.setStyleSheet(f"""
+        QFrame {{
+            background-color: {COLORS['bg_medium']};
+            color: {COLORS['text']};
+            border: 2px solid {COLORS['border']};
+            border-radius: 10px;
+            margin: 8px;
+            padding: 15px;
+        }}
+        QFrame:hover {{
+            border: 2px solid {COLORS['border_glow']};
+        }}
+    """)
+    widget.command_input.setStyleSheet(f"""
+        QLineEdit {{
+            background-color: {COLORS['bg_dark']};
+            color: {COLORS['text']};
+            border: 2px solid {COLORS['border']};
+            border-radius: 5px;
+            padding: 8px;
+            font-family: 'Ubuntu Mono', 'Courier New';
+            font-size: 14px;
+        }}
+        QLineEdit:focus {{
+            border: 2px solid {COLORS['primary']};
+        }}
+    """)
+    copy_btn = widget.findChildren(QPushButton)[0]
+    copy_btn.setStyleSheet(f"""
+        QPushButton {{
+            background-color: {COLORS['primary']};
+            color: {COLORS['text']};
+            border: none;
+            padding: 8px 15px;
+            border-radius: 5px;
+            font-weight: bold;
+        }}
+        QPushButton:hover {{
+            background-color: {COLORS['primary_hover']};
+        }}
+    """)
+    widget.execute_btn.setStyleSheet(f"""
+        QPushButton {{
+            background-color: {COLORS['accent']};
+            color: {COLORS['bg_dark']};
+            border: none;
+            padding: 8px 20px;
+            border-radius: 5px;
+            font-weight: bold;
+        }}
+        QPushButton:hover {{
+            background-color: {COLORS['primary']};
+            color: {COLORS['text']};
+        }}
+    """)
+
+
+def bench(app, window, count, legacy):
+    start = time.perf_counter()
+    widgets = []
+    for i in range(count):
+        widget = CommandWidget(f"ls -la /tmp/{i}", window)
+        if legacy:
+            apply_legacy_styles(widget)
+        window.commands_layout.addWidget(widget)
+        widgets.append(widget)
+    # Widgets are polished when they become visible
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    for widget in widgets:
+        widget.setParent(None)
+        widget.deleteLater()
+    app.processEvents()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time creating CommandWidgets with per-widget vs application stylesheets")
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    window = GeminiChatApp()
+    window.show()
+    app.processEvents()
+
+    for name, legacy in (("per-widget stylesheets", True), ("application stylesheet", False)):
+        timings = [bench(app, window, args.count, legacy) for _ in range(args.rounds)]
+        best = min(timings)
+        print(f"{name:<24} {args.count} widgets: best {best * 1000:8.1f} ms   "
+              f"({best * 1000 / args.count:.2f} ms/widget)")
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
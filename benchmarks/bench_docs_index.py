@@ -0,0 +1,64 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docs_index import DocsIndex
+
+QUESTIONS = [
+    "how do I list open ports with ss", "extract a tar.xz archive", "find files bigger than 100MB",
+    "show disk usage of each directory", "follow the log of a systemd service",
+    "copy a directory to another host with rsync", "change the owner of a folder recursively",
+    "which process is using the most memory", "show my ip address", "replace text in a file with sed",
+    "kill a process by name", "compress a folder with zip", "check the size of a file",
+    "list installed packages", "search for a word in all files", "create a new user with a home directory",
+    "mount a usb drive", "set an environment variable permanently", "show the last reboot time",
+    "download a file with curl and keep its name",
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build time and per-question search latency of the man page / --help index")
+    parser.add_argument('--db', help="existing index to query instead of building a fresh one")
+    parser.add_argument('--help-output', action='store_true',
+                        help="also run programs without a man page with --help")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = DocsIndex(args.db or os.path.join(tmp, 'docs.sqlite3'), help_output=args.help_output)
+        for label in ('build', 'rebuild, nothing changed'):
+            started = time.perf_counter()
+            parsed, removed = index.update(args.workers)
+            print(f"{label:<26} {time.perf_counter() - started:8.2f} s   ({parsed} parsed)")
+        sources, chunks = index.stats()
+        print(f"{sources} sources, {chunks} chunks, "
+              f"{os.path.getsize(index.path) / 1024 / 1024:.1f} MB")
+
+        timings = []
+        found = 0
+        for question in QUESTIONS:
+            found += bool(index.search(question))
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                index.prompt_text(question)
+                timings.append((time.perf_counter() - started) * 1000)
+        print(f"search {len(QUESTIONS)} questions x {args.runs}: "
+              f"p50 {statistics.median(timings):.2f} ms, p99 {percentile(timings, 0.99):.2f} ms, "
+              f"max {max(timings):.2f} ms; {found} with snippets")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
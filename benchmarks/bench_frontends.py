@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FRONTENDS = {
+    # module, window class, loads the SDK after first paint
+    'full': ('LinuxAI', 'GeminiChatApp', True),
+    'lite': ('open_source', 'LiteChatApp', False),
+}
+
+# One fresh process per run: time to first paint and RSS when idle, once the
+# frontend finished its own start-up work (the full UI loads the SDK right
+# after first paint, the lite one waits for the first question), and after
+# a streamed answer plus one command with output.
+CHILD_SCRIPT = r'''
+import json, os, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {root!r} + '/benchmarks')
+
+
+def rss_mb(field='VmRSS:'):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field):
+                return round(int(line.split()[1]) / 1024, 1)
+
+
+from PyQt5.QtCore import QEventLoop
+from PyQt5.QtWidgets import QApplication
+import {module} as frontend
+from fake_backend import fake_model_factory
+
+app = QApplication([])
+window = frontend.{cls}()
+window.show()
+app.processEvents()
+result = {{'first_paint_ms': (time.perf_counter() - started) * 1000, 'rss_idle_mb': rss_mb()}}
+
+window.ai_client.configure('bench-key')
+if {warm_up!r}:
+    window.ai_client.warm_up(window.model_name).result()
+result['rss_ready_mb'] = rss_mb()
+
+
+def pump_until(condition, timeout=60.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("frontend did not finish")
+        app.processEvents(QEventLoop.AllEvents | QEventLoop.WaitForMoreEvents, 50)
+
+
+window.ai_client.model_factory = fake_model_factory(response_size={response_size})
+window.ai_client.configure_backend = None
+window.ai_client.configure('bench-key')
+window.input_field.setText("benchmark question")
+window.send_message()
+pump_until(lambda: window.ai_request is None)
+card = window.commands_layout.itemAt(0).widget()
+card.command_input.setText({command!r})
+card.execute_command()
+pump_until(lambda: card.execution is None)
+result['rss_used_mb'] = rss_mb()
+result['peak_rss_mb'] = rss_mb('VmHWM:')
+print(json.dumps(result))
+window.close()
+'''
+
+
+def run_frontend(name, env, args):
+    module, cls, warm_up = FRONTENDS[name]
+    script = CHILD_SCRIPT.format(root=ROOT, module=module, cls=cls, warm_up=warm_up,
+                                 response_size=args.response_size, command=args.command)
+    output = subprocess.run([sys.executable, '-c', script], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Start-up time and RSS of the full UI (LinuxAI.py) versus the lite "
+                    "frontend (open_source.py)")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--response-size', type=int, default=4000)
+    parser.add_argument('--command', default='seq 1 20000')
+    parser.add_argument('--output', help="also write the medians as JSON")
+    args = parser.parse_args()
+
+    config_home = tempfile.mkdtemp(prefix='linuxai-bench-')
+    os.makedirs(os.path.join(config_home, 'linuxai'))
+    with open(os.path.join(config_home, 'linuxai', 'config.json'), 'w') as f:
+        json.dump({'requests': {'requests_per_minute': 0, 'max_retries': 0},
+                   'telemetry': {'trace_file': None}}, f)
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen', XDG_CONFIG_HOME=config_home,
+               GEMINI_API_KEY='bench-key')
+
+    medians = {}
+    for name in FRONTENDS:
+        runs = [run_frontend(name, env, args) for _ in range(args.runs)]
+        medians[name] = {key: round(statistics.median(run[key] for run in runs), 1)
+                         for key in runs[0]}
+    keys = list(medians['full'])
+    print(f"{'':<16}" + ''.join(f"{name:>10}" for name in FRONTENDS) + f"{'lite/full':>11}")
+    for key in keys:
+        full, lite = medians['full'][key], medians['lite'][key]
+        print(f"{key:<16}{full:>10}{lite:>10}{lite / full:>10.0%}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(medians, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
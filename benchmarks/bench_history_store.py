@@ -0,0 +1,90 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_store import HistoryStore
+
+COMMANDS = [
+    "sudo apt-get install -y {pkg}", "systemctl status {pkg}", "journalctl -u {pkg} --since today",
+    "ls -la /etc/{pkg}", "grep -r {pkg} /var/log", "df -h", "free -m", "ps aux | grep {pkg}",
+    "docker logs {pkg}", "cat /etc/os-release",
+]
+PACKAGES = ['nginx', 'postgresql', 'redis', 'sshd', 'cron', 'docker', 'ufw', 'apache2', 'mysql', 'zabbix']
+
+
+def populate(store, count, seed=1):
+    rng = random.Random(seed)
+    now = time.time() - count
+    with store.lock:
+        for i in range(count):
+            pkg = rng.choice(PACKAGES)
+            command = rng.choice(COMMANDS).format(pkg=pkg)
+            output = f"{pkg} line {i}\n" * rng.randint(1, 20)
+            store.db.execute(
+                "INSERT INTO history (command, exit_code, state, duration, cwd, started, output) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (command, rng.choice((0, 0, 0, 1)), 'done', rng.random(), '/home/user', now + i, output)
+            )
+        store.db.commit()
+
+
+def timed_ms(fn, repeat=20):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search and pagination latency of the command history store")
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--page', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, 'history.sqlite3'), max_entries=args.entries * 2)
+        start = time.perf_counter()
+        populate(store, args.entries)
+        print(f"populated {args.entries} entries in {time.perf_counter() - start:.1f} s")
+
+        cases = [
+            ('first page, no query', ''),
+            ('common word', 'systemctl'),
+            ('two words', 'apt-get nginx'),
+            ('prefix while typing', 'post'),
+            ('rare word', 'line 12345'),
+            ('no match', 'nonexistentcommand'),
+        ]
+        for label, query in cases:
+            first = timed_ms(lambda: store.search(query, limit=args.page))
+            page = store.search(query, limit=args.page)
+            deep = None
+            if page:
+                # Walk ten pages down and time fetching the page after that
+                before = page[-1].id
+                for _ in range(10):
+                    more = store.search(query, before=before, limit=args.page)
+                    if not more:
+                        break
+                    before = more[-1].id
+                deep = timed_ms(lambda: store.search(query, before=before, limit=args.page))
+            deep_text = f"{deep:7.2f} ms" if deep is not None else "      -   "
+            print(f"{label:<22} {query!r:<24} first page {first:7.2f} ms   page 11 {deep_text}   "
+                  f"({len(page)} results)")
+
+        record = timed_ms(lambda: store.record('uname -a', 0, 'done', 0.01, '/home/user',
+                                               time.time(), 'Linux host 6.1.0'), repeat=200)
+        print(f"record one entry       {record:7.2f} ms")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
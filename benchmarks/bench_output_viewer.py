@@ -0,0 +1,139 @@
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ansi import render_line, strip_ansi
+from output_spool import MappedOutput, OutputSpool, format_size
+
+
+# (terminal output, visible text, foreground color at the end)
+RENDER_CASES = [
+    ('\x1b[1;31mred\x1b[0m plain', 'red plain', None),
+    ('\x1b[38;5;196mx', 'x', '#ff0000'),
+    ('\x1b[38;2;1;2;3mx', 'x', '#010203'),
+    ('50%\r100%', '100%', None),
+    ('b\x08bold', 'bold', None),
+    # Private CSI sequences ending in m are not SGR: vim's modifyOtherKeys
+    ('x\x1b[>4;2my', 'xy', None),
+    ('\x1b[31m\x1b[?1049mz', 'z', '#cd0000'),
+    ('\x1b[31m\x1b[1;;32mq', 'q', '#00cd00'),
+]
+
+
+def check_rendering():
+    failures = 0
+    for text, visible, fg in RENDER_CASES:
+        try:
+            result = (strip_ansi(text), render_line(text)[1].fg)
+        except Exception as e:
+            result = (repr(e), None)
+        if result != (visible, fg):
+            failures += 1
+            print(f"FAIL {text!r}: expected {(visible, fg)!r}, got {result!r}")
+    print(f"rendering: {len(RENDER_CASES)} cases, {failures} failures")
+    return failures == 0
+
+
+def write_log(spool, size_mb):
+    # Colored log lines, like `journalctl` or a build with color forced on
+    block = b''.join(
+        b'\x1b[2m2026-01-01 00:00:%02d\x1b[0m \x1b[1;3%dmINFO\x1b[0m worker-%03d processed request %07d\n'
+        % (i % 60, i % 7 + 1, i % 100, i) for i in range(10000))
+    while spool.size < size_mb * 1000 * 1000:
+        spool.write(block)
+    spool.write(b'the one line containing a NEEDLE\n')
+    spool.close()
+
+
+def timed_ms(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_search(output, text, start=0, backwards=False):
+    for result in output.search(text, start, backwards):
+        if result is not None:
+            return result
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open, page and search a large spooled command output")
+    parser.add_argument('--size-mb', type=int, default=1024)
+    parser.add_argument('--lines', type=int, default=40, help="lines per rendered page")
+    parser.add_argument('--gui', action='store_true', help="also time OutputPane (offscreen Qt)")
+    args = parser.parse_args()
+
+    ok = check_rendering()
+    spool = OutputSpool()
+    try:
+        start = time.perf_counter()
+        write_log(spool, args.size_mb)
+        print(f"wrote {format_size(spool.size)} ({spool.lines:,} lines) in "
+              f"{time.perf_counter() - start:.1f} s")
+
+        opened = timed_ms(lambda: MappedOutput(spool.path).close())
+        print(f"open + mmap              {opened:9.3f} ms")
+        output = MappedOutput(spool.path)
+
+        def render_page(offset):
+            for _, data in output.read_lines(offset, args.lines):
+                render_line(data.decode('utf-8', errors='replace'))
+
+        middle = output.line_start(output.size // 2)
+        cases = [
+            ('render first page', lambda: render_page(0)),
+            ('render middle page', lambda: render_page(middle)),
+            ('jump to end (last page)', lambda: render_page(output.last_page(args.lines))),
+            ('scroll 3 lines down', lambda: output.forward(middle, 3)),
+            ('page up', lambda: output.backward(middle, args.lines)),
+        ]
+        for label, fn in cases:
+            print(f"{label:<24} {timed_ms(fn, repeat=50):9.3f} ms")
+
+        for label, text, backwards in [
+            ('search hit near top', 'worker-042', False),
+            ('search, smart case', 'NEEDLE', False),
+            ('search, ignore case', 'needle', False),
+            ('search backwards', 'needle', True),
+            ('search, no match', 'nomatch', False),
+        ]:
+            found = run_search(output, text, 0, backwards)
+            elapsed = timed_ms(lambda: run_search(output, text, 0, backwards), repeat=3)
+            rate = output.size / (elapsed / 1000) / 1e9
+            print(f"{label:<24} {elapsed:9.1f} ms  ({rate:5.2f} GB/s if scanned fully)  match {found}")
+        output.close()
+
+        if args.gui:
+            from PyQt5.QtWidgets import QApplication
+            app = QApplication(sys.argv)
+            import LinuxAI
+            start = time.perf_counter()
+            pane = LinuxAI.OutputPane(spool, 'benchmark')
+            pane.resize(880, 600)
+            pane.show()
+            pane.finish()
+            app.processEvents()
+            print(f"OutputPane open + paint  {(time.perf_counter() - start) * 1000:9.1f} ms")
+            print(f"OutputPane scroll        {timed_ms(lambda: pane.scroll_lines(3), repeat=50):9.3f} ms")
+            print(f"OutputPane page down     "
+                  f"{timed_ms(lambda: pane.scroll_lines(pane.page_lines()), repeat=50):9.3f} ms")
+            print(f"OutputPane jump to end   {timed_ms(pane.scroll_to_end, repeat=20):9.3f} ms")
+            pane.close_output()
+    finally:
+        spool.close()
+        spool.remove()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from command_runner import CommandRunner
+from output_spool import OutputSpool
+from shell_session import ShellSession, SessionRunner
+
+
+def time_commands(factory, command, runs):
+    timings = []
+    for _ in range(runs):
+        spool = OutputSpool()
+        runner = factory(command, lambda text: None, lambda text: None, spool=spool)
+        started = time.perf_counter()
+        exit_code = runner.run()
+        timings.append(time.perf_counter() - started)
+        spool.remove()
+        if exit_code != 0:
+            raise SystemExit(f"{command!r} exited with {exit_code}")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-command latency of a fresh shell per command versus one persistent "
+                    "shell session on a pty")
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--command', action='append',
+                        help="command to time, repeatable (default: true, echo, ls /)")
+    args = parser.parse_args()
+
+    session = ShellSession()
+    started = time.perf_counter()
+    session.start()
+    print(f"session start {(time.perf_counter() - started) * 1000:.1f} ms, {args.runs} runs each")
+    backends = [('fresh shell', CommandRunner),
+                ('session', lambda *a, **kw: SessionRunner(*a, session=session, **kw))]
+    try:
+        for command in args.command or ['true', 'echo hello', 'ls /']:
+            for label, factory in backends:
+                timings = sorted(time_commands(factory, command, args.runs))
+                print(f"{command!r:<14} {label:<12} median {statistics.median(timings) * 1000:7.2f} ms"
+                      f"   p90 {timings[int(len(timings) * 0.9)] * 1000:7.2f} ms")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fanout import FanoutRunner
+from inventory import Host
+from ssh_pool import SshPool, StubTransport
+
+
+def run_once(transport, hosts, command, max_parallel):
+    runner = FanoutRunner(command, lambda text: None, lambda text: None, hosts=hosts,
+                          transport=transport, max_parallel=max_parallel)
+    started = time.perf_counter()
+    exit_code = runner.run()
+    return time.perf_counter() - started, exit_code, len(runner.groups())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fan-out latency, first run versus reused connections. Without --host a stub "
+                    "transport simulates the handshake; with --host (e.g. localhost with sshd and "
+                    "key auth) real ssh runs with and without ControlMaster.")
+    parser.add_argument('--host', action='append', help="ssh destination, repeatable")
+    parser.add_argument('--fanout', type=int, default=20, help="targets per run")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-parallel', type=int, default=16)
+    parser.add_argument('--connect-delay', type=float, default=0.25,
+                        help="simulated handshake for the stub transport")
+    parser.add_argument('--command', default='uname -sr; id -un')
+    args = parser.parse_args()
+
+    if args.host:
+        # Repeating a destination reuses its one master, like a fleet of
+        # targets behind the same host
+        hosts = [Host(f"{address}#{i}", address, None, None, ())
+                 for i, address in enumerate(args.host * args.fanout)][:args.fanout]
+        transports = [('fresh ssh', SshPool(multiplex=False)), ('pooled ssh', SshPool())]
+    else:
+        hosts = [Host(f"host{i:03d}", f"host{i:03d}", None, None, ()) for i in range(args.fanout)]
+        transports = [('stub', StubTransport(connect_delay=args.connect_delay))]
+
+    print(f"{len(hosts)} targets, max {args.max_parallel} in parallel, {args.runs} runs, "
+          f"command {args.command!r}")
+    for label, transport in transports:
+        timings = []
+        for _ in range(args.runs):
+            elapsed, exit_code, groups = run_once(transport, hosts, args.command, args.max_parallel)
+            timings.append(elapsed)
+        later = timings[1:] or timings
+        print(f"{label:<11} first run {timings[0] * 1000:8.1f} ms   runs 2..{args.runs} "
+              f"median {statistics.median(later) * 1000:8.1f} ms   "
+              f"(exit {exit_code}, {groups} distinct outputs)")
+        transport.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Untracked, see .gitignore
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the app away from the user's cache, history, trace and rate limits
+CONFIG_HOME = tempfile.mkdtemp(prefix='linuxai-bench-')
+os.environ['XDG_CONFIG_HOME'] = CONFIG_HOME
+os.makedirs(os.path.join(CONFIG_HOME, 'linuxai'))
+with open(os.path.join(CONFIG_HOME, 'linuxai', 'config.json'), 'w') as f:
+    json.dump({'requests': {'requests_per_minute': 0, 'max_retries': 0},
+               'telemetry': {'trace_file': None}}, f)
+
+from PyQt5.QtCore import QEventLoop, QTimer
+from PyQt5.QtWidgets import QApplication
+
+from fake_backend import fake_answer, fake_model_factory
+
+COLD_START_SCRIPT = r'''
+import json, sys, time
+sys.path.insert(0, {root!r})
+import LinuxAI
+from PyQt5.QtWidgets import QApplication
+app = QApplication([])
+LinuxAI.startup_marks.append(('QApplication', time.perf_counter()))
+window = LinuxAI.GeminiChatApp()
+LinuxAI.startup_marks.append(('GeminiChatApp()', time.perf_counter()))
+window.show()
+app.processEvents()
+LinuxAI.startup_marks.append(('first paint', time.perf_counter()))
+start = LinuxAI.startup_marks[0][1]
+print(json.dumps({{label: stamp - start for label, stamp in LinuxAI.startup_marks[1:]}}))
+window.close()
+'''
+
+
+def summarize(samples, scale=1000.0):
+    # Milliseconds by default
+    ordered = sorted(samples)
+    return {
+        'n': len(ordered),
+        'mean': round(statistics.mean(ordered) * scale, 3),
+        'p50': round(ordered[len(ordered) // 2] * scale, 3),
+        'p90': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))] * scale, 3),
+        'max': round(ordered[-1] * scale, 3),
+    }
+
+
+def reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM to the current RSS (Linux only)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def pump_until(app, condition, timeout=120.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("benchmark step did not finish")
+        app.processEvents(QEventLoop.AllEvents | QEventLoop.WaitForMoreEvents, 50)
+
+
+def bench_cold_start(runs):
+    samples = {}
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT.format(root=ROOT)],
+                                capture_output=True, text=True, check=True).stdout
+        samples.setdefault('process_total', []).append(time.perf_counter() - started)
+        for label, seconds in json.loads(output.strip().splitlines()[-1]).items():
+            samples.setdefault(label, []).append(seconds)
+    return {label: summarize(values) for label, values in samples.items()}
+
+
+def bench_send_render(app, window, rounds, backend):
+    window.ai_client.model_factory = fake_model_factory(**backend)
+    window.ai_client.configure_backend = None
+    window.ai_client.configure('fake-key')
+    first_chunks = []
+    round_trips = []
+    original_chunk_handler = window.handle_ai_chunk
+    marks = {}
+
+    def timed_chunk(chunk):
+        marks.setdefault('first_chunk', time.perf_counter())
+        original_chunk_handler(chunk)
+
+    window.handle_ai_chunk = timed_chunk
+    try:
+        for i in range(rounds):
+            window.chat_session.clear()
+            marks.clear()
+            window.input_field.setText(f"benchmark question {i}")
+            started = time.perf_counter()
+            window.send_message()
+            pump_until(app, lambda: window.ai_request is None
+                       and not window.chunk_flush_timer.isActive())
+            round_trips.append(time.perf_counter() - started)
+            if 'first_chunk' in marks:
+                first_chunks.append(marks['first_chunk'] - started)
+    finally:
+        window.handle_ai_chunk = original_chunk_handler
+    result = {'round_trip_ms': summarize(round_trips)}
+    if first_chunks:
+        result['first_chunk_ms'] = summarize(first_chunks)
+    return result
+
+
+def bench_command_cards(app, window, block_counts, rounds):
+    from command_parser import parse_blocks, extract_commands
+
+    def render(response):
+        started = time.perf_counter()
+        window.update_command_cards(extract_commands(parse_blocks(response)))
+        app.processEvents()
+        return time.perf_counter() - started
+
+    results = {}
+    for blocks in block_counts:
+        fresh, same, changed = [], [], []
+        for i in range(rounds):
+            window.update_command_cards([])
+            window.command_pool.clear()
+            app.processEvents()
+            response = fake_answer(blocks, 0, seed=2 * i)
+            fresh.append(render(response))
+            same.append(render(response))
+            changed.append(render(fake_answer(blocks, 0, seed=2 * i + 1)))
+        results[f'{blocks}_blocks'] = {
+            'commands': len(extract_commands(parse_blocks(fake_answer(blocks, 0)))),
+            'first_render_ms': summarize(fresh),
+            'same_response_ms': summarize(same),
+            'new_response_ms': summarize(changed),
+        }
+    window.update_command_cards([])
+    return results
+
+
+def bench_chat_append(app, window, line_counts):
+    results = {}
+    line = "Output: drwxr-xr-x  2 root root  4096 Jan  1 00:00 some-directory-name"
+    for count in line_counts:
+        window.chat_area.setPlainText('')
+        app.processEvents()
+        started = time.perf_counter()
+        for i in range(count):
+            window.chat_area.append(f"{line} {i}")
+        app.processEvents()
+        elapsed = time.perf_counter() - started
+        results[f'{count}_lines'] = {
+            'total_ms': round(elapsed * 1000, 1),
+            'us_per_line': round(elapsed / count * 1e6, 2),
+            'document_blocks': window.chat_area.document().blockCount(),
+        }
+    return results
+
+
+def bench_command_throughput(app, window, size_mb):
+    from command_runner import CommandRunner
+    size = size_mb * 1000 * 1000
+    command = f"yes {'x' * 99} | head -c {size}"
+    results = {}
+
+    received = [0]
+
+    def on_output(text):
+        received[0] += len(text)
+
+    reset_peak_rss()
+    started = time.perf_counter()
+    runner = CommandRunner(command, on_output, on_output)
+    runner.run()
+    elapsed = time.perf_counter() - started
+    runner.spool.remove()
+    results['runner'] = {
+        'seconds': round(elapsed, 3),
+        'mb_per_s': round(size_mb / elapsed, 1),
+        'chars_delivered': received[0],
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    window.update_command_cards([command])
+    widget = window.commands_layout.itemAt(0).widget()
+    reset_peak_rss()
+    started = time.perf_counter()
+    widget.execute_command()
+    pump_until(app, lambda: widget.execution is None, timeout=600)
+    elapsed = time.perf_counter() - started
+    results['gui'] = {
+        'seconds': round(elapsed, 3),
+        'mb_per_s': round(size_mb / elapsed, 1),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    window.update_command_cards([])
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def flatten(data, prefix=''):
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten(value, name + '.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(baseline_path, results):
+    with open(baseline_path) as f:
+        baseline = dict(flatten(json.load(f)['results']))
+    print(f"\nchange against {baseline_path}:")
+    for name, value in flatten(results):
+        old = baseline.get(name)
+        if old:
+            print(f"  {name:<60} {old:>12g} -> {value:>12g}  ({(value - old) / old * 100:+6.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LinuxAI benchmark suite (offscreen Qt, fake model)")
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, 'bench_suite.json'),
+                        help="results file (default: benchmarks/results/bench_suite.json)")
+    parser.add_argument('--compare', help="earlier results file to diff against")
+    parser.add_argument('--only', nargs='+', help="run a subset: cold_start send_render "
+                        "command_cards chat_append command_throughput")
+    parser.add_argument('--quick', action='store_true', help="smaller sizes for a fast smoke run")
+    parser.add_argument('--latency', type=float, default=0.0, help="fake backend seconds to first chunk")
+    parser.add_argument('--chunk-size', type=int, default=64)
+    parser.add_argument('--chunk-delay', type=float, default=0.0)
+    parser.add_argument('--response-size', type=int, default=4000)
+    parser.add_argument('--blocks', type=int, default=3, help="code blocks per fake answer")
+    args = parser.parse_args()
+
+    backend = {'latency': args.latency, 'chunk_size': args.chunk_size,
+               'chunk_delay': args.chunk_delay, 'response_size': args.response_size,
+               'blocks': args.blocks}
+    selected = set(args.only or ['cold_start', 'send_render', 'command_cards',
+                                 'chat_append', 'command_throughput'])
+    app = QApplication(sys.argv)
+    import LinuxAI
+    window = LinuxAI.GeminiChatApp()
+    window.show()
+    window.api_key = 'bench-key'
+    keepalive = QTimer()
+    keepalive.start(50)
+
+    results = {}
+    steps = [
+        ('cold_start', lambda: bench_cold_start(2 if args.quick else 5)),
+        ('send_render', lambda: bench_send_render(app, window, 5 if args.quick else 30, backend)),
+        ('command_cards', lambda: bench_command_cards(app, window, (1, 10, 100), 2 if args.quick else 5)),
+        ('chat_append', lambda: bench_chat_append(
+            app, window, (1000, 10000) if args.quick else (1000, 10000, 100000))),
+        ('command_throughput', lambda: bench_command_throughput(
+            app, window, 50 if args.quick else 500)),
+    ]
+    for name, step in steps:
+        if name not in selected:
+            continue
+        started = time.perf_counter()
+        results[name] = step()
+        print(f"{name:<20} done in {time.perf_counter() - started:6.1f} s", file=sys.stderr)
+    window.close()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'qt_platform': os.environ.get('QT_QPA_PLATFORM'),
+            'quick': args.quick,
+            'fake_backend': backend,
+        },
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import time
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def fake_answer(blocks=2, size=2000, seed=0):
+    # A deterministic Markdown answer with `blocks` bash code blocks, padded
+    # with prose to roughly `size` characters
+    parts = []
+    for i in range(blocks):
+        parts.append(f"Step {i + 1}: check the state of unit{seed}-{i} before changing anything.\n")
+        parts.append(f"```bash\nsystemctl status unit{seed}-{i} --no-pager\n"
+                     f"journalctl -u unit{seed}-{i} -n 20\n```\n")
+    text = ''.join(parts)
+    filler = "This line explains what the previous commands do and what to look for.\n"
+    while len(text) < size:
+        text += filler
+    return text
+
+
+class FakeModel:
+    # Stands in for GenerativeModel: waits `latency` seconds before the
+    # first chunk, then yields the answer in `chunk_size` pieces with
+    # `chunk_delay` seconds between them
+    def __init__(self, model_name, latency=0.0, chunk_size=64, chunk_delay=0.0,
+                 response_size=2000, blocks=2):
+        self.model_name = model_name
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.response_size = response_size
+        self.blocks = blocks
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        text = fake_answer(self.blocks, self.response_size, seed=self.calls)
+        if self.latency:
+            time.sleep(self.latency)
+        if not stream:
+            return FakeResponse(text)
+        return self.stream(text)
+
+    def stream(self, text):
+        for start in range(0, len(text), self.chunk_size):
+            if start and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield FakeResponse(text[start:start + self.chunk_size])
+
+
+def fake_model_factory(**options):
+    return lambda model_name: FakeModel(model_name, **options)
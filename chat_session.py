@@ -0,0 +1,108 @@
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    # Rough count, good enough for budgeting without a count_tokens round trip
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def truncate_middle(text, limit):
+    if len(text) <= limit:
+        return text
+    half = limit // 2
+    omitted = len(text) - 2 * half
+    return f"{text[:half]}\n[... {omitted} characters omitted ...]\n{text[-half:]}"
+
+
+class OutputDigest:
+    # Bounded head + tail of a stream of output, for outputs too large to keep
+    def __init__(self, limit=4000):
+        self.half = limit // 2
+        self.head = ''
+        self.tail = ''
+        self.omitted = 0
+
+    def add(self, text):
+        if len(self.head) < self.half:
+            take = self.half - len(self.head)
+            self.head += text[:take]
+            text = text[take:]
+        if not text:
+            return
+        self.tail += text
+        if len(self.tail) > self.half:
+            self.omitted += len(self.tail) - self.half
+            self.tail = self.tail[-self.half:]
+
+    def text(self):
+        if not self.omitted:
+            return self.head + self.tail
+        return f"{self.head}\n[... {self.omitted} characters omitted ...]\n{self.tail}"
+
+
+class ChatSession:
+    # Conversation history sent with every request. Turns are kept within
+    # max_history_tokens; the oldest ones are dropped and folded into a short
+    # extractive summary so prompt size stays bounded as the chat grows.
+    def __init__(self, max_history_tokens=6000, max_turn_chars=8000,
+                 max_output_chars=4000, max_summary_chars=1500):
+        self.max_history_tokens = max_history_tokens
+        self.max_turn_chars = max_turn_chars
+        self.max_output_chars = max_output_chars
+        self.max_summary_chars = max_summary_chars
+        self.turns = []
+        self.summary = []
+        self.notes = []
+
+    def clear(self):
+        self.turns = []
+        self.summary = []
+        self.notes = []
+
+    def add_command_output(self, command, output, exit_code=None):
+        status = '' if exit_code is None else f" (exit status {exit_code})"
+        output = truncate_middle(output.strip(), self.max_output_chars) or "(no output)"
+        self.notes.append(f"I ran `{command}`{status}. Output:\n{output}")
+
+    def prepare(self, message, context='', documentation=''):
+        # Returns (contents, user_text); user_text is what commit() records.
+        # `context` (the system header) goes in front of every request and
+        # `documentation` (snippets for this message) in front of the message;
+        # neither is kept in the history.
+        user_text = '\n\n'.join(self.notes + [message])
+        contents = [{'role': role, 'parts': [text]} for role, text in self.turns]
+        contents.append({'role': 'user', 'parts': [
+            f"{documentation}\n\n{user_text}" if documentation else user_text]})
+        preamble = [context] if context else []
+        if self.summary:
+            preamble.append("Earlier in this conversation:\n" + '\n'.join(self.summary))
+        if preamble:
+            contents[0]['parts'] = ['\n\n'.join(preamble + [contents[0]['parts'][0]])]
+        return contents, user_text
+
+    def cache_prompt(self, message, context=''):
+        # What the response cache keys this message on: the request without
+        # the documentation snippets, which change whenever the docs index
+        # does. With no history yet that is just the system header plus the
+        # message, so a question repeated in a new conversation hits.
+        contents, _ = self.prepare(message, context)
+        return contents
+
+    def commit(self, user_text, response):
+        self.notes = []
+        self.turns.append(('user', truncate_middle(user_text, self.max_turn_chars)))
+        self.turns.append(('model', truncate_middle(response, self.max_turn_chars)))
+        while len(self.turns) > 2 and self.history_tokens() > self.max_history_tokens:
+            (_, question), (_, answer) = self.turns[:2]
+            del self.turns[:2]
+            self.summarize(question, answer)
+
+    def summarize(self, question, answer):
+        question = question.strip().splitlines()[-1] if question.strip() else ''
+        answer = answer.strip().splitlines()[0] if answer.strip() else ''
+        self.summary.append(f"- user: {question[:200]} / assistant: {answer[:200]}")
+        while sum(len(line) for line in self.summary) > self.max_summary_chars:
+            self.summary.pop(0)
+
+    def history_tokens(self):
+        return sum(estimate_tokens(text) for _, text in self.turns)
@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import json
+import sqlite3
+import sys
+import time
+
+from ai_client import ModelClient, DEFAULT_MODEL, load_api_key
+from backends import backends_from_config
+from engine import engine_from_config
+from config import load_config
+from telemetry import telemetry_from_config
+from response_cache import ResponseCache
+from system_context import SystemContext
+from docs_index import DocsIndex
+
+
+def read_prompts(path):
+    # One prompt per line, either a JSON string or an object with "prompt"
+    # and optionally "id" and "model". The id defaults to the line number.
+    stream = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{number}: {e}")
+            if isinstance(item, str):
+                item = {'prompt': item}
+            item.setdefault('id', number)
+            yield item
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def system_header(config, disabled=False):
+    # Read from the snapshot cache, so this costs a few stats after the first run
+    if disabled or not config['context']['system']:
+        return ''
+    context = SystemContext()
+    context.load()
+    return context.header()
+
+
+def open_docs(config, disabled=False):
+    # Searched only; the GUI or `python docs_index.py build` keeps it current
+    if disabled or not config['context']['docs']:
+        return None
+    try:
+        return DocsIndex()
+    except (OSError, sqlite3.Error):
+        return None
+
+
+def with_context(prompt, header, docs=None, config=None):
+    parts = [header] if header else []
+    if docs is not None:
+        settings = config['context']
+        documentation = docs.prompt_text(prompt, settings['docs_snippets'],
+                                         settings['docs_snippet_chars'])
+        if documentation:
+            parts.append(documentation)
+    return '\n\n'.join(parts + [prompt])
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def print_retry(attempt, delay, error):
+    print(f"retry {attempt} in {delay:.1f}s: {str(error).splitlines()[0][:120]}", file=sys.stderr)
+
+
+def latency_report(latencies, failed, wall, engine=None):
+    report = {
+        'requests': len(latencies) + failed,
+        'ok': len(latencies),
+        'failed': failed,
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round((len(latencies) + failed) / wall, 3) if wall else 0.0,
+    }
+    if latencies:
+        report['latency_seconds'] = {
+            'mean': round(sum(latencies) / len(latencies), 4),
+            'p50': round(percentile(latencies, 0.50), 4),
+            'p90': round(percentile(latencies, 0.90), 4),
+            'p99': round(percentile(latencies, 0.99), 4),
+            'max': round(max(latencies), 4),
+        }
+    if engine is not None:
+        report['retries'] = engine.retries
+        report['coalesced'] = engine.coalesced
+        if engine.client.cache is not None:
+            report['cache_hits'] = engine.client.cache.hits
+    return report
+
+
+def print_report(report):
+    print(f"{report['requests']} requests, {report['ok']} ok, {report['failed']} failed "
+          f"in {report['wall_seconds']:.2f} s ({report['throughput_rps']:.2f} req/s)", file=sys.stderr)
+    latency = report.get('latency_seconds')
+    if latency:
+        print("latency: " + '  '.join(f"{name} {value * 1000:.0f} ms" for name, value in latency.items()),
+              file=sys.stderr)
+    if 'retries' in report:
+        print(f"retries: {report['retries']}, coalesced: {report['coalesced']}, "
+              f"cache hits: {report.get('cache_hits', 0)}", file=sys.stderr)
+
+
+async def run_ask(engine, args):
+    streaming = args.stream and not args.json
+
+    def write_chunk(text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    prompt = with_context(args.prompt, args.context, args.docs, args.config)
+    result = await engine.ask(prompt, model_name=args.model, stream=streaming,
+                              on_chunk=write_chunk if streaming else None, on_retry=print_retry,
+                              cache_prompt=with_context(args.prompt, args.context))
+    if args.json:
+        print(json.dumps({'prompt': args.prompt, 'response': result.response,
+                          'commands': result.commands, 'latency': round(result.latency, 4)},
+                         ensure_ascii=False))
+        return
+    if streaming:
+        print()
+    else:
+        print(result.response)
+    if result.commands:
+        print("\nCommands:")
+        for command in result.commands:
+            print(f"  {command}")
+
+
+async def run_batch(engine, prompts, output, model_name, concurrency, context='', docs=None,
+                    config=None):
+    # A fixed set of workers pulls prompts as they free up, so input of any
+    # size is streamed and results are written in completion order
+    latencies = []
+    failed = 0
+
+    async def worker():
+        nonlocal failed
+        for item in prompts:
+            record = {'id': item['id'], 'prompt': item['prompt']}
+            try:
+                result = await engine.ask(with_context(item['prompt'], context, docs, config),
+                                          model_name=item.get('model', model_name),
+                                          on_retry=print_retry,
+                                          cache_prompt=with_context(item['prompt'], context))
+                record.update(response=result.response, commands=result.commands,
+                              latency=round(result.latency, 4))
+                latencies.append(result.latency)
+            except Exception as e:
+                record['error'] = str(e)
+                failed += 1
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            output.flush()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, failed, time.perf_counter() - started
+
+
+def build_engine(args, concurrency=4):
+    cache = None
+    if not args.no_cache:
+        try:
+            cache = ResponseCache()
+        except (OSError, sqlite3.Error):
+            cache = None
+    config = load_config()
+    if args.backend:
+        config['backends']['order'] = [name.strip() for name in args.backend.split(',')]
+    backends = backends_from_config(config)
+    if not args.api_key and backends.needs_api_key:
+        raise ValueError("No API key: set GEMINI_API_KEY or save one from the GUI first")
+    client = ModelClient(model_factory=backends.model_factory, configure=backends.configure,
+                         close=backends.close, max_workers=concurrency, cache=cache)
+    if args.api_key:
+        client.configure(args.api_key)
+    if args.deadline is not None:
+        config['requests']['deadline'] = args.deadline
+    if args.rpm is not None:
+        config['requests']['requests_per_minute'] = args.rpm
+    if args.trace is not None:
+        config['telemetry']['trace_file'] = args.trace or None
+    telemetry = telemetry_from_config(config)
+    if args.metrics_port:
+        host, port = telemetry.serve(args.metrics_port)
+        print(f"metrics on http://{host}:{port}/metrics", file=sys.stderr)
+    args.context = system_header(config, args.no_context)
+    args.docs = open_docs(config, args.no_context)
+    args.config = config
+    return engine_from_config(client, config, concurrency, telemetry=telemetry)
+
+
+def close_engine(engine):
+    engine.client.shutdown()
+    engine.telemetry.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='linuxai', description="LinuxAI without the GUI")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--no-cache', action='store_true', help="bypass the response cache")
+    parser.add_argument('--backend', help="backends to try in order, e.g. local,gemini or stub")
+    parser.add_argument('--rpm', type=float, help="requests per minute allowed by the quota (0 = unlimited)")
+    parser.add_argument('--deadline', type=float, help="seconds before a request is given up")
+    parser.add_argument('--trace', help="JSONL trace file ('' to disable)")
+    parser.add_argument('--metrics-port', type=int, help="serve Prometheus metrics on this port")
+    parser.add_argument('--no-context', action='store_true',
+                        help="don't prepend the system description and documentation snippets")
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    ask = subparsers.add_parser('ask', help="ask one question and list the suggested commands")
+    ask.add_argument('prompt')
+    ask.add_argument('--json', action='store_true', help="print one JSON object instead of text")
+    ask.add_argument('--no-stream', dest='stream', action='store_false')
+
+    batch = subparsers.add_parser('batch', help="answer a JSONL file of prompts concurrently")
+    batch.add_argument('prompts', help="JSONL input, '-' for stdin")
+    batch.add_argument('--concurrency', type=int, default=4)
+    batch.add_argument('--output', default='-', help="JSONL results, '-' for stdout")
+    batch.add_argument('--report', help="also write the throughput/latency report as JSON")
+    args = parser.parse_args(argv)
+
+    args.api_key = load_api_key()
+
+    if args.mode == 'ask':
+        try:
+            engine = build_engine(args)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+        try:
+            asyncio.run(run_ask(engine, args))
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        finally:
+            close_engine(engine)
+        return 0
+
+    concurrency = max(1, args.concurrency)
+    try:
+        engine = build_engine(args, concurrency)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        latencies, failed, wall = asyncio.run(run_batch(
+            engine, read_prompts(args.prompts), output, args.model, concurrency, args.context,
+            args.docs, args.config
+        ))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        close_engine(engine)
+        if output is not sys.stdout:
+            output.close()
+    report = latency_report(latencies, failed, wall, engine)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
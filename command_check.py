@@ -0,0 +1,378 @@
+import os
+import re
+import shlex
+import subprocess
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from command_parser import HEREDOC_RE
+
+SYNTAX_TIMEOUT = 2.0
+OPERATOR_CHARS = set('();<>|&')
+ASSIGNMENT_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(?:\[[^\]]*\])?\+?=')
+FUNCTION_RE = re.compile(r'(?:^|[\s;&|])(?:function\s+([\w.:-]+)|([\w.:-]+)\s*\(\s*\))')
+BUILTINS = frozenset("""
+    . : [ alias bg bind break builtin caller cd command compgen complete compopt continue
+    declare dirs disown echo enable eval exec exit export false fc fg getopts hash help
+    history jobs kill let local logout mapfile popd printf pushd pwd read readarray readonly
+    return set shift shopt source suspend test times trap true type typeset ulimit umask
+    unalias unset wait
+""".split())
+# Reserved words after which the next word is still a command
+KEYWORDS = frozenset(['if', 'then', 'else', 'elif', 'do', 'while', 'until', '!', '{', 'time'])
+CLOSERS = frozenset(['fi', 'done', 'esac', '}'])
+# Run the command named after their options; the values are the options
+# that take an argument, and WRAPPER_ARGUMENTS the operands before it
+WRAPPERS = {
+    'sudo': {'-u', '-g', '-C', '-D', '-h', '-p', '-r', '-t', '-U', '--user', '--group'},
+    'doas': {'-u', '-C'},
+    'env': {'-u', '-C', '-S', '--unset', '--chdir'},
+    'nice': {'-n', '--adjustment'},
+    'ionice': {'-c', '-n', '-p', '--class', '--classdata'},
+    'timeout': {'-s', '-k', '--signal', '--kill-after'},
+    'xargs': {'-I', '-n', '-P', '-d', '-L', '-s', '-E', '-a'},
+    'stdbuf': {'-i', '-o', '-e'},
+    'watch': {'-n', '--interval'},
+    'nohup': set(), 'setsid': set(), 'exec': set(), 'command': set(), 'builtin': set(),
+    'taskset': set(), 'chrt': set(),
+}
+WRAPPER_ARGUMENTS = {'timeout': 1, 'taskset': 1, 'chrt': 1}
+
+# (pattern, warning); every pattern that matches is reported
+DESTRUCTIVE_PATTERNS = [(re.compile(pattern), warning) for pattern, warning in [
+    (r'\brm\s+(?:-\S+\s+)*(?:/|/\*|~/?|\$HOME/?|\*)(?=$|[\s;&|])', "deletes /, ~ or everything here"),
+    (r'\brm\s+(?:\S+\s+)*?(?:-[a-zA-Z]*[rR][a-zA-Z]*|--recursive)\b', "deletes recursively"),
+    (r'\bfind\b[^;&|]*\s(?:-delete\b|-exec\s+rm\b)', "deletes the files it finds"),
+    (r'\bdd\b[^;&|]*\bof=/dev/', "dd writes to a device"),
+    (r'(?<![>&])>\s*/dev/(?:sd|hd|vd|xvd|nvme|mmcblk)', "writes over a disk"),
+    (r'\b(?:mkfs(?:\.\w+)?|wipefs|fdisk|sfdisk|parted|sgdisk|blkdiscard)\b', "formats or partitions a disk"),
+    (r'\bshred\b', "overwrites files beyond recovery"),
+    (r'(?<![>&])>(?!>)\s*/(?:etc|boot|usr)/', "overwrites a system file"),
+    (r'\bch(?:mod|own|grp)\s+(?:\S+\s+)*?-[a-zA-Z]*R[^;&|]*\s/(?=$|[\s;&|])',
+     "changes ownership or permissions of the whole system"),
+    (r'\bchmod\s+(?:-\S+\s+)*0?777\b', "makes files writable by everyone"),
+    (r':\(\)\s*\{\s*:\s*\|\s*:\s*&\s*\}\s*;\s*:', "fork bomb"),
+    (r'\b(?:curl|wget)\b[^;&|]*\|\s*(?:sudo\s+)?(?:ba|z|da)?sh\b', "runs a downloaded script unseen"),
+    (r'\b(?:shutdown|reboot|poweroff|halt)\b|\bsystemctl\s+(?:reboot|poweroff|halt|kexec)\b'
+     r'|\binit\s+[06]\b', "reboots or shuts down the machine"),
+    (r'\bkill\s+(?:-\S+\s+)*-1\s*(?:$|[;&|])', "kills every process you own"),
+    (r'\bgit\s+(?:reset\s+(?:\S+\s+)*--hard|clean\s+-[a-zA-Z]*f)', "discards uncommitted changes"),
+    (r'\bgit\s+push\s+(?:\S+\s+)*(?:--force\b|-f\b)', "overwrites remote history"),
+    (r'\b(?:apt(?:-get)?|dnf|yum|zypper)\s+(?:-\S+\s+)*(?:remove|purge|autoremove|erase)\b'
+     r'|\bpacman\s+-R|\bsnap\s+remove\b|\bpip3?\s+uninstall\b', "removes packages"),
+    (r'\b(?:userdel|deluser)\b', "deletes a user"),
+    (r'\bcrontab\s+(?:-\S+\s+)*-r\b', "deletes all cron jobs"),
+    (r'\biptables\s+(?:-\S+\s+)*-F\b|\bnft\s+flush\s+ruleset\b|\bufw\s+(?:disable|reset)\b',
+     "drops the firewall rules"),
+    (r'\bmv\s+[^;&|]*\s/dev/null\b', "moves files into /dev/null"),
+    (r'\bdocker\s+(?:system|volume|image|container)\s+prune\b|\bdocker\s+volume\s+rm\b',
+     "deletes Docker data"),
+]]
+
+# words are the command words left to look up on PATH, so that a result
+# can be re-resolved for a new PathIndex generation without the syntax check
+Analysis = namedtuple('Analysis', 'command syntax_error missing found warnings generation words')
+
+
+def scan_directory(directory):
+    names = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and os.access(entry.path, os.X_OK):
+                        names.append(entry.name)
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    return frozenset(names)
+
+
+class PathIndex:
+    # Every executable name on PATH, so resolving a command word is a dict
+    # lookup instead of a `which` per word. refresh() stats the directories
+    # and rescans only those whose mtime changed, which is what installing
+    # or removing a program does; `generation` counts the changes.
+    def __init__(self, path=None):
+        self.path = path
+        self.directories = {}
+        self.order = None
+        self.names = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        directories = [directory for directory in
+                       (self.path or os.environ.get('PATH', '')).split(os.pathsep) if directory]
+        with self.lock:
+            changed = directories != self.order
+            for directory in directories:
+                try:
+                    mtime = os.stat(directory).st_mtime_ns
+                except OSError:
+                    mtime = None
+                cached = self.directories.get(directory)
+                if cached is None or cached[0] != mtime:
+                    self.directories[directory] = (mtime, scan_directory(directory) if mtime else frozenset())
+                    changed = True
+            if changed:
+                # Earlier directories win, as in the shell
+                names = {}
+                for directory in reversed(directories):
+                    for name in self.directories[directory][1]:
+                        names[name] = os.path.join(directory, name)
+                self.names = names
+                self.order = directories
+                self.generation += 1
+            return self.generation
+
+    def lookup(self, name):
+        return self.names.get(name)
+
+
+def strip_heredocs(command):
+    # Here-document bodies are data, not commands
+    lines = []
+    delimiter = None
+    for line in command.split('\n'):
+        if delimiter is not None:
+            if line.strip() == delimiter:
+                delimiter = None
+            continue
+        lines.append(line)
+        match = HEREDOC_RE.search(line)
+        if match:
+            delimiter = match.group(2)
+    return '\n'.join(lines)
+
+
+def command_words(command):
+    # The words in command position: the first word of every simple command,
+    # after assignments, reserved words and wrappers such as sudo or env
+    # (which are listed themselves). Command substitutions count; the
+    # contents of case and [[ ]] are skipped.
+    words = []
+    text = strip_heredocs(command).replace('\\\n', ' ')
+    lexer = shlex.shlex(text.replace('\n', ' ; ').replace('`', ' ; '), posix=True,
+                        punctuation_chars=True)
+    lexer.whitespace_split = True
+    expect = True
+    redirect = option_argument = False
+    arguments = 0
+    wrapper = block_end = None
+    try:
+        for token in lexer:
+            if block_end is not None:
+                if token == block_end:
+                    block_end = None
+                    expect = False
+                continue
+            if token and set(token) <= OPERATOR_CHARS:
+                if '<' in token or '>' in token:
+                    redirect = True
+                elif token.startswith('(('):
+                    block_end = '))'
+                else:
+                    expect = token not in (')', '))')
+                    wrapper = None
+                continue
+            if redirect:
+                redirect = False
+                continue
+            if not expect:
+                continue
+            if wrapper is not None:
+                if option_argument:
+                    option_argument = False
+                    continue
+                if token.startswith('-'):
+                    option_argument = token in WRAPPERS[wrapper]
+                    continue
+                if arguments:
+                    arguments -= 1
+                    continue
+            if ASSIGNMENT_RE.match(token):
+                continue
+            if wrapper is None:
+                if token in KEYWORDS:
+                    continue
+                if token == 'case':
+                    block_end = 'esac'
+                    continue
+                if token == '[[':
+                    block_end = ']]'
+                    continue
+                if token in CLOSERS or token in ('for', 'select', 'function'):
+                    expect = False
+                    continue
+            name = token.split()[0] if token.strip() else ''
+            if not name:
+                continue
+            words.append(name)
+            if name in WRAPPERS:
+                wrapper = name
+                arguments = WRAPPER_ARGUMENTS.get(name, 0)
+            else:
+                wrapper = None
+                expect = False
+    except ValueError:
+        # An open quote; the syntax check reports it
+        pass
+    return words
+
+
+def destructive_warnings(command):
+    return [warning for pattern, warning in DESTRUCTIVE_PATTERNS if pattern.search(command)]
+
+
+def check_syntax(command, shell='bash'):
+    # The shell's own parser without running anything; None when it is fine
+    # or the shell is not available
+    try:
+        result = subprocess.run([shell, '-n'], input=command.encode('utf-8'), capture_output=True,
+                                timeout=SYNTAX_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode == 0:
+        return None
+    lines = result.stderr.decode('utf-8', 'replace').strip().splitlines()
+    message = ' '.join(line.split(': ', 1)[-1] if line.startswith(f"{shell}:") else line
+                       for line in lines[:2])
+    return message or f"{shell} -n exited with {result.returncode}"
+
+
+def describe(analysis, local=True):
+    # (state, text) for a card: "error", "warning" or "ok". Which programs
+    # are installed is only known for this machine, not for remote targets.
+    problems = []
+    if analysis.syntax_error:
+        problems.append(f"Syntax: {analysis.syntax_error}")
+    if analysis.missing and local:
+        problems.append(f"Not installed: {', '.join(analysis.missing)}")
+    parts = [f"✖ {problem}" for problem in problems]
+    parts += [f"⚠ {warning}" for warning in analysis.warnings]
+    if parts:
+        return ('error' if problems else 'warning'), '   '.join(parts)
+    return 'ok', "✓ Syntax OK, all programs found" if local else "✓ Syntax OK"
+
+
+class CommandAnalyzer:
+    # Checks suggested commands before anyone clicks Execute: the shell's
+    # syntax check, every command word against the PATH index, and a list
+    # of destructive patterns. Runs on its own small pool; results are kept
+    # per command text, since a streamed answer re-suggests the same
+    # commands each time a block closes.
+    #
+    # Only the PATH lookups depend on which programs are installed. A result
+    # from an older PathIndex generation is re-resolved from its words when
+    # asked for, and never stored as it is; the syntax check is not re-run.
+    def __init__(self, shell='bash', path_index=None, max_workers=4, max_cached=512):
+        self.shell = shell
+        self.path_index = path_index or PathIndex()
+        self.max_cached = max_cached
+        self.results = OrderedDict()
+        self.pending = {}
+        self.reported_generation = None
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='linuxai-check')
+
+    def start(self):
+        # Builds the PATH index before the first answer arrives
+        return self.refresh()
+
+    def refresh(self):
+        # A Future of whether programs were installed or removed since the
+        # last refresh(), e.g. by a command that just finished
+        return self.executor.submit(self.refresh_paths)
+
+    def refresh_paths(self):
+        generation = self.path_index.refresh()
+        with self.lock:
+            changed = generation != self.reported_generation
+            self.reported_generation = generation
+        return changed
+
+    def analyze(self, command):
+        defined = {name for match in FUNCTION_RE.finditer(command) for name in match.groups() if name}
+        words = []
+        for word in command_words(command):
+            if word in BUILTINS or word in defined or word in words:
+                continue
+            if any(char in word for char in '$*?[{\'"'):
+                continue
+            if '/' in word and not os.path.isabs(os.path.expanduser(word)):
+                # Relative to a directory only known when it runs
+                continue
+            words.append(word)
+        syntax_error = check_syntax(command, self.shell)
+        # Looked up last, so the result is as fresh as possible
+        return self.resolve(Analysis(command, syntax_error, [], {}, destructive_warnings(command),
+                                     None, words), self.path_index.refresh())
+
+    def resolve(self, analysis, generation):
+        found = {}
+        missing = []
+        for word in analysis.words:
+            if '/' in word:
+                path = os.path.expanduser(word)
+                if os.path.isfile(path) and os.access(path, os.X_OK):
+                    found[word] = path
+                else:
+                    missing.append(word)
+                continue
+            path = self.path_index.lookup(word)
+            if path is None:
+                missing.append(word)
+            else:
+                found[word] = path
+        return analysis._replace(missing=missing, found=found, generation=generation)
+
+    def current(self, analysis):
+        # The analysis for the present PATH index, without a new syntax check
+        generation = self.path_index.generation
+        if analysis.generation == generation:
+            return analysis
+        return self.resolve(analysis, generation)
+
+    def cached(self, command):
+        with self.lock:
+            analysis = self.results.get(command)
+            if analysis is None:
+                return None
+            analysis = self.results[command] = self.current(analysis)
+            self.results.move_to_end(command)
+            return analysis
+
+    def submit(self, command):
+        # A Future of the Analysis; finished already when it is cached
+        analysis = self.cached(command)
+        if analysis is not None:
+            future = Future()
+            future.set_result(analysis)
+            return future
+        with self.lock:
+            future = self.pending.get(command)
+            if future is not None:
+                return future
+            future = self.pending[command] = self.executor.submit(self.analyze, command)
+        future.add_done_callback(lambda done: self.store(command, done))
+        return future
+
+    def store(self, command, future):
+        with self.lock:
+            if self.pending.get(command) is future:
+                del self.pending[command]
+            if future.cancelled() or future.exception() is not None:
+                return
+            # The index may have moved on while this was running
+            self.results[command] = self.current(future.result())
+            self.results.move_to_end(command)
+            while len(self.results) > self.max_cached:
+                self.results.popitem(last=False)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
@@ -0,0 +1,228 @@
+import re
+from collections import namedtuple
+
+SHELL_LANGUAGES = {'', 'bash', 'sh', 'shell', 'zsh', 'console', 'terminal',
+                   'shell-session', 'shellsession', 'shell-script', 'sh-session'}
+PROMPT_LANGUAGES = {'console', 'terminal', 'shell-session', 'shellsession', 'sh-session'}
+
+FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})(.*)$')
+INLINE_BLOCK_RE = re.compile(r'^\s*```([^`]+)```\s*$')
+PROMPT_RE = re.compile(r'^(?:\$|[\w.@-]+(?::[\w~/.-]*)?\$|\[[^\]]*\][$#])\s')
+ROOT_PROMPT_RE = re.compile(r'^(?:#|[\w.@-]+(?::[\w~/.-]*)?#)\s')
+HEREDOC_RE = re.compile(r'(?<!<)<<-?(?!<)\s*([\'"]?)(\w+)\1')
+OPENERS = {'if', 'for', 'while', 'until', 'case', 'select', '{'}
+CLOSERS = {'fi', 'done', 'esac', '}'}
+KEYWORD_PREFIXES = {'then', 'do', 'else', 'elif'}
+CONTINUATION_ENDINGS = ('\\', '&&', '||', '|')
+
+CodeBlock = namedtuple('CodeBlock', ['language', 'body'])
+
+
+def normalize_language(info):
+    word = info.strip().split(None, 1)[0] if info.strip() else ''
+    return word.strip('{}.').lower()
+
+
+def is_shell_language(language):
+    return language in SHELL_LANGUAGES
+
+
+class FencedBlockParser:
+    # Incremental Markdown fenced-code-block scanner. feed() can be called
+    # with arbitrary chunks of a streamed response; only complete lines are
+    # scanned and each line is looked at once, so the cost is linear in the
+    # new input. Blocks are returned as soon as their closing fence arrives.
+    def __init__(self):
+        self.partial = ''
+        self.fence = None
+        self.language = ''
+        self.lines = []
+
+    def feed(self, text):
+        if '\n' not in text:
+            self.partial += text
+            return []
+        data = self.partial + text
+        lines = data.split('\n')
+        self.partial = lines.pop()
+        blocks = []
+        for line in lines:
+            block = self.scan_line(line)
+            if block is not None:
+                blocks.append(block)
+        return blocks
+
+    def close(self):
+        # Flushes the last line and any block left open at the end of the text
+        blocks = []
+        if self.partial:
+            block = self.scan_line(self.partial)
+            self.partial = ''
+            if block is not None:
+                blocks.append(block)
+        if self.fence is not None:
+            blocks.append(CodeBlock(self.language, '\n'.join(self.lines)))
+            self.fence = None
+            self.lines = []
+        return blocks
+
+    def scan_line(self, line):
+        line = line.rstrip('\r')
+        if self.fence is None:
+            inline = INLINE_BLOCK_RE.match(line)
+            if inline:
+                return CodeBlock('', inline.group(1).strip())
+            match = FENCE_RE.match(line)
+            if match and not (match.group(1)[0] == '`' and '`' in match.group(2)):
+                self.fence = match.group(1)
+                self.language = normalize_language(match.group(2))
+                self.lines = []
+            return None
+
+        stripped = line.strip()
+        if (stripped.startswith(self.fence) and not stripped.strip(self.fence[0])
+                and len(line) - len(line.lstrip(' ')) <= 3):
+            block = CodeBlock(self.language, '\n'.join(self.lines))
+            self.fence = None
+            self.lines = []
+            return block
+        self.lines.append(line)
+        return None
+
+
+def parse_blocks(text):
+    parser = FencedBlockParser()
+    return parser.feed(text) + parser.close()
+
+
+def strip_comment(line):
+    # A # starts a comment only at the start of a word and outside quotes
+    # and $(...) / `...` substitutions, as in `x=$(echo "a # b")`. `stack`
+    # holds the open quotes and substitutions, innermost last.
+    stack = []
+    i = 0
+    while i < len(line):
+        char = line[i]
+        context = stack[-1] if stack else None
+        if context == "'":
+            if char == "'":
+                stack.pop()
+        elif char == '\\':
+            i += 1
+        elif context == '"' and char not in '"$`':
+            pass
+        elif char == '"':
+            if context == '"':
+                stack.pop()
+            else:
+                stack.append('"')
+        elif char == '`':
+            if context == '`':
+                stack.pop()
+            else:
+                stack.append('`')
+        elif line.startswith('$(', i):
+            stack.append('(')
+            i += 1
+        elif context == '"':
+            pass
+        elif char == "'":
+            stack.append("'")
+        elif char == '(' and context == '(':
+            stack.append('(')
+        elif char == ')' and context == '(':
+            stack.pop()
+        elif char == '#' and not stack and (i == 0 or line[i - 1].isspace()):
+            return line[:i].rstrip()
+        i += 1
+    return line
+
+
+def block_depth_change(line):
+    # Counts compound-command openers and closers in command position
+    code = re.sub(r'(["\']).*?\1', '""', strip_comment(line))
+    depth = 0
+    for segment in re.split(r'[;&|()]', code):
+        words = segment.split()
+        while words and words[0] in KEYWORD_PREFIXES:
+            words.pop(0)
+        if not words:
+            continue
+        if words[0] in OPENERS:
+            depth += 1
+        elif words[0] in CLOSERS:
+            depth -= 1
+        if words[-1] == '{' and len(words) > 1:
+            depth += 1
+    return depth
+
+
+def unbalanced_quotes(text):
+    text = re.sub(r'\\.', '', '\n'.join(strip_comment(line) for line in text.split('\n')))
+    single = double = False
+    for char in text:
+        if char == "'" and not double:
+            single = not single
+        elif char == '"' and not single:
+            double = not double
+    return single or double
+
+
+def split_commands(block):
+    # Splits a shell block into individually runnable steps. Continuation
+    # lines, here-documents, open quotes and if/for/while/case bodies stay
+    # in the step that started them; comments and blank lines are dropped.
+    # Console blocks only keep prompt lines, the rest is sample output.
+    prompt_only = block.language in PROMPT_LANGUAGES
+    steps = []
+    current = []
+    depth = 0
+    heredoc = None
+
+    for line in block.body.split('\n'):
+        if heredoc is not None:
+            current.append(line)
+            if line.strip() == heredoc:
+                heredoc = None
+                if depth <= 0 and not unbalanced_quotes('\n'.join(current)):
+                    steps.append('\n'.join(current))
+                    current = []
+            continue
+
+        stripped = line.strip()
+        if not current:
+            prompt = PROMPT_RE.match(stripped)
+            if prompt_only and not prompt:
+                prompt = ROOT_PROMPT_RE.match(stripped)
+            if prompt:
+                stripped = stripped[prompt.end():].strip()
+            elif prompt_only:
+                continue
+            if not stripped or stripped.startswith('#'):
+                continue
+            line = stripped
+
+        current.append(line)
+        match = HEREDOC_RE.search(line)
+        if match:
+            heredoc = match.group(2)
+            continue
+        depth += block_depth_change(line)
+        joined = '\n'.join(current)
+        if depth > 0 or unbalanced_quotes(joined) or stripped.endswith(CONTINUATION_ENDINGS):
+            continue
+        steps.append(joined)
+        current = []
+        depth = 0
+
+    if current:
+        steps.append('\n'.join(current))
+    return [step.strip() for step in steps if step.strip()]
+
+
+def extract_commands(blocks):
+    commands = []
+    for block in blocks:
+        if is_shell_language(block.language):
+            commands.extend(split_commands(block))
+    return commands
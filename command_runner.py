@@ -0,0 +1,283 @@
+import codecs
+import collections
+import os
+import selectors
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+READ_SIZE = 65536
+POLL_INTERVAL = 0.1
+MEMORY_SAMPLE_INTERVAL = 0.25
+
+
+def process_tree(pid):
+    pids = [pid]
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/task/{pid}/children') as f:
+                pids.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            pass
+    return pids
+
+
+def tree_memory(pid):
+    # (current RSS summed over the process tree, largest per-process peak RSS)
+    # in bytes. ru_maxrss cannot be used for this: at exec Linux folds the
+    # forking parent's RSS into the child's high-water mark.
+    total = peak = 0
+    for pid in process_tree(pid):
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+                    elif line.startswith('VmHWM:'):
+                        peak = max(peak, int(line.split()[1]))
+        except (OSError, ValueError, IndexError):
+            continue
+    return total * 1024, peak * 1024
+
+
+class SpoolBuffer:
+    # Keeps the raw output in memory up to memory_limit bytes, then moves it
+    # to a temp file and appends everything after that straight to disk.
+    # Whoever keeps the runner calls remove() once the file is not needed.
+    def __init__(self, memory_limit):
+        self.memory_limit = memory_limit
+        self.data = bytearray()
+        self.file = None
+        self.path = None
+        self.size = 0
+
+    @property
+    def spooled(self):
+        return self.path is not None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.file is None and len(self.data) + len(data) <= self.memory_limit:
+            self.data += data
+            return
+        if self.file is None:
+            fd, self.path = tempfile.mkstemp(prefix='linuxai-output-', suffix='.log')
+            self.file = os.fdopen(fd, 'wb')
+            self.file.write(self.data)
+            self.data = bytearray()
+        self.file.write(data)
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        self.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+class LineSplitter:
+    def __init__(self, max_line):
+        self.max_line = max_line
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.partial = ''
+
+    def feed(self, data, final=False, keep_last=None):
+        # With keep_last only the trailing lines are split out; anything before
+        # them is dropped and reported by length, which keeps the truncated
+        # path cheap for very large outputs.
+        text = self.partial + self.decoder.decode(data, final)
+        dropped = 0
+        if keep_last is None:
+            lines = text.split('\n')
+        else:
+            lines = text.rsplit('\n', keep_last + 1)
+            if len(lines) > keep_last + 1 and '\n' in lines[0]:
+                dropped = len(lines[0]) + 1
+                lines = lines[1:]
+            lines = [line[:self.max_line] for line in lines]
+        self.partial = lines.pop()
+        if final and self.partial:
+            lines.append(self.partial)
+            self.partial = ''
+        # A huge output without newlines must not grow the partial line forever
+        while len(self.partial) > self.max_line:
+            lines.append(self.partial[:self.max_line])
+            self.partial = self.partial[self.max_line:]
+        return dropped, lines
+
+
+class CommandRunner:
+    # Runs a shell command and streams stdout/stderr as line batches, at most
+    # once per flush_interval. Once display_limit characters have been shown,
+    # further lines only feed a bounded tail, while the complete raw output is
+    # spooled to a temp file, so memory stays flat however much is printed.
+    # Pass an OutputSpool as `spool` to have every byte written to disk.
+    #
+    # The command runs in its own process group. cancel() or an expired
+    # timeout sends SIGTERM to the whole group and SIGKILL after
+    # grace_period, so pipelines and any children they spawned die with it.
+    def __init__(self, command, on_output, on_error, flush_interval=0.1,
+                 display_limit=256 * 1024, tail_lines=200, max_line=4096,
+                 timeout=None, grace_period=3.0, cwd=None, spool=None):
+        self.command = command
+        self.cwd = cwd
+        self.timeout = timeout
+        self.grace_period = grace_period
+        self.cancel_event = threading.Event()
+        self.stop_reason = None
+        self.callbacks = {'stdout': on_output, 'stderr': on_error}
+        self.flush_interval = flush_interval
+        self.display_limit = display_limit
+        self.spool = spool if spool is not None else SpoolBuffer(display_limit)
+        self.splitters = {name: LineSplitter(max_line) for name in self.callbacks}
+        self.pending = {name: [] for name in self.callbacks}
+        self.tail = collections.deque(maxlen=tail_lines)
+        self.displayed = 0
+        self.hidden = 0
+        self.truncated = False
+        self.rusage = None
+        self.peak_rss = None
+
+    def feed(self, name, data, final=False):
+        if data:
+            self.spool.write(data)
+        splitter = self.splitters[name]
+        if self.truncated:
+            dropped, lines = splitter.feed(data, final, keep_last=self.tail.maxlen)
+            self.hidden += dropped + sum(len(line) + 1 for line in lines)
+            self.tail.extend((name, line) for line in lines)
+            return
+        for line in splitter.feed(data, final)[1]:
+            if self.truncated:
+                self.tail.append((name, line))
+                self.hidden += len(line) + 1
+            elif self.displayed + len(line) + 1 > self.display_limit:
+                self.truncated = True
+                self.tail.append((name, line))
+                self.hidden += len(line) + 1
+            else:
+                self.pending[name].append(line)
+                self.displayed += len(line) + 1
+
+    def flush(self):
+        self.spool.flush()
+        for name, lines in self.pending.items():
+            if lines:
+                self.callbacks[name]('\n'.join(lines))
+                self.pending[name] = []
+
+    def flush_tail(self):
+        if not self.truncated:
+            return
+        note = f"[output truncated, {self.hidden} bytes not shown"
+        if self.spool.spooled:
+            note += f"; full output ({self.spool.size} bytes) spooled to {self.spool.path}"
+        self.callbacks['stdout'](f"{note}]\n[last {len(self.tail)} lines]")
+        group_name, group = None, []
+        for name, line in self.tail:
+            if name != group_name and group:
+                self.callbacks[group_name]('\n'.join(group))
+                group = []
+            group_name = name
+            group.append(line)
+        if group:
+            self.callbacks[group_name]('\n'.join(group))
+        self.tail.clear()
+
+    def cancel(self, reason="cancelled by user"):
+        if self.stop_reason is None:
+            self.stop_reason = reason
+        self.cancel_event.set()
+
+    def signal_group(self, process, sig):
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def sample_memory(self, process):
+        total, peak = tree_memory(process.pid)
+        if total or peak:
+            self.peak_rss = max(self.peak_rss or 0, total, peak)
+
+    def wait(self, process):
+        # wait4() also reports the CPU time and peak RSS of the command and
+        # of every descendant it reaped
+        try:
+            _, status, self.rusage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            return process.wait()
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return process.returncode
+
+    def run(self):
+        # A string runs through the shell, an argv list (ssh ...) directly
+        process = subprocess.Popen(
+            self.command,
+            shell=isinstance(self.command, str),
+            cwd=self.cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True
+        )
+        selector = selectors.DefaultSelector()
+        selector.register(process.stdout, selectors.EVENT_READ, 'stdout')
+        selector.register(process.stderr, selectors.EVENT_READ, 'stderr')
+        try:
+            started = last_flush = time.monotonic()
+            kill_at = abandon_at = None
+            next_sample = started
+            while selector.get_map():
+                now = time.monotonic()
+                if now >= next_sample:
+                    self.sample_memory(process)
+                    next_sample = now + MEMORY_SAMPLE_INTERVAL
+                if self.timeout and now - started >= self.timeout:
+                    self.cancel(f"timed out after {self.timeout:g}s")
+                if self.cancel_event.is_set() and kill_at is None:
+                    self.signal_group(process, signal.SIGTERM)
+                    kill_at = now + self.grace_period
+                elif kill_at is not None and abandon_at is None and now >= kill_at:
+                    self.signal_group(process, signal.SIGKILL)
+                    abandon_at = now + 1.0
+                elif abandon_at is not None and now >= abandon_at:
+                    # Something outside the group still holds the pipes open
+                    break
+                
+                timeout = min(POLL_INTERVAL, self.flush_interval - (now - last_flush))
+                for key, _ in selector.select(max(0.0, timeout)):
+                    data = os.read(key.fd, READ_SIZE)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()
+                    self.feed(key.data, data, final=not data)
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    self.flush()
+                    last_flush = time.monotonic()
+            returncode = self.wait(process)
+        finally:
+            if process.poll() is None:
+                self.signal_group(process, signal.SIGKILL)
+                process.wait()
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
+            self.spool.close()
+        self.flush()
+        self.flush_tail()
+        if self.stop_reason:
+            self.callbacks['stderr'](f"[stopped: {self.stop_reason}, exit status {returncode}]")
+        return returncode
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from command_runner import CommandRunner
+
+PENDING = 'pending'
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+SKIPPED = 'skipped'
+FINAL_STATES = {DONE, FAILED, CANCELLED, SKIPPED}
+
+
+class CommandJob:
+    def __init__(self, command, timeout=None, on_output=None, on_error=None, on_state=None,
+                 cwd=None, spool=None, runner_factory=None):
+        self.command = command
+        self.timeout = timeout
+        self.cwd = cwd or os.getcwd()
+        self.spool = spool
+        # Overrides the scheduler's runner_factory, e.g. to run on remote hosts
+        self.runner_factory = runner_factory
+        self.on_output = on_output or (lambda text: None)
+        self.on_error = on_error or (lambda text: None)
+        self.on_state = on_state or (lambda state: None)
+        self.state = PENDING
+        self.exit_code = None
+        self.started = None
+        self.duration = None
+        self.cpu_time = None
+        self.peak_rss = None
+        self.runner = None
+        self.cancelled = False
+        self.done_callbacks = []
+
+    @property
+    def finished(self):
+        return self.state in FINAL_STATES
+
+    def add_done_callback(self, callback):
+        self.done_callbacks.append(callback)
+
+    def set_state(self, state):
+        self.state = state
+        self.on_state(state)
+
+    def finish(self, state):
+        self.set_state(state)
+        for callback in self.done_callbacks:
+            callback(self)
+
+    def cancel(self):
+        self.cancelled = True
+        if self.runner is not None:
+            self.runner.cancel()
+
+
+class CommandScheduler:
+    # Queue of shell commands run on a shared worker pool. At most
+    # max_parallel commands run at once; the limit can be changed while
+    # jobs are queued and takes effect on the next dispatch.
+    def __init__(self, max_parallel=2, max_workers=16, runner_factory=CommandRunner,
+                 telemetry=None):
+        self.max_parallel = max_parallel
+        self.runner_factory = runner_factory
+        self.telemetry = telemetry
+        self.queue = deque()
+        self.running = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='linuxai-cmd')
+
+    def submit(self, job):
+        with self.lock:
+            self.queue.append(job)
+        job.set_state(QUEUED)
+        self.dispatch()
+        return job
+
+    def set_max_parallel(self, max_parallel):
+        self.max_parallel = max(1, max_parallel)
+        self.dispatch()
+
+    def dispatch(self):
+        started = []
+        with self.lock:
+            while self.queue and len(self.running) < self.max_parallel:
+                job = self.queue.popleft()
+                self.running.add(job)
+                started.append(job)
+        for job in started:
+            job.set_state(RUNNING)
+            self.executor.submit(self.run_job, job)
+
+    def run_job(self, job):
+        state = FAILED
+        try:
+            runner_factory = job.runner_factory or self.runner_factory
+            job.runner = runner_factory(job.command, job.on_output, job.on_error,
+                                        timeout=job.timeout, cwd=job.cwd, spool=job.spool)
+            if job.cancelled:
+                state = CANCELLED
+                return
+            job.started = time.time()
+            clock = time.monotonic()
+            try:
+                job.exit_code = job.runner.run()
+            finally:
+                job.duration = time.monotonic() - clock
+                rusage = getattr(job.runner, 'rusage', None)
+                if rusage is not None:
+                    job.cpu_time = rusage.ru_utime + rusage.ru_stime
+                job.peak_rss = getattr(job.runner, 'peak_rss', None)
+            if job.cancelled:
+                state = CANCELLED
+            elif job.exit_code == 0:
+                state = DONE
+        except Exception as e:
+            job.on_error(str(e))
+        finally:
+            with self.lock:
+                self.running.discard(job)
+            job.finish(state)
+            if self.telemetry is not None and job.started is not None:
+                self.telemetry.record_command(job)
+            self.dispatch()
+
+    def cancel(self, job, state=CANCELLED):
+        with self.lock:
+            queued = job in self.queue
+            if queued:
+                self.queue.remove(job)
+        if queued or job.state == PENDING:
+            job.cancelled = True
+            job.finish(state)
+        elif not job.finished:
+            job.cancel()
+
+    def run_all(self, jobs, sequential=True, stop_on_failure=True):
+        batch = CommandBatch(self, jobs, sequential, stop_on_failure)
+        batch.start()
+        return batch
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            queued = list(self.queue)
+            running = list(self.running)
+        for job in queued + running:
+            self.cancel(job)
+        self.executor.shutdown(wait=wait)
+
+
+class CommandBatch:
+    # "Run all": either one job at a time in order, or everything through the
+    # scheduler's parallelism cap. With stop_on_failure a non-zero exit skips
+    # every job of the batch that has not started yet.
+    def __init__(self, scheduler, jobs, sequential=True, stop_on_failure=True):
+        self.scheduler = scheduler
+        self.jobs = list(jobs)
+        self.sequential = sequential
+        self.stop_on_failure = stop_on_failure
+        self.next_index = 0
+        self.failed = False
+        self.lock = threading.Lock()
+        for job in self.jobs:
+            job.add_done_callback(self.on_job_done)
+
+    def start(self):
+        if self.sequential:
+            self.submit_next()
+        else:
+            self.next_index = len(self.jobs)
+            for job in self.jobs:
+                self.scheduler.submit(job)
+
+    def submit_next(self):
+        with self.lock:
+            if self.next_index >= len(self.jobs):
+                return
+            job = self.jobs[self.next_index]
+            self.next_index += 1
+        self.scheduler.submit(job)
+
+    def on_job_done(self, job):
+        if job.state == SKIPPED:
+            return
+        if job.state in (FAILED, CANCELLED) and self.stop_on_failure:
+            with self.lock:
+                if self.failed:
+                    return
+                self.failed = True
+            for other in self.jobs:
+                if other.state in (PENDING, QUEUED):
+                    self.scheduler.cancel(other, state=SKIPPED)
+        elif self.sequential and not self.failed:
+            self.submit_next()
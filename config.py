@@ -0,0 +1,96 @@
+import copy
+import json
+import os
+import sys
+
+from paths import config_dir
+
+# Settings that are not worth a GUI control. Anything in
+# ~/.config/linuxai/config.json overrides these, section by section.
+DEFAULTS = {
+    'requests': {
+        # Quota of the API key: the free Gemini tier allows 15 requests a minute
+        'requests_per_minute': 15,
+        'burst': 5,
+        'max_retries': 4,
+        'backoff_base': 1.0,
+        'backoff_cap': 30.0,
+        'deadline': 120.0,
+    },
+    'telemetry': {
+        # Relative paths are inside the config directory; null disables it
+        'trace_file': 'trace.jsonl',
+        'max_trace_bytes': 10 * 1024 * 1024,
+        # Serve Prometheus metrics on 127.0.0.1:<port>; null to disable
+        'prometheus_port': None,
+    },
+    'ssh': {
+        # Hosts and groups for remote targets; relative to the config directory
+        'inventory': 'inventory',
+        # Hosts a single fan-out runs on at once
+        'max_parallel': 16,
+        'connect_timeout': 10,
+        # Seconds an idle master connection stays up for reuse
+        'control_persist': 600,
+        # Extra ssh -o options, e.g. ["StrictHostKeyChecking=accept-new"]
+        'options': [],
+    },
+    'shell': {
+        # Run local commands in one long-lived shell per conversation, so cd
+        # and export carry over; also a checkbox next to "Run all"
+        'persistent': False,
+        'program': 'bash',
+    },
+    'backends': {
+        # Tried in this order (gemini, local, stub); the next one answers when
+        # one fails before producing text. gemini is skipped without an API key.
+        'order': ['gemini'],
+        # llama.cpp: a GGUF file run by llama-server, kept loaded while the
+        # app is open, or local_url of a server that is already running
+        'local_model': None,
+        'local_url': None,
+        'local_server': 'llama-server',
+        'local_context_size': 4096,
+        # Requests decoded together in one batch
+        'local_parallel': 4,
+        'local_threads': None,
+        'local_max_tokens': 1024,
+        'local_temperature': 0.2,
+        'local_startup_timeout': 120,
+    },
+    'context': {
+        # Prepend distro, package manager, init system, shell, sudo status and
+        # available tools to prompts; cached in system_context.json
+        'system': True,
+        # Quote the best matching man page / --help snippets for each question
+        'docs': True,
+        'docs_snippets': 3,
+        'docs_snippet_chars': 600,
+    },
+}
+
+
+def config_path():
+    return os.path.join(config_dir(), 'config.json')
+
+
+def load_config(path=None):
+    config = copy.deepcopy(DEFAULTS)
+    try:
+        with open(path or config_path(), 'r') as f:
+            overrides = json.load(f)
+    except (OSError, ValueError):
+        return config
+    if not isinstance(overrides, dict):
+        print(f"config: {path or config_path()} is not a JSON object; using the defaults",
+              file=sys.stderr)
+        return config
+    for section, values in overrides.items():
+        if section not in config:
+            config[section] = values
+        elif isinstance(config[section], dict) and isinstance(values, dict):
+            config[section].update(values)
+        else:
+            # e.g. "requests": null would leave the engine without settings
+            print(f"config: ignoring {section!r}, expected an object", file=sys.stderr)
+    return config
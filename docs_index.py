@@ -0,0 +1,527 @@
+import argparse
+import bz2
+import gzip
+import lzma
+import os
+import re
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from paths import config_dir
+
+MAN_ROOTS = ('/usr/share/man', '/usr/local/share/man')
+# User commands and administration commands
+MAN_SECTIONS = ('1', '8')
+HELP_DIRS = ('/usr/local/bin', '/usr/bin', '/bin', '/usr/local/sbin', '/usr/sbin', '/sbin')
+# Never run with --help: a program that ignores the flag must not act
+HELP_DENYLIST = {'reboot', 'shutdown', 'halt', 'poweroff', 'init', 'telinit', 'kexec',
+                 'login', 'su', 'sudo', 'passwd', 'sulogin', 'agetty', 'getty', 'X', 'Xorg'}
+HELP_TIMEOUT = 2.0
+HELP_MAX_BYTES = 64 * 1024
+CHUNK_CHARS = 700
+SUMMARY_CHARS = 400
+STOPWORDS = frozenset("""
+    a about all an and any are as at be by can do does for from get how i if in into is it
+    its me my of on or show so that the this to use using want way what when where which
+    who why will with without you your please command commands linux shell
+""".split())
+
+Snippet = namedtuple('Snippet', ['tool', 'section', 'text', 'score'])
+
+COMMENT = re.compile(r'\\".*')
+FONT_ESCAPE = re.compile(r'\\f(\[[^\]]*\]|\(..|.)')
+SIZE_ESCAPE = re.compile(r'\\s[-+]?\d+')
+STRING_ESCAPE = re.compile(r'\\\*(\(..|\[[^\]]*\]|.)')
+CHAR_ESCAPE = re.compile(r'\\(?:\((..)|\[([^\]]*)\])')
+SIMPLE_ESCAPE = re.compile(r'\\(.)')
+NAMED_CHARS = {'aq': "'", 'dq': '"', 'lq': '"', 'rq': '"', 'oq': "'", 'cq': "'", 'em': '--',
+               'en': '-', 'hy': '-', 'mi': '-', 'bu': '*', 'ti': '~', 'ha': '^', 'ga': '`',
+               'at': '@', 'sl': '/', 'rs': '\\', 'pl': '+', 'eq': '=', 'lt': '<', 'gt': '>',
+               'ba': '|', 'or': '|', 'co': '(c)', 'rg': '(R)'}
+SIMPLE_CHARS = {'-': '-', 'e': '\\', '\\': '\\', ' ': ' ', '~': ' ', '0': ' ', '.': '.',
+                "'": "'", '`': '`'}
+MACRO_ARG = re.compile(r'"((?:[^"]|"")*)"|(\S+)')
+MDOC_CALL = re.compile(r'^[A-Z][a-z]{1,2}$')
+SECTION_MACROS = {'SH', 'SS', 'Sh', 'Ss'}
+BREAK_MACROS = {'PP', 'P', 'LP', 'TP', 'IP', 'HP', 'br', 'sp', 'RS', 'RE', 'nf', 'fi', 'EX', 'EE',
+                'Pp', 'Lp', 'It', 'Bl', 'El', 'Bd', 'Ed', 'Dl', 'D1'}
+ALTERNATING_FONTS = {'BR', 'RB', 'BI', 'IB', 'IR', 'RI'}
+IGNORED_MACROS = {'TH', 'Dd', 'Dt', 'Os', 'de', 'ds', 'nr', 'so', 'ad', 'na', 'hy', 'nh', 'ft',
+                  'ps', 'll', 'in', 'ti', 'ne', 'ta', 'ie', 'if', 'el', 'ig', '.', 'IX', 'PD',
+                  'UC', 'tr', 'cs', 'ss', 'do', 'mso', 'rm', 'rn', 'als', 'nop', 'bp', 'pc', 'lf'}
+# Tool names that are usually just English in a question
+AMBIGUOUS_TOOLS = frozenset('file last time test free more less yes write join split watch '
+                            'who users groups link install dir size'.split())
+TERM = re.compile(r'[a-z0-9][a-z0-9_+.-]*')
+
+
+def unescape(text):
+    text = FONT_ESCAPE.sub('', text)
+    text = SIZE_ESCAPE.sub('', text)
+    text = STRING_ESCAPE.sub('', text)
+    text = CHAR_ESCAPE.sub(lambda m: NAMED_CHARS.get(m.group(1) or m.group(2), ''), text)
+    return SIMPLE_ESCAPE.sub(lambda m: SIMPLE_CHARS.get(m.group(1), ''), text)
+
+
+def macro_words(name, args):
+    # mdoc macros call each other inline (".Op Fl v Ar file"); Fl marks a flag
+    if name in ALTERNATING_FONTS:
+        return ''.join(args)
+    words = []
+    flag = name == 'Fl'
+    for arg in args:
+        if MDOC_CALL.match(arg):
+            flag = arg == 'Fl'
+            continue
+        words.append('-' + arg if flag else arg)
+        flag = False
+    if flag:
+        words.append('-')
+    return ' '.join(words)
+
+
+def parse_roff(source):
+    # (section, paragraph) pairs from man(7) or mdoc(7) source: enough
+    # structure for search and snippets, not a renderer
+    paragraphs = []
+    section = ''
+    lines = []
+
+    def end_paragraph():
+        if lines:
+            paragraphs.append((section, ' '.join(lines)))
+            lines.clear()
+
+    for raw in source.splitlines():
+        if raw.startswith(('.\\"', '\'\\"')):
+            continue
+        line = COMMENT.sub('', raw)
+        if not line.startswith(('.', "'")):
+            text = unescape(line).strip()
+            if text:
+                lines.append(text)
+            else:
+                end_paragraph()
+            continue
+        name, _, rest = line[1:].strip().partition(' ')
+        if name in IGNORED_MACROS:
+            continue
+        args = [quoted.replace('""', '"') if quoted else plain
+                for quoted, plain in MACRO_ARG.findall(unescape(rest))]
+        if name in SECTION_MACROS:
+            end_paragraph()
+            section = ' '.join(args).strip()
+        elif name in BREAK_MACROS:
+            end_paragraph()
+            if args and name in ('IP', 'It'):
+                lines.append(macro_words(name, args))
+        elif args:
+            lines.append(macro_words(name, args))
+    end_paragraph()
+    return paragraphs
+
+
+def parse_help(text):
+    # Paragraphs are separated by blank lines; an unindented line ending in
+    # a colon ("Options:") names the section of what follows
+    paragraphs = []
+    section = ''
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            if lines:
+                paragraphs.append((section, '\n'.join(lines)))
+                lines = []
+            continue
+        if line == stripped and stripped.endswith(':') and len(stripped) < 40:
+            if lines:
+                paragraphs.append((section, '\n'.join(lines)))
+                lines = []
+            section = stripped[:-1]
+            continue
+        lines.append(' '.join(stripped.split()))
+    if lines:
+        paragraphs.append((section, '\n'.join(lines)))
+    return paragraphs
+
+
+def chunk_paragraphs(paragraphs, limit=CHUNK_CHARS):
+    # Consecutive paragraphs of one section, up to `limit` characters each
+    chunks = []
+    section, parts, size = None, [], 0
+    for paragraph_section, text in paragraphs:
+        pieces = [text[i:i + limit] for i in range(0, len(text), limit)] or ['']
+        for piece in pieces:
+            if parts and (paragraph_section != section or size + len(piece) > limit):
+                chunks.append((section, '\n'.join(parts)))
+                parts, size = [], 0
+            section = paragraph_section
+            parts.append(piece)
+            size += len(piece) + 1
+    if parts:
+        chunks.append((section, '\n'.join(parts)))
+    return chunks
+
+
+def man_tool(path):
+    name = os.path.basename(path)
+    for suffix in ('.gz', '.bz2', '.xz'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name.rsplit('.', 1)[0]
+
+
+def read_man(path):
+    opener = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}.get(
+        os.path.splitext(path)[1], open)
+    with opener(path, 'rb') as f:
+        return f.read().decode('utf-8', errors='replace')
+
+
+def run_help(path):
+    try:
+        with open(path, 'rb') as f:
+            if f.read(4) != b'\x7fELF':
+                return ''
+    except OSError:
+        return ''
+    env = dict(os.environ, LC_ALL='C', PAGER='cat', MANPAGER='cat', TERM='dumb')
+    try:
+        process = subprocess.Popen([path, '--help'], stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   cwd=tempfile.gettempdir(), env=env, start_new_session=True)
+    except OSError:
+        return ''
+    try:
+        output, _ = process.communicate(timeout=HELP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.communicate()
+        return ''
+    text = output[:HELP_MAX_BYTES].decode('utf-8', errors='replace')
+    # Anything that does not look like usage text is left out
+    if 'usage' not in text.lower() and not re.search(r'^\s+-', text, re.MULTILINE):
+        return ''
+    return text
+
+
+def summarize(paragraphs):
+    # NAME line and the start of DESCRIPTION, or the start of --help output
+    named = [text for section, text in paragraphs if section.upper() == 'NAME']
+    described = [text for section, text in paragraphs if section.upper() == 'DESCRIPTION']
+    summary = ' '.join(named[:1] + described[:1]) or ' '.join(text for _, text in paragraphs[:2])
+    return summary[:SUMMARY_CHARS]
+
+
+def parse_source(item):
+    # Runs in the builder's worker processes:
+    # (kind, path) -> (tool, summary, [(section, text)])
+    kind, path = item
+    try:
+        if kind == 'man':
+            source = read_man(path)
+            if source.lstrip().startswith('.so '):
+                # Alias of another page, which is indexed itself
+                return man_tool(path), '', []
+            tool, paragraphs = man_tool(path), parse_roff(source)
+        else:
+            tool, paragraphs = os.path.basename(path), parse_help(run_help(path))
+    except (OSError, EOFError, ValueError, lzma.LZMAError):
+        return os.path.basename(path), '', []
+    chunks = [(section, text) for section, text in chunk_paragraphs(paragraphs) if text]
+    return tool, summarize(paragraphs) if chunks else '', chunks
+
+
+def scan_sources(help_output=False, man_roots=MAN_ROOTS, help_dirs=HELP_DIRS):
+    # {path: (kind, mtime_ns)}; --help only for commands without a man page
+    sources = {}
+    documented = set()
+    for root in man_roots:
+        for section in MAN_SECTIONS:
+            try:
+                entries = list(os.scandir(os.path.join(root, f'man{section}')))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        sources[entry.path] = ('man', entry.stat().st_mtime_ns)
+                        documented.add(man_tool(entry.path))
+                except OSError:
+                    pass
+    if not help_output:
+        return sources
+    seen_dirs = set()
+    for directory in help_dirs:
+        real = os.path.realpath(directory)
+        if real in seen_dirs:
+            continue
+        seen_dirs.add(real)
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name in documented or entry.name in HELP_DENYLIST:
+                continue
+            documented.add(entry.name)
+            try:
+                if entry.is_file() and os.access(entry.path, os.X_OK):
+                    sources[entry.path] = ('help', entry.stat().st_mtime_ns)
+            except OSError:
+                pass
+    return sources
+
+
+def query_words(text, limit=10):
+    # Whole words, which may name a tool ("mkfs.ext4", "git-commit")
+    words = []
+    for word in TERM.findall(text.lower()):
+        word = word.rstrip('.')
+        if len(word) > 1 and word not in STOPWORDS and word not in words:
+            words.append(word)
+    return words[:limit]
+
+
+def query_terms(words):
+    # The words split the way the FTS tokenizer splits them ("tar.gz" -> tar, gz)
+    terms = []
+    for word in words:
+        for term in re.split(r'[^a-z0-9_]+', word):
+            if len(term) > 1 and term not in STOPWORDS and term not in terms:
+                terms.append(term)
+    return terms
+
+
+class DocsIndex:
+    # BM25 search over the installed man pages, and on request the --help
+    # output of commands without one, so prompts can quote the options the
+    # installed versions really have. Stored with SQLite FTS5 like the
+    # history; pages are split into chunks of about CHUNK_CHARS so that a
+    # snippet is an option block rather than a whole page. update() only re-reads sources
+    # whose mtime changed and parses them in a process pool.
+    #
+    # Indexing --help means running every undocumented program, so it only
+    # happens with help_output (`build --help-output`); other updates leave
+    # the --help entries of an earlier such build alone.
+    def __init__(self, path=None, help_output=False):
+        self.path = path or os.path.join(config_dir(), 'docs_index.sqlite3')
+        self.help_output = help_output
+        self.updater = None
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS sources (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                mtime INTEGER NOT NULL,
+                tool TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                first_chunk INTEGER,
+                last_chunk INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                source INTEGER NOT NULL,
+                tool TEXT NOT NULL,
+                section TEXT NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source);
+            CREATE INDEX IF NOT EXISTS sources_tool ON sources (tool);
+            CREATE VIRTUAL TABLE IF NOT EXISTS sources_fts USING fts5(
+                tool, summary, content='sources', content_rowid='id', tokenize='porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS sources_insert AFTER INSERT ON sources BEGIN
+                INSERT INTO sources_fts (rowid, tool, summary) VALUES (new.id, new.tool, new.summary);
+            END;
+            CREATE TRIGGER IF NOT EXISTS sources_delete AFTER DELETE ON sources BEGIN
+                INSERT INTO sources_fts (sources_fts, rowid, tool, summary)
+                VALUES ('delete', old.id, old.tool, old.summary);
+            END;
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                tool, text, content='chunks', content_rowid='id', tokenize='porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS chunks_insert AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, tool, text) VALUES (new.id, new.tool, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_delete AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, tool, text)
+                VALUES ('delete', old.id, old.tool, old.text);
+            END;
+        """)
+        self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            sources = self.db.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+            chunks = self.db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return sources, chunks
+
+    def update(self, workers=None, batch=200):
+        # Returns (sources parsed, sources removed)
+        current = scan_sources(self.help_output)
+        with self.lock:
+            known = {path: (source_id, mtime) for source_id, path, kind, mtime in
+                     self.db.execute("SELECT id, path, kind, mtime FROM sources")
+                     if self.help_output or kind != 'help'}
+        stale = [source_id for path, (source_id, mtime) in known.items()
+                 if current.get(path, (None, None))[1] != mtime]
+        todo = [(kind, path) for path, (kind, mtime) in current.items()
+                if known.get(path, (None, None))[1] != mtime]
+        with self.lock:
+            for start in range(0, len(stale), 500):
+                ids = stale[start:start + 500]
+                marks = ','.join('?' * len(ids))
+                self.db.execute(f"DELETE FROM chunks WHERE source IN ({marks})", ids)
+                self.db.execute(f"DELETE FROM sources WHERE id IN ({marks})", ids)
+            self.db.commit()
+        removed = sum(1 for path in known if path not in current)
+        if not todo:
+            return 0, removed
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(parse_source, todo, chunksize=16)
+            for count, ((kind, path), (tool, summary, chunks)) in enumerate(zip(todo, results), 1):
+                with self.lock:
+                    # A page's chunks get consecutive ids, so searching inside
+                    # one page is a rowid range query
+                    source_id = self.db.execute(
+                        "INSERT INTO sources (path, kind, mtime, tool, summary) VALUES (?, ?, ?, ?, ?)",
+                        (path, kind, current[path][1], tool, summary)).lastrowid
+                    self.db.executemany(
+                        "INSERT INTO chunks (source, tool, section, text) VALUES (?, ?, ?, ?)",
+                        [(source_id, tool, section, text) for section, text in chunks])
+                    self.db.execute(
+                        "UPDATE sources SET (first_chunk, last_chunk) = "
+                        "(SELECT MIN(id), MAX(id) FROM chunks WHERE source = ?) WHERE id = ?",
+                        (source_id, source_id))
+                    if count % batch == 0:
+                        self.db.commit()
+        with self.lock:
+            self.db.commit()
+        return len(todo), removed
+
+    def start_update(self):
+        # Rebuilds the man pages in a separate low-priority process, so the
+        # GUI process never forks a pool; searches keep working on the old
+        # data meanwhile. Never runs anything with --help.
+        if self.updater is not None and self.updater.is_alive():
+            return self.updater
+        argv = [sys.executable, os.path.abspath(__file__), '--db', self.path, 'build', '--quiet']
+
+        def run():
+            try:
+                subprocess.run(argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, preexec_fn=lambda: os.nice(10))
+            except OSError:
+                pass
+
+        self.updater = threading.Thread(target=run, name='linuxai-docs', daemon=True)
+        self.updater.start()
+        return self.updater
+
+    def search(self, text, limit=3, pages=4):
+        # Two steps keep this in the low milliseconds: pick pages first, the
+        # tools named in the question and then the best matches on name and
+        # summary (one small table, the name weighted most); then rank the
+        # chunks of those pages, each a rowid range. The best chunk of each
+        # page comes first, then the runners-up.
+        words = query_words(text)
+        terms = query_terms(words)
+        if not terms:
+            return []
+        query = ' OR '.join('"' + term + '"' for term in terms)
+        names = [word for word in words + terms if word not in AMBIGUOUS_TOOLS]
+        marks = ','.join('?' * len(names))
+        with self.lock:
+            named = self.db.execute(
+                f"SELECT tool, first_chunk, last_chunk FROM sources "
+                f"WHERE tool IN ({marks}) AND first_chunk IS NOT NULL", names).fetchall()
+            named.sort(key=lambda row: names.index(row[0]))
+            ranked = [row[1:] for row in named[:pages]]
+            ranked += [row for row in self.db.execute(
+                "SELECT sources.first_chunk, sources.last_chunk FROM sources_fts "
+                "JOIN sources ON sources.id = sources_fts.rowid "
+                "WHERE sources_fts MATCH ? AND sources.first_chunk IS NOT NULL "
+                "ORDER BY bm25(sources_fts, 10.0, 1.0) LIMIT ?",
+                (query, pages)
+            ) if row not in ranked][:pages - len(ranked)]
+            per_page = [self.db.execute(
+                "SELECT chunks.tool, chunks.section, chunks.text, bm25(chunks_fts, 4.0, 1.0) AS score "
+                "FROM chunks_fts JOIN chunks ON chunks.id = chunks_fts.rowid "
+                "WHERE chunks_fts MATCH ? AND chunks_fts.rowid BETWEEN ? AND ? "
+                "ORDER BY score LIMIT ?",
+                (query, first, last, limit)
+            ).fetchall() for first, last in ranked]
+        snippets = []
+        for rank in range(limit):
+            for rows in per_page:
+                if rank < len(rows) and len(snippets) < limit:
+                    snippets.append(Snippet(*rows[rank]))
+        return snippets
+
+    def prompt_text(self, text, limit=3, max_chars=600):
+        # The snippets as a block for the prompt; empty when nothing matched
+        snippets = self.search(text, limit)
+        if not snippets:
+            return ''
+        parts = ["[Installed documentation; prefer these options]"]
+        for snippet in snippets:
+            body = snippet.text if len(snippet.text) <= max_chars else snippet.text[:max_chars] + '…'
+            section = f", {snippet.section}" if snippet.section else ''
+            parts.append(f"{snippet.tool}{section}:\n{body}")
+        return '\n\n'.join(parts)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Man page and --help index used to ground answers")
+    parser.add_argument('--db', help="index file (default: docs_index.sqlite3 in the config directory)")
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+    build = subparsers.add_parser('build', help="index new and changed pages")
+    build.add_argument('--help-output', action='store_true',
+                       help="also run every program without a man page with --help and index "
+                            "the output")
+    build.add_argument('--workers', type=int, help="parser processes (default: one per CPU)")
+    build.add_argument('--quiet', action='store_true')
+    search = subparsers.add_parser('search', help="show the snippets a question would get")
+    search.add_argument('question')
+    search.add_argument('--limit', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.mode == 'build':
+        index = DocsIndex(args.db, help_output=args.help_output)
+        started = time.perf_counter()
+        parsed, removed = index.update(args.workers)
+        sources, chunks = index.stats()
+        if not args.quiet:
+            print(f"{parsed} sources parsed, {removed} removed in "
+                  f"{time.perf_counter() - started:.2f} s; {sources} sources, {chunks} chunks")
+    else:
+        index = DocsIndex(args.db)
+        started = time.perf_counter()
+        snippets = index.search(args.question, args.limit)
+        elapsed = time.perf_counter() - started
+        for snippet in snippets:
+            print(f"== {snippet.tool} ({snippet.section}) score {snippet.score:.2f}\n{snippet.text}\n")
+        print(f"{len(snippets)} snippets in {elapsed * 1000:.2f} ms")
+    index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import asyncio
+import functools
+import json
+import threading
+import time
+from collections import namedtuple
+
+from ai_client import DEFAULT_MODEL
+from chat_session import estimate_tokens
+from command_parser import FencedBlockParser, parse_blocks, extract_commands
+from request_policy import (RetryPolicy, TokenBucket, SharedCall, RequestTimedOut,
+                            is_retryable, retry_after)
+
+AskResult = namedtuple('AskResult', ['prompt', 'response', 'blocks', 'commands',
+                                     'latency', 'first_chunk'])
+
+
+class Engine:
+    # Ask-and-extract core shared by the GUI and the command line. Requests
+    # are coroutines on one asyncio loop; the blocking SDK calls run on the
+    # ModelClient pool and at most `concurrency` of them are in flight.
+    #
+    # Upstream calls go through the request policy: a token bucket sized to
+    # the API quota, retries with jittered backoff on 429/5xx, a deadline per
+    # request, and identical prompts in flight at the same time share one call.
+    # A call that outlives its deadline keeps its pool worker until the SDK
+    # returns; those are counted in `abandoned`, and while every worker is
+    # held by one, new requests fail at once instead of queueing behind them.
+    #
+    # The CLI drives the coroutines with asyncio.run(); the GUI calls start()
+    # once, which runs the loop on a background thread, and submits work
+    # from the Qt thread with submit().
+    def __init__(self, client, concurrency=4, limiter=None, retry=None, deadline=None,
+                 telemetry=None):
+        self.client = client
+        self.telemetry = telemetry
+        self.concurrency = concurrency
+        self.limiter = limiter
+        self.retry = retry or RetryPolicy(max_retries=0)
+        self.deadline = deadline
+        self.retries = 0
+        self.coalesced = 0
+        self.abandoned = 0
+        self.in_flight = {}
+        self.semaphore = None
+        self.loop = None
+        self.thread = None
+
+    async def ask(self, prompt, model_name=DEFAULT_MODEL, stream=False,
+                  on_chunk=None, on_commands=None, on_retry=None, cache_prompt=None):
+        # on_chunk and on_commands are called on a pool thread. on_commands
+        # gets every command found so far, each time another code block closes.
+        # on_retry(attempt, delay, error) is called on the loop before a retry.
+        # cache_prompt, if given, is what the response cache is keyed on
+        # instead of the prompt (e.g. the prompt without volatile snippets).
+        parser = FencedBlockParser()
+        blocks = []
+        timing = {}
+        started = time.perf_counter()
+
+        def handle_chunk(text):
+            timing.setdefault('first_chunk', time.perf_counter() - started)
+            if on_chunk:
+                on_chunk(text)
+            closed = parser.feed(text)
+            if closed:
+                blocks.extend(closed)
+                if on_commands:
+                    on_commands(extract_commands(blocks))
+
+        key = json.dumps([model_name, prompt], ensure_ascii=False)
+        call = self.in_flight.get(key)
+        coalesced = call is not None
+        if call is None:
+            call = SharedCall(prompt)
+            call.task = asyncio.ensure_future(self.upstream(call, prompt, model_name, stream, on_retry,
+                                                            cache_prompt or prompt))
+            self.in_flight[key] = call
+            call.task.add_done_callback(functools.partial(self.forget, key, call))
+        else:
+            self.coalesced += 1
+        if stream:
+            call.add_listener(handle_chunk)
+        try:
+            response = await asyncio.shield(call.task)
+        except Exception as e:
+            if self.telemetry is not None:
+                self.telemetry.record_request(error=e, model=model_name,
+                                              stats={'retries': call.retries})
+            raise
+        latency = time.perf_counter() - started
+
+        if stream:
+            if not call.chunks:
+                # Joined a call that was not streamed
+                handle_chunk(response)
+            blocks.extend(parser.close())
+        else:
+            blocks = parse_blocks(response)
+        result = AskResult(prompt, response, blocks, extract_commands(blocks),
+                           latency, timing.get('first_chunk', latency))
+        if self.telemetry is not None:
+            self.telemetry.record_request(result, model=model_name, stream=stream,
+                                          stats=self.request_stats(call, coalesced))
+        return result
+
+    def request_stats(self, call, coalesced):
+        # Token counts from the API when it reported them, estimated otherwise
+        prompt_tokens = call.usage.get('prompt_tokens')
+        if prompt_tokens is None:
+            prompt = call.prompt if isinstance(call.prompt, str) else \
+                ''.join(part for turn in call.prompt for part in turn['parts'])
+            prompt_tokens = estimate_tokens(prompt)
+        response_tokens = call.usage.get('response_tokens')
+        if response_tokens is None:
+            response_tokens = estimate_tokens(call.task.result())
+        return {'coalesced': coalesced, 'cache_hit': call.cache_hit, 'retries': call.retries,
+                'prompt_tokens': prompt_tokens, 'response_tokens': response_tokens}
+
+    def forget(self, key, call, task):
+        if self.in_flight.get(key) is call:
+            del self.in_flight[key]
+
+    async def upstream(self, call, prompt, model_name, stream, on_retry, cache_prompt):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline if self.deadline else None
+        # The cache lookup runs on the same pool
+        self.check_workers()
+        response = await loop.run_in_executor(self.client.executor, self.client.lookup,
+                                              cache_prompt, model_name)
+        if self.client.cache is not None and self.client.cache.enabled:
+            call.cache_hit = response is not None
+        if response is not None:
+            call.emit(response)
+            return response
+
+        attempt = 0
+        while True:
+            try:
+                response = await self.attempt(call, prompt, model_name, stream, deadline)
+                break
+            except RequestTimedOut:
+                raise
+            except Exception as e:
+                # A stream that already produced text is not replayed
+                if call.chunks or attempt >= self.retry.max_retries or not is_retryable(e):
+                    raise
+                server_delay = retry_after(e)
+                if server_delay is not None and self.limiter is not None:
+                    self.limiter.pause(server_delay)
+                delay = self.retry.delay(attempt, server_delay)
+                if deadline is not None and loop.time() + delay >= deadline:
+                    raise
+                attempt += 1
+                call.retries += 1
+                self.retries += 1
+                if on_retry:
+                    on_retry(attempt, delay, e)
+                await asyncio.sleep(delay)
+
+        await loop.run_in_executor(self.client.executor, self.client.store,
+                                   cache_prompt, model_name, response)
+        return response
+
+    async def attempt(self, call, prompt, model_name, stream, deadline):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - loop.time())
+
+        if self.limiter is not None:
+            await self.limiter.acquire(remaining())
+        self.check_workers()
+        fn = functools.partial(self.client.generate_uncached, prompt, model_name,
+                               stream=stream, on_chunk=call.emit if stream else None,
+                               usage=call.usage)
+        try:
+            return await asyncio.wait_for(self.run_limited(loop, fn), remaining())
+        except asyncio.TimeoutError:
+            if deadline is None or loop.time() < deadline:
+                # Raised by the SDK call itself
+                raise
+            # The SDK call cannot be interrupted; a stream stops at its next chunk
+            call.aborted = True
+            raise RequestTimedOut(f"no answer within {self.deadline:g}s")
+
+    async def run_limited(self, loop, fn):
+        async with self.semaphore:
+            future = self.client.executor.submit(fn)
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                # A call still queued is dropped; a running one is abandoned
+                if not future.cancel():
+                    self.abandoned += 1
+                    future.add_done_callback(
+                        lambda done: loop.call_soon_threadsafe(self.release_worker))
+                raise
+
+    def release_worker(self):
+        self.abandoned -= 1
+
+    def check_workers(self):
+        if self.abandoned >= self.client.max_workers:
+            raise RequestTimedOut(f"all {self.client.max_workers} model workers are still busy "
+                                  f"with requests that timed out; try again later")
+
+    def start(self):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_forever,
+                                           name='linuxai-engine', daemon=True)
+            self.thread.start()
+        return self
+
+    def submit(self, coro):
+        # Returns a concurrent.futures.Future, usable from any thread
+        return asyncio.run_coroutine_threadsafe(coro, self.start().loop)
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=1.0)
+            self.loop = None
+            self.thread = None
+            self.semaphore = None
+
+
+def engine_from_config(client, config, concurrency=4, telemetry=None):
+    settings = config['requests']
+    limiter = None
+    if settings.get('requests_per_minute'):
+        limiter = TokenBucket(settings['requests_per_minute'] / 60.0, max(1, settings.get('burst', 1)))
+    retry = RetryPolicy(settings.get('max_retries', 0), settings.get('backoff_base', 1.0),
+                        settings.get('backoff_cap', 30.0))
+    return Engine(client, concurrency=concurrency, limiter=limiter, retry=retry,
+                  deadline=settings.get('deadline'), telemetry=telemetry)
@@ -0,0 +1,161 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from command_runner import CommandRunner
+from inventory import count_hosts
+
+SSH_ERROR = 255
+
+HostResult = namedtuple('HostResult', 'host exit_code duration capture')
+
+
+def describe_exit(exit_code):
+    if exit_code is None:
+        return "skipped"
+    if exit_code == SSH_ERROR:
+        return "ssh error (exit 255)"
+    return f"exit {exit_code}"
+
+
+class HostCapture:
+    # Spool for one host's output: the first `limit` bytes plus a hash of all
+    # of it, which is enough to group hosts whose output is identical
+    spooled = False
+    path = None
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.data = bytearray()
+        self.hash = hashlib.blake2b(digest_size=16)
+        self.size = 0
+
+    def write(self, data):
+        self.hash.update(data)
+        if len(self.data) < self.limit:
+            self.data += data[:self.limit - len(self.data)]
+        self.size += len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FanoutRunner:
+    # Runs one command on a list of hosts through a transport (SshPool, or
+    # StubTransport in tests), at most max_parallel hosts at a time. A
+    # progress line is written as each host finishes; at the end hosts with
+    # byte-identical output and the same exit code are reported as one group.
+    # Same interface as CommandRunner, so the scheduler runs it as one job.
+    def __init__(self, command, on_output, on_error, timeout=None, cwd=None, spool=None,
+                 hosts=(), transport=None, max_parallel=16, capture_limit=256 * 1024):
+        self.command = command
+        self.on_output = on_output
+        self.on_error = on_error
+        self.timeout = timeout
+        self.spool = spool
+        self.hosts = list(hosts)
+        self.transport = transport
+        self.max_parallel = max(1, max_parallel)
+        self.capture_limit = capture_limit
+        self.results = {}
+        self.runners = {}
+        self.finished = 0
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+        self.rusage = None
+        self.peak_rss = None
+
+    def write(self, text, data=None):
+        # `data` is raw host output for the pane; the digest gets text only
+        with self.lock:
+            if self.spool is not None:
+                self.spool.write(text.encode('utf-8') if data is None else data)
+                self.spool.flush()
+        self.on_output(text.rstrip('\n'))
+
+    def cancel(self, reason="cancelled by user"):
+        self.cancel_event.set()
+        with self.lock:
+            runners = list(self.runners.values())
+        for runner in runners:
+            runner.cancel(reason)
+
+    def run_host(self, host):
+        if self.cancel_event.is_set():
+            return
+        capture = HostCapture(self.capture_limit)
+        runner = CommandRunner(self.transport.command_argv(host, self.command),
+                               lambda text: None, lambda text: None, display_limit=0,
+                               tail_lines=1, timeout=self.timeout, spool=capture)
+        with self.lock:
+            self.runners[host.name] = runner
+        if self.cancel_event.is_set():
+            runner.cancel()
+        clock = time.monotonic()
+        try:
+            exit_code = runner.run()
+        except OSError as e:
+            exit_code = SSH_ERROR
+            capture.write(f"{e}\n".encode('utf-8'))
+        duration = time.monotonic() - clock
+        with self.lock:
+            del self.runners[host.name]
+            self.results[host.name] = HostResult(host, exit_code, duration, capture)
+            self.finished += 1
+            progress = f"[{self.finished}/{len(self.hosts)}]"
+        self.write(f"\x1b[2m{progress} {host.name}: {describe_exit(exit_code)} · {duration:.2f}s\x1b[0m\n")
+
+    def groups(self):
+        # [(exit code, [HostResult])], largest group first, hosts in inventory order
+        groups = {}
+        for host in self.hosts:
+            result = self.results.get(host.name)
+            if result is not None:
+                key = (result.exit_code, result.capture.hash.digest())
+                groups.setdefault(key, []).append(result)
+        return sorted(((key[0], results) for key, results in groups.items()),
+                      key=lambda group: -len(group[1]))
+
+    def report(self):
+        groups = self.groups()
+        for exit_code, results in groups:
+            names = ', '.join(result.host.name for result in results)
+            self.write(f"\n\x1b[1m== {count_hosts(len(results))}: {names} · "
+                       f"{describe_exit(exit_code)} ==\x1b[0m\n")
+            capture = results[0].capture
+            if capture.data:
+                text = capture.data.decode('utf-8', errors='replace')
+                self.write(text, bytes(capture.data) if capture.data.endswith(b'\n')
+                           else bytes(capture.data) + b'\n')
+            if capture.size > len(capture.data):
+                self.write(f"[{capture.size - len(capture.data)} more bytes not shown]\n")
+        succeeded = sum(1 for result in self.results.values() if result.exit_code == 0)
+        skipped = len(self.hosts) - len(self.results)
+        summary = f"\n{succeeded}/{len(self.hosts)} hosts succeeded, {len(groups)} distinct outputs"
+        if skipped:
+            summary += f", {skipped} skipped"
+        self.write(summary + "\n")
+
+    def run(self):
+        self.write(f"\x1b[2mRunning on {count_hosts(len(self.hosts))}, "
+                   f"at most {self.max_parallel} at a time\x1b[0m\n")
+        workers = min(self.max_parallel, len(self.hosts)) or 1
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='linuxai-ssh') as executor:
+            for future in [executor.submit(self.run_host, host) for host in self.hosts]:
+                future.result()
+        self.report()
+        if self.cancel_event.is_set():
+            self.on_error("[stopped: cancelled]")
+        # Success only if every host succeeded; otherwise the first failure's code
+        for host in self.hosts:
+            result = self.results.get(host.name)
+            if result is None:
+                return 1
+            if result.exit_code != 0:
+                return result.exit_code
+        return 0
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+from paths import config_dir
+
+HistoryEntry = namedtuple('HistoryEntry', ['id', 'command', 'exit_code', 'state',
+                                           'duration', 'cwd', 'started'])
+
+ENTRY_COLUMNS = 'id, command, exit_code, state, duration, cwd, started'
+MAX_ID = 2 ** 63 - 1
+
+
+def fts_query(text):
+    # Every word must match; the last one is a prefix so results follow typing.
+    # Words are quoted, so FTS5 operators and punctuation are taken literally.
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if not terms:
+        return None
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class HistoryStore:
+    # Every executed command with its exit code, duration, working directory,
+    # start time and a truncated output digest. Command and output are
+    # indexed with FTS5 and pages are fetched by id (newest first), so search
+    # and scrolling cost the same at 100 or 100k entries.
+    def __init__(self, path=None, max_output_chars=2000, max_entries=200000):
+        self.path = path or os.path.join(config_dir(), 'history.sqlite3')
+        self.max_output_chars = max_output_chars
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY,
+                command TEXT NOT NULL,
+                exit_code INTEGER,
+                state TEXT NOT NULL,
+                duration REAL,
+                cwd TEXT,
+                started REAL NOT NULL,
+                output TEXT NOT NULL DEFAULT ''
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                command, output, content='history', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS history_insert AFTER INSERT ON history BEGIN
+                INSERT INTO history_fts (rowid, command, output)
+                VALUES (new.id, new.command, new.output);
+            END;
+            CREATE TRIGGER IF NOT EXISTS history_delete AFTER DELETE ON history BEGIN
+                INSERT INTO history_fts (history_fts, rowid, command, output)
+                VALUES ('delete', old.id, old.command, old.output);
+            END;
+        """)
+        self.db.commit()
+
+    def record(self, command, exit_code, state, duration, cwd, started, output=''):
+        if len(output) > self.max_output_chars:
+            half = self.max_output_chars // 2
+            output = f"{output[:half]}\n[...]\n{output[-half:]}"
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO history (command, exit_code, state, duration, cwd, started, output) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (command, exit_code, state, duration, cwd, started, output)
+            )
+            entry_id = cursor.lastrowid
+            if entry_id > self.max_entries:
+                self.db.execute("DELETE FROM history WHERE id <= ?",
+                                (entry_id - self.max_entries,))
+            self.db.commit()
+        return entry_id
+
+    def search(self, text='', before=None, limit=50):
+        # Returns up to limit entries older than id `before`, newest first.
+        # Pass the last id of a page as `before` to fetch the next one.
+        query = fts_query(text)
+        before = MAX_ID if before is None else before
+        with self.lock:
+            if query is None:
+                rows = self.db.execute(
+                    f"SELECT {ENTRY_COLUMNS} FROM history WHERE id < ? "
+                    "ORDER BY id DESC LIMIT ?",
+                    (before, limit)
+                ).fetchall()
+            else:
+                rows = self.db.execute(
+                    f"SELECT {ENTRY_COLUMNS} FROM history WHERE id IN ("
+                    "SELECT rowid FROM history_fts WHERE history_fts MATCH ? AND rowid < ? "
+                    "ORDER BY rowid DESC LIMIT ?) ORDER BY id DESC",
+                    (query, before, limit)
+                ).fetchall()
+        return [HistoryEntry(*row) for row in rows]
+
+    def output(self, entry_id):
+        with self.lock:
+            row = self.db.execute("SELECT output FROM history WHERE id = ?",
+                                  (entry_id,)).fetchone()
+        return row[0] if row else ''
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM history")
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,122 @@
+import os
+from collections import namedtuple
+
+from paths import config_dir
+
+LOCAL = 'local'
+
+Host = namedtuple('Host', 'name address user port options')
+
+# Ansible's names are accepted too, so an existing INI inventory works as is
+HOST_KEYS = {
+    'host': 'address', 'ansible_host': 'address',
+    'user': 'user', 'ansible_user': 'user',
+    'port': 'port', 'ansible_port': 'port',
+}
+
+
+class InventoryError(ValueError):
+    pass
+
+
+def count_hosts(count):
+    return f"{count} host" if count == 1 else f"{count} hosts"
+
+
+class Inventory:
+    # Hosts and host groups from an INI-style file:
+    #
+    #   web1 host=10.0.0.11 user=deploy
+    #   [web]
+    #   web1
+    #   web2 host=10.0.0.12 port=2222
+    #
+    # Hosts listed before any section are ungrouped. Other key=value pairs
+    # are passed to ssh as -o options. Every host is also in the group "all".
+    def __init__(self, hosts=None, groups=None):
+        self.hosts = dict(hosts or {})
+        self.groups = dict(groups or {})
+
+    def __bool__(self):
+        return bool(self.hosts)
+
+    def targets(self):
+        # (target, label) pairs for a selector, local first
+        targets = [(LOCAL, "local")]
+        targets.extend((f"@{name}", f"@{name} ({count_hosts(len(members))})")
+                       for name, members in sorted(self.groups.items()))
+        if self.hosts:
+            targets.append(("@all", f"@all ({count_hosts(len(self.hosts))})"))
+        targets.extend((name, name) for name in sorted(self.hosts))
+        return targets
+
+    def resolve(self, target):
+        # A host name, @group or @all; local is not a remote target
+        if target.startswith('@'):
+            name = target[1:]
+            if name == 'all':
+                return list(self.hosts.values())
+            if name not in self.groups:
+                raise InventoryError(f"unknown host group: {name}")
+            return [self.hosts[member] for member in self.groups[name]]
+        if target not in self.hosts:
+            raise InventoryError(f"unknown host: {target}")
+        return [self.hosts[target]]
+
+
+def parse_host(fields, line_number):
+    name, *pairs = fields
+    values = {'address': name, 'user': None, 'port': None}
+    options = []
+    for pair in pairs:
+        key, separator, value = pair.partition('=')
+        if not separator:
+            raise InventoryError(f"line {line_number}: expected key=value, got {pair!r}")
+        if key in HOST_KEYS:
+            values[HOST_KEYS[key]] = value
+        else:
+            options.append(f"{key}={value}")
+    if values['address'].startswith('-'):
+        raise InventoryError(f"line {line_number}: bad host {values['address']!r}")
+    if values['port'] is not None:
+        try:
+            values['port'] = int(values['port'])
+        except ValueError:
+            raise InventoryError(f"line {line_number}: bad port {values['port']!r}")
+    return Host(name, values['address'], values['user'], values['port'], tuple(options))
+
+
+def parse_inventory(text):
+    hosts = {}
+    groups = {}
+    group = None
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.split('#', 1)[0].split(';', 1)[0].strip()
+        if not line:
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            group = line[1:-1].strip()
+            if group == 'all':
+                raise InventoryError(f"line {line_number}: 'all' is reserved")
+            groups.setdefault(group, [])
+            continue
+        host = parse_host(line.split(), line_number)
+        known = hosts.get(host.name)
+        if known is None or len(line.split()) > 1:
+            hosts[host.name] = host
+        if group is not None and host.name not in groups[group]:
+            groups[group].append(host.name)
+    return Inventory(hosts, groups)
+
+
+def inventory_path(config):
+    path = os.path.expanduser(config['ssh'].get('inventory') or 'inventory')
+    return os.path.join(config_dir(), path)
+
+
+def load_inventory(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return parse_inventory(f.read())
+    except FileNotFoundError:
+        return Inventory()
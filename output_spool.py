@@ -0,0 +1,170 @@
+import mmap
+import os
+import tempfile
+
+SEARCH_CHUNK = 16 * 1024 * 1024
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size} B" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+class OutputSpool:
+    # Append-only temp file with the raw output of one command run. The runner
+    # writes it from its worker thread and flushes once per batch; viewers read
+    # the same file through a MappedOutput.
+    spooled = True
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix='linuxai-output-', suffix='.log')
+        self.file = os.fdopen(fd, 'wb')
+        self.size = 0
+        self.lines = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+        self.lines += data.count(b'\n')
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        # Safe while the runner is still writing: the open descriptor keeps
+        # the unlinked file alive until close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class MappedOutput:
+    # Read-only mmap view of an output file that may still be growing.
+    # Everything is addressed by byte offset and scanned with mmap's own
+    # find/rfind, so opening a file costs the same whatever its size.
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = None
+        self.size = 0
+        self.refresh()
+
+    def refresh(self):
+        # Remaps when the file has grown; returns whether it did
+        size = os.fstat(self.file.fileno()).st_size
+        if size == self.size:
+            return False
+        if self.map is not None:
+            self.map.close()
+        self.map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ) if size else None
+        self.size = size
+        return True
+
+    def line_start(self, offset):
+        if offset <= 0 or self.map is None:
+            return 0
+        offset = min(offset, self.size)
+        return self.map.rfind(b'\n', 0, offset) + 1
+
+    def next_line(self, offset):
+        if self.map is None:
+            return 0
+        end = self.map.find(b'\n', offset)
+        return self.size if end < 0 else end + 1
+
+    def forward(self, offset, count):
+        offset = self.line_start(offset)
+        for _ in range(count):
+            following = self.next_line(offset)
+            if following >= self.size:
+                break
+            offset = following
+        return offset
+
+    def backward(self, offset, count):
+        offset = self.line_start(offset)
+        for _ in range(count):
+            if offset == 0:
+                break
+            offset = self.line_start(offset - 1)
+        return offset
+
+    def last_page(self, count):
+        # Start of the last `count` lines; a trailing newline does not count
+        # as an extra empty line
+        if self.map is None:
+            return 0
+        end = self.size - 1 if self.map[self.size - 1] == 10 else self.size
+        return self.backward(end, count - 1)
+
+    def read_lines(self, offset, count, max_line=4096):
+        # [(start offset, line bytes)] for up to `count` lines from the line
+        # containing `offset`; lines longer than max_line are cut short
+        lines = []
+        if self.map is None:
+            return lines
+        start = self.line_start(offset)
+        while len(lines) < count and start < self.size:
+            end = self.map.find(b'\n', start)
+            following = self.size if end < 0 else end + 1
+            end = following if end < 0 else end
+            lines.append((start, self.map[start:min(end, start + max_line)]))
+            start = following
+        return lines
+
+    def search(self, text, start, backwards=False, chunk=SEARCH_CHUNK):
+        # Generator stepping through the file SEARCH_CHUNK bytes at a time and
+        # wrapping around at either end. It yields None after each chunk and
+        # finally (match start, match end), or stops when there is no match.
+        # Smart case: the search is case-sensitive only if `text` has an
+        # uppercase letter. Case-sensitive searches run mmap.find on the
+        # mapping itself; the others lowercase one chunk at a time (ASCII
+        # only), which is several times faster than an IGNORECASE regex.
+        if self.map is None or not text:
+            return
+        needle = text.encode('utf-8')
+        ignore_case = text == text.lower()
+        overlap = len(needle) - 1
+        size = self.size
+        start = max(0, min(start, size))
+
+        def find(low, high, reverse):
+            if not ignore_case:
+                return (self.map.rfind if reverse else self.map.find)(needle, low, high)
+            data = self.map[low:high].lower()
+            index = data.rfind(needle) if reverse else data.find(needle)
+            return index if index < 0 else low + index
+
+        if backwards:
+            segments = [(0, start), (start, size)]
+        else:
+            segments = [(start, size), (0, min(size, start + overlap))]
+        for low, high in segments:
+            position = high if backwards else low
+            while low < position if backwards else position < high:
+                if backwards:
+                    window = max(low, position - chunk)
+                    # A match found here starts before `position`
+                    found = find(window, min(high, position + overlap), True)
+                    position = window
+                else:
+                    found = find(position, min(high, position + chunk + overlap), False)
+                    position += chunk
+                if found >= 0:
+                    yield found, found + len(needle)
+                    return
+                yield None
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
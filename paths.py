@@ -0,0 +1,10 @@
+import os
+
+APP_NAME = 'linuxai'
+
+
+def config_dir():
+    base = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+    path = os.path.join(base, APP_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
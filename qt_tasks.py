@@ -0,0 +1,109 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from ai_client import DEFAULT_MODEL
+from command_scheduler import CommandJob
+from inventory import LOCAL
+
+
+class AIRequest(QObject):
+    response_ready = pyqtSignal(object)
+    chunk_ready = pyqtSignal(str)
+    commands_ready = pyqtSignal(object)
+    retrying = pyqtSignal(int, float, str)
+    error_occurred = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, engine, message, model_name=DEFAULT_MODEL, stream=False,
+                 cache_prompt=None):
+        super().__init__()
+        self.engine = engine
+        self.message = message
+        self.model_name = model_name
+        self.stream = stream
+        self.cache_prompt = cache_prompt
+        self.future = None
+
+    def start(self):
+        self.future = self.engine.submit(self.run())
+
+    async def run(self):
+        # Runs on the engine loop, so every signal, chunks included, is
+        # queued onto the GUI thread in the order it was emitted
+        try:
+            result = await self.engine.ask(
+                self.message,
+                model_name=self.model_name,
+                stream=self.stream,
+                on_chunk=self.chunk_ready.emit,
+                on_commands=self.commands_ready.emit,
+                on_retry=lambda attempt, delay, error: self.retrying.emit(attempt, delay, str(error)),
+                cache_prompt=self.cache_prompt
+            )
+            self.response_ready.emit(result)
+        except Exception as e:
+            self.error_occurred.emit(str(e))
+        finally:
+            self.finished.emit()
+
+
+class CommandExecution(QObject):
+    # Bridges a scheduler CommandJob to the GUI thread: the job's callbacks
+    # fire on pool threads, the signals are delivered as queued events.
+    output_ready = pyqtSignal(str)
+    error_occurred = pyqtSignal(str)
+    state_changed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, command, timeout=None, target=LOCAL, runner_factory=None, cwd=None,
+                 spool=None):
+        super().__init__()
+        self.target = target
+        self.job = CommandJob(
+            command,
+            timeout=timeout,
+            cwd=cwd if target == LOCAL else f"ssh:{target}",
+            runner_factory=runner_factory,
+            on_output=self.output_ready.emit,
+            on_error=self.error_occurred.emit,
+            on_state=self.state_changed.emit,
+            spool=spool
+        )
+        self.job.add_done_callback(lambda job: self.finished.emit())
+
+    @property
+    def command(self):
+        return self.job.command
+
+    @property
+    def exit_code(self):
+        return self.job.exit_code
+
+
+class CommandCheck(QObject):
+    # Delivers CommandAnalyzer results to the GUI thread. request() answers
+    # at once from the cache, otherwise `checked` fires when the pool is done.
+    # refresh() rescans PATH off the GUI thread; `paths_changed` fires when
+    # programs were installed or removed, and the cards should ask again.
+    checked = pyqtSignal(object)
+    paths_changed = pyqtSignal()
+
+    def __init__(self, analyzer):
+        super().__init__()
+        self.analyzer = analyzer
+
+    def request(self, command):
+        analysis = self.analyzer.cached(command)
+        if analysis is None:
+            self.analyzer.submit(command).add_done_callback(self.deliver)
+        return analysis
+
+    def deliver(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.checked.emit(self.analyzer.current(future.result()))
+
+    def refresh(self):
+        self.analyzer.refresh().add_done_callback(self.refreshed)
+
+    def refreshed(self, future):
+        if not future.cancelled() and future.exception() is None and future.result():
+            self.paths_changed.emit()
@@ -0,0 +1,134 @@
+import asyncio
+import random
+import re
+import threading
+import time
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# google.api_core exception names, so the SDK never has to be imported here
+RETRYABLE_NAMES = {'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable',
+                   'InternalServerError', 'BadGateway', 'GatewayTimeout', 'DeadlineExceeded'}
+RETRY_IN_RE = re.compile(r'retry in (\d+(?:\.\d+)?)\s*s', re.IGNORECASE)
+RETRY_DELAY_RE = re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)')
+
+
+class RequestTimedOut(Exception):
+    pass
+
+
+class RequestAborted(Exception):
+    pass
+
+
+def status_code(error):
+    code = getattr(error, 'code', None)
+    if callable(code):
+        code = code()
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error):
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if status_code(error) in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_NAMES
+
+
+def retry_after(error):
+    # Server-suggested wait in seconds: a Retry-After header, a gRPC
+    # RetryInfo detail, or the "Please retry in 7.5s" hint in the message
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        value = headers.get('retry-after') or headers.get('Retry-After')
+        if value is not None:
+            return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    for detail in getattr(error, 'details', None) or []:
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    for pattern in (RETRY_IN_RE, RETRY_DELAY_RE):
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class RetryPolicy:
+    # Exponential backoff with full jitter, never shorter than what the
+    # server asked for
+    def __init__(self, max_retries=4, base=1.0, cap=30.0):
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt, server_delay=None):
+        delay = random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+        if server_delay is not None:
+            delay = max(delay, server_delay)
+        return delay
+
+
+class TokenBucket:
+    # Holds up to `burst` requests and refills at `rate` per second. Callers
+    # reserve a token and sleep until it is theirs, so waiting requests are
+    # served in arrival order. Only used from the engine's event loop.
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def reserve(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.paused_until - now)
+
+    def pause(self, seconds):
+        # A 429 with Retry-After applies to the whole key, not one request
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, timeout=None):
+        wait = self.reserve()
+        if timeout is not None and wait > timeout:
+            self.tokens += 1
+            raise RequestTimedOut(f"rate limit wait of {wait:.1f}s exceeds the request deadline")
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class SharedCall:
+    # One upstream request and every caller waiting on it. Streamed chunks
+    # are replayed to callers that join late, then delivered live.
+    def __init__(self, prompt):
+        self.prompt = prompt
+        self.chunks = []
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.aborted = False
+        self.task = None
+        self.cache_hit = None
+        self.retries = 0
+        self.usage = {}
+
+    def add_listener(self, on_chunk):
+        with self.lock:
+            for text in self.chunks:
+                on_chunk(text)
+            self.listeners.append(on_chunk)
+
+    def emit(self, text):
+        # Called on a pool thread; raising stops an abandoned stream
+        if self.aborted:
+            raise RequestAborted("request abandoned")
+        with self.lock:
+            self.chunks.append(text)
+            for on_chunk in self.listeners:
+                on_chunk(text)
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from paths import config_dir
+
+
+def normalize_prompt(text):
+    # Whitespace only: case and punctuation change what a shell question
+    # means (ls -R vs ls -r, tar -C vs tar -c)
+    return re.sub(r'\s+', ' ', text.strip())
+
+
+class ResponseCache:
+    # SQLite-backed cache of model answers keyed on the model name and the
+    # normalized conversation. Entries expire after ttl seconds and the least
+    # recently used ones are evicted beyond max_entries.
+    def __init__(self, path=None, ttl=7 * 24 * 60 * 60, max_entries=2000):
+        self.path = path or os.path.join(config_dir(), 'response_cache.sqlite3')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.db.commit()
+
+    @staticmethod
+    def make_key(model_name, prompt):
+        if isinstance(prompt, str):
+            normalized = normalize_prompt(prompt)
+        else:
+            normalized = [(turn['role'], [normalize_prompt(part) for part in turn['parts']])
+                          for turn in prompt]
+        payload = json.dumps([model_name, normalized], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.db.commit()
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model_name, response):
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, response, now, now)
+            )
+            count = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self.db.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self.db.commit()
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,278 @@
+import errno
+import fcntl
+import os
+import pty
+import re
+import secrets
+import select
+import signal
+import struct
+import termios
+import threading
+import time
+
+from command_runner import CommandRunner, POLL_INTERVAL
+
+# Longest tail of the stream that may hold a partial end marker ($PWD included)
+MARKER_MAX = 4200
+INTERRUPTED = 130
+
+
+class ShellSessionError(RuntimeError):
+    pass
+
+
+def ansi_c_quote(text):
+    # $'...' survives any text, including quotes, newlines and control bytes
+    escaped = []
+    for char in text:
+        if char == '\\':
+            escaped.append('\\\\')
+        elif char == "'":
+            escaped.append("\\'")
+        elif char == '\n':
+            escaped.append('\\n')
+        elif char < ' ' or char == '\x7f':
+            escaped.append('\\x%02x' % ord(char))
+        else:
+            escaped.append(char)
+    return "$'" + ''.join(escaped) + "'"
+
+
+class ShellSession:
+    # One long-lived interactive bash on a pty, so cd, export, aliases,
+    # functions and an activated virtualenv carry over from one command to
+    # the next as in a terminal. A command is sent as one input line that
+    # evals it between two markers; the output is whatever the pty prints
+    # between them, and the end marker carries $? and $PWD. The markers
+    # contain a random token, so command output cannot fake them. One
+    # command runs at a time; callers hold `lock` while they use the shell.
+    def __init__(self, program='bash', cwd=None, columns=200, rows=50):
+        self.program = program
+        self.cwd = cwd or os.getcwd()
+        self.columns = columns
+        self.rows = rows
+        self.token = secrets.token_hex(8).encode('ascii')
+        self.seq = 0
+        self.pid = None
+        self.fd = None
+        self.commands = 0
+        self.retired = False
+        self.lock = threading.Lock()
+
+    @property
+    def alive(self):
+        return self.pid is not None
+
+    def start_marker(self, seq):
+        return b'\x1e' + self.token + b'S%d\x1e' % seq
+
+    def end_pattern(self, seq):
+        return re.compile(b'\x1e' + self.token + b'E%d (-?\\d+) ([^\x1e]*)\x1e' % seq)
+
+    def print_marker(self, kind, seq, status=None):
+        # printf command for a marker; `status` is the shell word for the exit
+        # status of an end marker. \036 stays escaped in the echo of the input
+        # line, so only the printed marker contains the 0x1e bytes.
+        head = f"\\036{self.token.decode()}{kind}{seq}"
+        if status is None:
+            return f"printf '{head}\\036'"
+        return f"printf '{head} %s %s\\036' {status} \"$PWD\""
+
+    def start(self, timeout=10.0):
+        env = dict(os.environ, PS1='', PS2='', PS0='', PROMPT_COMMAND='',
+                   TERM=os.environ.get('TERM') or 'xterm-256color',
+                   PAGER='cat', GIT_PAGER='cat', SYSTEMD_PAGER='', MANPAGER='cat')
+        env.pop('HISTFILE', None)
+        pid, fd = pty.fork()
+        if pid == 0:
+            try:
+                os.chdir(self.cwd)
+                os.execvpe(self.program, [self.program, '--noprofile', '--norc',
+                                          '--noediting', '-i'], env)
+            finally:
+                os._exit(127)
+        self.pid, self.fd = pid, fd
+        # No echo of the input lines and no \r\n translation of the output
+        attributes = termios.tcgetattr(fd)
+        attributes[1] &= ~termios.ONLCR
+        attributes[3] &= ~(termios.ECHO | termios.ECHONL)
+        termios.tcsetattr(fd, termios.TCSANOW, attributes)
+        fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack('HHHH', self.rows, self.columns, 0, 0))
+        self.seq += 1
+        seq = self.seq
+        self.write(f"set +H; unset HISTFILE; set +o history; "
+                   f"{self.print_marker('E', seq, '0')}\n")
+        pattern = self.end_pattern(seq)
+        deadline = time.monotonic() + timeout
+        buffer = b''
+        while not pattern.search(buffer):
+            data = self.read(max(0.0, deadline - time.monotonic()))
+            if data is None or time.monotonic() >= deadline:
+                self.close()
+                raise ShellSessionError(f"{self.program} did not start")
+            buffer += data
+
+    def ensure_started(self):
+        if self.pid is None:
+            self.start()
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        while data:
+            written = os.write(self.fd, data)
+            data = data[written:]
+
+    def read(self, timeout):
+        # b'' when nothing arrived in time, None once the shell has exited
+        try:
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+            if not ready:
+                return b''
+            return os.read(self.fd, 65536) or None
+        except OSError as e:
+            if e.errno in (errno.EIO, errno.EBADF):
+                return None
+            raise
+
+    def send(self, command):
+        # Returns the sequence number that frames this command's output
+        self.seq += 1
+        self.commands += 1
+        seq = self.seq
+        self.write(f"{self.print_marker('S', seq)}; eval {ansi_c_quote(command)}; "
+                   f"{self.print_marker('E', seq, '$?')}\n")
+        return seq
+
+    def interrupt(self, seq):
+        # ^C reaches the foreground job through the pty. If it was a shell
+        # builtin, bash drops the rest of the line, end marker included, so
+        # a spare one is queued; a late duplicate is ignored by its reader.
+        os.write(self.fd, b'\x03')
+        self.write(self.print_marker('E', seq, str(INTERRUPTED)) + '\n')
+
+    def retire(self):
+        # Closes the shell now, or after the command that is using it
+        self.retired = True
+        if self.lock.acquire(blocking=False):
+            try:
+                self.close()
+            finally:
+                self.lock.release()
+
+    def close(self):
+        # Kills the shell and its jobs; returns bash's exit status if known
+        if self.pid is None:
+            return None
+        try:
+            foreground = os.tcgetpgrp(self.fd)
+            if foreground > 0 and foreground not in (self.pid, os.getpgrp()):
+                os.killpg(foreground, signal.SIGKILL)
+        except OSError:
+            pass
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        status = None
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        try:
+            status = os.waitstatus_to_exitcode(os.waitpid(self.pid, 0)[1])
+        except ChildProcessError:
+            pass
+        self.pid = self.fd = None
+        return status
+
+
+class SessionRunner(CommandRunner):
+    # CommandRunner that runs the command in a ShellSession instead of a new
+    # shell. stdout and stderr arrive merged, as on a terminal. A command
+    # that ignores ^C for grace_period gets the session killed; the next
+    # command starts a fresh shell.
+    def __init__(self, command, on_output, on_error, session=None, **options):
+        super().__init__(command, on_output, on_error, **options)
+        self.session = session
+
+    def run(self):
+        # Cancelled while another command holds the session: nothing ran, so
+        # there is no exit status, but the spool is closed all the same
+        session = self.session
+        returncode = None
+        try:
+            if self.acquire(session):
+                try:
+                    if not session.alive:
+                        session.cwd = self.cwd or session.cwd
+                    session.ensure_started()
+                    returncode = self.run_in_session(session)
+                    if session.retired:
+                        session.close()
+                finally:
+                    session.lock.release()
+        finally:
+            self.spool.close()
+        self.flush()
+        self.flush_tail()
+        if self.stop_reason:
+            status = "not started" if returncode is None else f"exit status {returncode}"
+            self.callbacks['stderr'](f"[stopped: {self.stop_reason}, {status}]")
+        return returncode
+
+    def acquire(self, session):
+        while not session.lock.acquire(timeout=POLL_INTERVAL):
+            if self.cancel_event.is_set():
+                return False
+        return True
+
+    def run_in_session(self, session):
+        seq = session.send(self.command)
+        start_marker = session.start_marker(seq)
+        end_pattern = session.end_pattern(seq)
+        started = last_flush = time.monotonic()
+        kill_at = None
+        buffer = b''
+        begun = False
+        while True:
+            now = time.monotonic()
+            if self.timeout and now - started >= self.timeout:
+                self.cancel(f"timed out after {self.timeout:g}s")
+            if self.cancel_event.is_set() and kill_at is None:
+                session.interrupt(seq)
+                kill_at = now + self.grace_period
+            elif kill_at is not None and now >= kill_at:
+                session.close()
+                self.callbacks['stderr']("[shell session killed; the next command starts a new one]")
+                self.feed('stdout', buffer if begun else b'', final=True)
+                return -signal.SIGKILL
+            data = session.read(min(POLL_INTERVAL, self.flush_interval))
+            if data is None:
+                # The command exited the shell itself (exit, exec, set -e)
+                status = session.close()
+                self.feed('stdout', buffer if begun else b'', final=True)
+                return status
+            buffer += data
+            if not begun:
+                index = buffer.find(start_marker)
+                if index < 0:
+                    buffer = buffer[-len(start_marker):]
+                    continue
+                buffer = buffer[index + len(start_marker):]
+                begun = True
+            match = end_pattern.search(buffer)
+            if match is not None:
+                self.feed('stdout', buffer[:match.start()], final=True)
+                session.cwd = match.group(2).decode('utf-8', errors='replace')
+                return int(match.group(1))
+            # Hold back anything that could be the beginning of the end marker
+            keep = buffer.rfind(b'\x1e', max(0, len(buffer) - MARKER_MAX))
+            if keep < 0:
+                keep = len(buffer)
+            if keep:
+                self.feed('stdout', buffer[:keep])
+                buffer = buffer[keep:]
+            if time.monotonic() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.monotonic()
@@ -0,0 +1,109 @@
+import os
+import shlex
+import subprocess
+import tempfile
+import threading
+
+
+def control_dir():
+    # Private directory for the control sockets. Unix socket paths are
+    # limited to ~100 bytes, so the sockets are named by ssh's %C hash.
+    base = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    path = os.path.join(base, f'linuxai-ssh-{os.getuid()}')
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+class SshPool:
+    # Persistent connections through OpenSSH multiplexing. The first command
+    # to a host starts a ControlMaster that stays up for control_persist
+    # seconds after its last session; later commands open a session on it
+    # and skip the TCP connect, key exchange and authentication. BatchMode
+    # makes a host that would prompt for a password fail instead of hang.
+    def __init__(self, connect_timeout=10, control_persist=600, options=(), ssh='ssh',
+                 multiplex=True):
+        self.ssh = ssh
+        self.multiplex = multiplex
+        self.connect_timeout = connect_timeout
+        self.control_persist = control_persist
+        self.options = list(options)
+        self.control_path = os.path.join(control_dir(), '%C')
+        self.used = {}
+        self.lock = threading.Lock()
+
+    def base_argv(self, host):
+        argv = [self.ssh]
+        if self.multiplex:
+            argv += ['-o', 'ControlMaster=auto',
+                     '-o', f'ControlPath={self.control_path}',
+                     '-o', f'ControlPersist={self.control_persist}']
+        else:
+            argv += ['-o', 'ControlMaster=no', '-o', 'ControlPath=none']
+        argv += ['-o', 'BatchMode=yes', '-o', f'ConnectTimeout={self.connect_timeout}']
+        for option in self.options + list(host.options):
+            argv += ['-o', option]
+        if host.user:
+            argv += ['-l', host.user]
+        if host.port:
+            argv += ['-p', str(host.port)]
+        return argv
+
+    def command_argv(self, host, command):
+        with self.lock:
+            self.used[host.name] = host
+        # -n: never let ssh read the GUI's stdin
+        return self.base_argv(host) + ['-n', host.address, command]
+
+    def is_connected(self, host):
+        result = subprocess.run(self.base_argv(host) + ['-O', 'check', host.address],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return result.returncode == 0
+
+    def close(self):
+        # Stops the masters this pool started or reused
+        with self.lock:
+            hosts = list(self.used.values())
+            self.used.clear()
+        for host in hosts:
+            try:
+                subprocess.run(self.base_argv(host) + ['-O', 'exit', host.address],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+
+
+class StubTransport:
+    # Stands in for SshPool in tests and benchmarks: the "remote" command runs
+    # locally under sh with LINUXAI_HOST set to the host name. The first
+    # command to each host sleeps connect_delay seconds, like a fresh SSH
+    # handshake; later ones reuse the "connection".
+    def __init__(self, connect_delay=0.0, shell='sh'):
+        self.connect_delay = connect_delay
+        self.shell = shell
+        self.connected = set()
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    def command_argv(self, host, command):
+        script = f"LINUXAI_HOST={shlex.quote(host.name)}; export LINUXAI_HOST; {command}"
+        with self.lock:
+            if host.name not in self.connected:
+                self.connected.add(host.name)
+                self.connections += 1
+                if self.connect_delay:
+                    script = f"sleep {self.connect_delay}; {script}"
+        return [self.shell, '-c', script]
+
+    def is_connected(self, host):
+        return host.name in self.connected
+
+    def close(self):
+        with self.lock:
+            self.connected.clear()
+
+
+def transport_from_config(config):
+    settings = config['ssh']
+    return SshPool(connect_timeout=settings.get('connect_timeout', 10),
+                   control_persist=settings.get('control_persist', 600),
+                   options=settings.get('options') or ())
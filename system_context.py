@@ -0,0 +1,179 @@
+import getpass
+import grp
+import hashlib
+import json
+import os
+import platform
+import shutil
+import threading
+
+from paths import config_dir
+
+# Bump when the collected fields change, so old snapshots are rebuilt
+VERSION = 1
+OS_RELEASE_PATHS = ('/etc/os-release', '/usr/lib/os-release')
+# First match wins; the order puts native managers before wrappers
+PACKAGE_MANAGERS = ('apt', 'dnf', 'yum', 'zypper', 'pacman', 'apk', 'emerge',
+                    'xbps-install', 'nix-env', 'brew')
+EXTRA_PACKAGE_MANAGERS = ('flatpak', 'snap')
+TOOLS = ('sudo', 'systemctl', 'journalctl', 'ip', 'ss', 'curl', 'wget', 'git', 'python3',
+         'docker', 'podman', 'kubectl', 'ufw', 'firewall-cmd', 'iptables', 'nft')
+SUDO_GROUPS = ('sudo', 'wheel', 'admin')
+
+
+def os_release_path():
+    for path in OS_RELEASE_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def parse_os_release(text):
+    values = {}
+    for line in text.splitlines():
+        key, sep, value = line.strip().partition('=')
+        if sep and not key.startswith('#'):
+            values[key] = value.strip().strip('"\'')
+    return values
+
+
+def fingerprint():
+    # Cheap to compute on every start: a distro upgrade rewrites os-release,
+    # and installing a tool touches a PATH directory
+    release = os_release_path()
+    digest = hashlib.sha1(os.environ.get('PATH', '').encode('utf-8'))
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        try:
+            digest.update(b'%d' % os.stat(directory).st_mtime_ns)
+        except OSError:
+            pass
+    return {
+        'version': VERSION,
+        'os_release': release and os.stat(release).st_mtime_ns,
+        'path': digest.hexdigest(),
+        'shell': os.environ.get('SHELL', ''),
+        'uid': os.getuid(),
+    }
+
+
+def detect_init():
+    if os.path.isdir('/run/systemd/system'):
+        return 'systemd'
+    try:
+        with open('/proc/1/comm') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def sudo_status(user):
+    if os.geteuid() == 0:
+        return 'root'
+    if not shutil.which('sudo'):
+        return 'no sudo'
+    try:
+        groups = {grp.getgrgid(gid).gr_name for gid in os.getgroups()}
+    except (KeyError, OSError):
+        groups = set()
+    member = [name for name in SUDO_GROUPS if name in groups]
+    return f"sudo via {member[0]}" if member else 'sudo installed, not in a sudo group'
+
+
+def collect():
+    release = {}
+    path = os_release_path()
+    if path is not None:
+        try:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                release = parse_os_release(f.read())
+        except OSError:
+            pass
+    try:
+        user = getpass.getuser()
+    except (KeyError, OSError):
+        user = str(os.getuid())
+    managers = [name for name in PACKAGE_MANAGERS if shutil.which(name)]
+    return {
+        'distro': release.get('PRETTY_NAME') or release.get('NAME') or platform.system(),
+        'id': release.get('ID', ''),
+        'id_like': release.get('ID_LIKE', ''),
+        'kernel': platform.release(),
+        'machine': platform.machine(),
+        'package_manager': managers[0] if managers else None,
+        'extra_package_managers': [name for name in EXTRA_PACKAGE_MANAGERS if shutil.which(name)],
+        'init': detect_init(),
+        'shell': os.path.basename(os.environ.get('SHELL', '')) or None,
+        'user': user,
+        'sudo': sudo_status(user),
+        'tools': [name for name in TOOLS if shutil.which(name)],
+    }
+
+
+def format_header(context):
+    # One short paragraph, about 60 tokens. No date or time: the header is
+    # part of the response cache key and must stay the same between runs.
+    parts = [f"{context['distro']} ({context['machine']}, kernel {context['kernel']})"]
+    if context['id_like']:
+        parts[0] += f", based on {context['id_like']}"
+    managers = [context['package_manager']] if context['package_manager'] else []
+    managers += context['extra_package_managers']
+    parts.append(f"package manager: {', '.join(managers) or 'unknown'}")
+    parts.append(f"init: {context['init'] or 'unknown'}")
+    parts.append(f"shell: {context['shell'] or 'unknown'}")
+    parts.append(f"user: {context['user']} ({context['sudo']})")
+    if context['tools']:
+        parts.append(f"tools: {' '.join(context['tools'])}")
+    return ("[System context] " + '; '.join(parts) +
+            ". Give commands for this system.")
+
+
+class SystemContext:
+    # Snapshot of the machine the commands will run on, prepended to prompts
+    # so answers use the right package manager, init system and shell. It is
+    # collected once on a background thread and cached as JSON; the cache is
+    # reused for as long as fingerprint() matches.
+    def __init__(self, path=None, enabled=True):
+        self.path = path or os.path.join(config_dir(), 'system_context.json')
+        self.enabled = enabled
+        self.context = None
+        self.from_cache = False
+        self.ready = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if not self.enabled:
+            self.ready.set()
+            return self
+        self.thread = threading.Thread(target=self.load, name='linuxai-context', daemon=True)
+        self.thread.start()
+        return self
+
+    def load(self):
+        try:
+            current = fingerprint()
+            try:
+                with open(self.path, 'r') as f:
+                    cached = json.load(f)
+                if cached.get('fingerprint') == current:
+                    self.context = cached['context']
+                    self.from_cache = True
+                    return self.context
+            except (OSError, ValueError, KeyError, AttributeError):
+                pass
+            self.context = collect()
+            try:
+                temp = f"{self.path}.tmp"
+                with open(temp, 'w') as f:
+                    json.dump({'fingerprint': current, 'context': self.context}, f, indent=1)
+                os.replace(temp, self.path)
+            except OSError:
+                pass
+            return self.context
+        finally:
+            self.ready.set()
+
+    def header(self, timeout=0.0):
+        # Empty until the snapshot is ready; never blocks the GUI by default
+        if not self.enabled or not self.ready.wait(timeout) or self.context is None:
+            return ''
+        return format_header(self.context)
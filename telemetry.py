@@ -0,0 +1,234 @@
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from paths import config_dir
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+BYTES_BUCKETS = (1 << 20, 4 << 20, 16 << 20, 64 << 20, 256 << 20, 1 << 30, 4 << 30)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8)
+
+METRICS = {
+    'ai_ttfb_seconds': (LATENCY_BUCKETS, "Time to the first streamed chunk of an answer"),
+    'ai_latency_seconds': (LATENCY_BUCKETS, "Time to the complete answer"),
+    'ai_prompt_tokens': (TOKEN_BUCKETS, "Prompt size in tokens"),
+    'ai_response_tokens': (TOKEN_BUCKETS, "Answer size in tokens"),
+    'ai_retries': (COUNT_BUCKETS, "Retries needed per request"),
+    'command_wall_seconds': (LATENCY_BUCKETS, "Command wall-clock time"),
+    'command_cpu_seconds': (LATENCY_BUCKETS, "Command user + system CPU time"),
+    'command_peak_rss_bytes': (BYTES_BUCKETS, "Peak resident set size of a command's processes"),
+}
+COUNTERS = {
+    'ai_requests_total': "Requests answered",
+    'ai_errors_total': "Requests that failed",
+    'ai_coalesced_total': "Requests that shared an identical in-flight call",
+    'cache_hits_total': "Answers served from the response cache",
+    'cache_misses_total': "Answers not found in the response cache",
+    'commands_total': "Commands run",
+    'commands_failed_total': "Commands that exited non-zero or were stopped",
+}
+
+
+def prometheus_number(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Histogram:
+    # Fixed buckets like a Prometheus histogram; quantiles are interpolated
+    # within the bucket they fall into
+    def __init__(self, buckets):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, fraction):
+        if not self.count:
+            return None
+        if self.count == 1:
+            return self.max
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index else 0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                upper = min(upper, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+
+class Telemetry:
+    # Process-wide metrics: histograms and counters, an optional JSONL trace
+    # of every request and command, and an optional Prometheus text endpoint.
+    # Safe to call from any thread.
+    def __init__(self, trace_path=None, max_trace_bytes=10 * 1024 * 1024):
+        self.lock = threading.Lock()
+        self.histograms = {name: Histogram(buckets) for name, (buckets, _) in METRICS.items()}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.trace_path = trace_path
+        self.max_trace_bytes = max_trace_bytes
+        self.trace_file = None
+        self.server = None
+        self.started = time.time()
+
+    def observe(self, name, value):
+        if value is None:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def trace(self, event, **fields):
+        if not self.trace_path:
+            return
+        line = json.dumps(dict(ts=round(time.time(), 3), event=event, **fields),
+                          ensure_ascii=False) + '\n'
+        with self.lock:
+            try:
+                if self.trace_file is None:
+                    self.trace_file = open(self.trace_path, 'a', encoding='utf-8')
+                self.trace_file.write(line)
+                self.trace_file.flush()
+                if self.trace_file.tell() > self.max_trace_bytes:
+                    # Keep one previous file so the trace never grows unbounded
+                    self.trace_file.close()
+                    self.trace_file = None
+                    os.replace(self.trace_path, self.trace_path + '.1')
+            except OSError:
+                self.trace_path = None
+
+    def record_request(self, result=None, error=None, model=None, stream=False, stats=None):
+        stats = stats or {}
+        if error is not None:
+            self.increment('ai_errors_total')
+            self.trace('ai_request', model=model, error=str(error)[:300],
+                       retries=stats.get('retries', 0))
+            return
+        self.increment('ai_requests_total')
+        if stats.get('coalesced'):
+            self.increment('ai_coalesced_total')
+        cache_hit = stats.get('cache_hit')
+        if cache_hit is not None:
+            self.increment('cache_hits_total' if cache_hit else 'cache_misses_total')
+        if stream:
+            self.observe('ai_ttfb_seconds', result.first_chunk)
+        self.observe('ai_latency_seconds', result.latency)
+        self.observe('ai_prompt_tokens', stats.get('prompt_tokens'))
+        self.observe('ai_response_tokens', stats.get('response_tokens'))
+        if not stats.get('coalesced') and not cache_hit:
+            self.observe('ai_retries', stats.get('retries', 0))
+        self.trace('ai_request', model=model, stream=stream,
+                   ttfb=round(result.first_chunk, 4), latency=round(result.latency, 4),
+                   prompt_tokens=stats.get('prompt_tokens'),
+                   response_tokens=stats.get('response_tokens'),
+                   cache_hit=cache_hit, retries=stats.get('retries', 0),
+                   coalesced=bool(stats.get('coalesced')), commands=len(result.commands))
+
+    def record_command(self, job):
+        self.increment('commands_total')
+        if job.state != 'done':
+            self.increment('commands_failed_total')
+        self.observe('command_wall_seconds', job.duration)
+        self.observe('command_cpu_seconds', job.cpu_time)
+        self.observe('command_peak_rss_bytes', job.peak_rss)
+        self.trace('command', command=job.command[:200], state=job.state,
+                   exit_code=job.exit_code,
+                   wall=None if job.duration is None else round(job.duration, 4),
+                   cpu=None if job.cpu_time is None else round(job.cpu_time, 4),
+                   peak_rss=job.peak_rss)
+
+    def snapshot(self):
+        # (name, count, mean, p50, p90, p99, max) per histogram, plus counters
+        with self.lock:
+            rows = []
+            for name, histogram in self.histograms.items():
+                mean = histogram.sum / histogram.count if histogram.count else None
+                rows.append((name, histogram.count, mean, histogram.quantile(0.5),
+                             histogram.quantile(0.9), histogram.quantile(0.99), histogram.max))
+            return rows, dict(self.counters)
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            for name, histogram in self.histograms.items():
+                metric = f"linuxai_{name}"
+                help_text = METRICS.get(name, (None, name))[1]
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{le="{prometheus_number(bound)}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum {prometheus_number(histogram.sum)}")
+                lines.append(f"{metric}_count {histogram.count}")
+            for name, value in self.counters.items():
+                metric = f"linuxai_{name}"
+                lines.append(f"# HELP {metric} {COUNTERS.get(name, name)}")
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        # Serves /metrics in the Prometheus text format from a daemon thread
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='linuxai-metrics',
+                         daemon=True).start()
+        return self.server.server_address
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        with self.lock:
+            if self.trace_file is not None:
+                self.trace_file.close()
+                self.trace_file = None
+
+
+def telemetry_from_config(config):
+    settings = config['telemetry']
+    trace_path = settings.get('trace_file')
+    if trace_path:
+        trace_path = os.path.join(config_dir(), os.path.expanduser(trace_path))
+    return Telemetry(trace_path, settings.get('max_trace_bytes', 10 * 1024 * 1024))
@@ -0,0 +1,299 @@
+COLORS = {
+    'bg_dark': '#0a0a0f',           # Deep dark purple-black
+    'bg_medium': '#1a0d2e',         # Dark purple
+    'bg_light': '#16213e',          # Dark blue-purple
+    'text': '#00ffff',              # Cyan text
+    'text_secondary': '#ff00ff',    # Magenta secondary text
+    'primary': '#ff0080',           # Hot pink/magenta
+    'primary_hover': '#ff3399',     # Lighter hot pink
+    'accent': '#00ff41',            # Neon green
+    'accent_hover': '#39ff70',      # Lighter neon green
+    'error': '#ff073a',             # Neon red
+    'success': '#00ff88',           # Neon green success
+    'border': '#7b68ee',            # Medium slate blue
+    'border_glow': '#9370db',       # Medium purple
+    'warning': '#ffff00',           # Neon yellow
+    'shadow': '#ff00ff80'           # Semi-transparent magenta
+}
+
+# One stylesheet for the whole application, parsed once at startup. Widgets
+# opt in through object names; runtime state changes flip dynamic properties
+# (see set_style_state) instead of installing a new per-widget stylesheet.
+STYLESHEET = """
+    QMainWindow {{
+        background-color: {bg_dark};
+        border: 3px solid {border_glow};
+        border-radius: 10px;
+    }}
+    QScrollBar:vertical {{
+        background-color: {bg_medium};
+        width: 12px;
+        margin: 0px;
+        border-radius: 6px;
+    }}
+    QScrollBar::handle:vertical {{
+        background-color: {primary};
+        min-height: 20px;
+        border-radius: 6px;
+    }}
+    QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {{
+        height: 0px;
+    }}
+
+    QTextEdit#chatArea {{
+        background-color: {bg_dark};
+        color: {text};
+        border: 2px solid {border};
+        font-family: 'Consolas', 'Ubuntu Mono', 'Courier New';
+        font-size: 14px;
+        padding: 15px;
+        border-radius: 8px;
+        selection-background-color: {primary};
+        selection-color: {bg_dark};
+    }}
+    QTextEdit#chatArea:focus {{
+        border: 2px solid {border_glow};
+    }}
+    QPlainTextEdit#outputView {{
+        background-color: {bg_dark};
+        color: {text};
+        border: 2px solid {border};
+        border-radius: 8px;
+        font-family: 'Consolas', 'Ubuntu Mono', 'Courier New';
+        font-size: 13px;
+        selection-background-color: {primary};
+        selection-color: {bg_dark};
+    }}
+    QLabel#outputStatus {{
+        color: {text_secondary};
+    }}
+    QTabWidget#outputTabs::pane {{
+        border: none;
+    }}
+    QTabWidget#outputTabs QTabBar::tab {{
+        background-color: {bg_medium};
+        color: {text};
+        border: 1px solid {border};
+        border-bottom: none;
+        border-top-left-radius: 5px;
+        border-top-right-radius: 5px;
+        padding: 4px 10px;
+    }}
+    QTabWidget#outputTabs QTabBar::tab:selected {{
+        background-color: {primary};
+        color: {bg_dark};
+    }}
+
+    QLineEdit {{
+        background-color: {bg_dark};
+        color: {text};
+        border: 2px solid {border};
+        border-radius: 5px;
+        padding: 8px;
+        font-family: 'Ubuntu Mono', 'Courier New';
+        font-size: 14px;
+    }}
+    QLineEdit:focus {{
+        border: 2px solid {primary};
+    }}
+    QComboBox, QCheckBox {{
+        color: {text};
+    }}
+    QComboBox {{
+        background-color: {bg_dark};
+        border: 2px solid {border};
+        border-radius: 5px;
+        padding: 4px;
+    }}
+    QSpinBox {{
+        background-color: {bg_dark};
+        color: {text};
+        border: 2px solid {border};
+        border-radius: 5px;
+        padding: 4px;
+    }}
+
+    QPushButton {{
+        background-color: {primary};
+        color: {text};
+        border: none;
+        padding: 8px 15px;
+        border-radius: 5px;
+        font-weight: bold;
+    }}
+    QPushButton:hover {{
+        background-color: {primary_hover};
+    }}
+    QPushButton[variant="accent"] {{
+        background-color: {accent};
+        color: {bg_dark};
+        padding: 8px 20px;
+    }}
+    QPushButton[variant="accent"]:hover {{
+        background-color: {primary};
+        color: {text};
+    }}
+    QPushButton[variant="danger"] {{
+        background-color: {error};
+        padding: 8px 20px;
+    }}
+    QPushButton[variant="danger"]:disabled {{
+        background-color: {bg_light};
+        color: {border};
+    }}
+    QPushButton[variant="header"] {{
+        padding: 5px 15px;
+    }}
+    QPushButton[variant="subtle"] {{
+        background-color: {bg_light};
+        padding: 5px 15px;
+    }}
+    QPushButton[variant="subtle"]:hover {{
+        background-color: {primary_hover};
+    }}
+    QPushButton#cancelButton {{
+        background-color: {bg_medium};
+    }}
+    QPushButton#cancelButton:hover {{
+        background-color: {error};
+        color: {text};
+    }}
+
+    QDialog#apiKeyDialog {{
+        background-color: {bg_dark};
+        color: {text};
+        border-radius: 10px;
+    }}
+    QDialog#apiKeyDialog QLabel {{
+        color: {text};
+        font-size: 13px;
+    }}
+    QDialog#apiKeyDialog QLineEdit {{
+        background-color: {bg_medium};
+    }}
+    QDialog#apiKeyDialog QLabel#dialogInfo {{
+        color: {accent};
+    }}
+    QLabel#validationLabel[state="error"], QLabel#apiStatus[state="error"] {{
+        color: {error};
+    }}
+    QLabel#validationLabel[state="ok"], QLabel#apiStatus[state="ok"] {{
+        color: {success};
+    }}
+
+    QDialog#historyDialog, QDialog#statsDialog {{
+        background-color: {bg_dark};
+        color: {text};
+    }}
+    QListWidget#historyList, QTextEdit#historyOutput, QTextEdit#statsView {{
+        background-color: {bg_dark};
+        color: {text};
+        border: 2px solid {border};
+        border-radius: 5px;
+        font-family: 'Ubuntu Mono', 'Courier New';
+        font-size: 13px;
+    }}
+    QListWidget#historyList::item:selected {{
+        background-color: {primary};
+        color: {bg_dark};
+    }}
+
+    QFrame#commandCard {{
+        background-color: {bg_medium};
+        color: {text};
+        border: 2px solid {border};
+        border-radius: 10px;
+        margin: 8px;
+        padding: 15px;
+    }}
+    QFrame#commandCard:hover {{
+        border: 2px solid {border_glow};
+    }}
+    QLabel#jobState {{
+        color: {text};
+        font-weight: bold;
+    }}
+    QLabel#jobState[state="queued"], QLabel#jobState[state="skipped"] {{
+        color: {warning};
+    }}
+    QLabel#jobState[state="done"] {{
+        color: {success};
+    }}
+    QLabel#jobState[state="failed"], QLabel#jobState[state="cancelled"] {{
+        color: {error};
+    }}
+    QLabel#commandCheck[state="ok"] {{
+        color: {success};
+    }}
+    QLabel#commandCheck[state="warning"] {{
+        color: {warning};
+    }}
+    QLabel#commandCheck[state="error"] {{
+        color: {error};
+    }}
+    QLabel#fieldLabel {{
+        color: {accent};
+        font-weight: bold;
+        font-size: 13px;
+    }}
+
+    QLabel#apiStatus {{
+        padding: 5px 10px;
+        background-color: {bg_dark};
+        border-radius: 5px;
+    }}
+    QScrollArea#commandsScroll {{
+        background-color: {bg_dark};
+        border: none;
+        border-radius: 5px;
+    }}
+    QWidget#commandsArea {{
+        background-color: {bg_dark};
+    }}
+    QFrame#inputFrame {{
+        background-color: {bg_medium};
+        border: 2px solid {border};
+        border-radius: 8px;
+    }}
+    QStatusBar {{
+        background-color: {bg_dark};
+        color: {text_secondary};
+    }}
+    QStatusBar QLabel {{
+        color: {text_secondary};
+    }}
+    QStatusBar QCheckBox {{
+        color: {text};
+    }}
+
+    QMessageBox {{
+        background-color: {bg_dark};
+        color: {text};
+    }}
+    QMessageBox QPushButton {{
+        padding: 5px 15px;
+        border-radius: 3px;
+        font-weight: normal;
+    }}
+"""
+
+_stylesheet = None
+
+
+def build_stylesheet(colors=COLORS):
+    return STYLESHEET.format(**colors)
+
+
+def apply_theme(app):
+    global _stylesheet
+    if _stylesheet is None:
+        _stylesheet = build_stylesheet()
+    if app.styleSheet() != _stylesheet:
+        app.setStyleSheet(_stylesheet)
+
+
+def set_style_state(widget, state):
+    # Re-polishes just this widget against the application stylesheet
+    widget.setProperty('state', state)
+    widget.style().unpolish(widget)
+    widget.style().polish(widget)
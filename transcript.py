@@ -0,0 +1,58 @@
+import os
+import tempfile
+
+READ_CHUNK = 65536
+
+
+class TranscriptLog:
+    # Append-only on-disk copy of the chat transcript. Blocks are stored as
+    # UTF-8 lines, so the view can evict old blocks freely and page them back
+    # in by reading backwards from a byte offset, without keeping an index.
+    def __init__(self, path=None):
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='linuxai-transcript-', suffix='.log')
+            self.file = os.fdopen(fd, 'w+b')
+        else:
+            self.file = open(path, 'w+b')
+        self.path = path
+        self.size = 0
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(data)
+        self.size += len(data)
+
+    def reset(self):
+        self.file.seek(0)
+        self.file.truncate()
+        self.size = 0
+
+    def read_before(self, offset, count):
+        # Returns (start, text) for up to `count` lines ending just before the
+        # line that starts at `offset`.
+        if offset <= 0 or count <= 0:
+            return offset, ''
+        end = offset - 1
+        pos = end
+        data = b''
+        while pos > 0 and data.count(b'\n') < count:
+            step = min(READ_CHUNK, pos)
+            pos -= step
+            self.file.seek(pos)
+            data = self.file.read(step) + data
+        lines = data.split(b'\n')
+        if len(lines) > count:
+            lines = lines[-count:]
+            data = b'\n'.join(lines)
+            start = end - len(data)
+        else:
+            start = 0
+        return start, data.decode('utf-8', errors='replace')
+
+    def close(self):
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass